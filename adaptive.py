@@ -0,0 +1,130 @@
+from collections import namedtuple
+
+import numpy as np
+
+# One step on the quality ladder: input scale fed to the pose model and how
+# often to run inference (1 = every frame). Levels only change knobs that
+# reuse the session's pose graph; a different model would mean building and
+# pooling another graph on every step
+QualityLevel = namedtuple("QualityLevel", ["name", "scale", "infer_every"])
+
+DEFAULT_LEVELS = (
+    QualityLevel("full", 1.0, 1),
+    QualityLevel("reduced", 0.75, 1),
+    QualityLevel("half", 0.5, 1),
+    QualityLevel("half-skip", 0.5, 2),
+    QualityLevel("half-skip-3", 0.5, 3),
+)
+
+
+class AdaptiveController:
+    """Trade inference quality for speed to stay within a latency budget
+
+    The per-frame latency is tracked with an exponential moving average. When
+    it stays above the budget the controller steps down one quality level;
+    when there is enough headroom for long enough it steps back up. On
+    frames where inference is skipped, landmarks (and 3D world landmarks,
+    when the backend provides them) are extrapolated from the last two
+    inferred frames.
+    """
+
+    def __init__(self, target_latency=0.05, levels=DEFAULT_LEVELS, smoothing=0.2,
+                 degrade_after=5, upgrade_after=30, headroom=0.6):
+        self.target_latency = target_latency
+        self.levels = levels
+        self.smoothing = smoothing
+        self.degrade_after = degrade_after
+        self.upgrade_after = upgrade_after
+        self.headroom = headroom
+        self.level_index = 0
+        self.ema_latency = None
+        self.level_changes = 0
+        self._over_budget = 0
+        self._under_budget = 0
+        self._frame_number = 0
+        self._history = []  # Last two (timestamp, points, world) inference results
+
+    @property
+    def level(self):
+        return self.levels[self.level_index]
+
+    def should_infer(self):
+        """Return True if inference should run on the current frame"""
+        self._frame_number += 1
+        if len(self._history) < 2:
+            return True
+        return self._frame_number % self.level.infer_every == 0
+
+    def observe(self, timestamp, points, world=None):
+        """Remember the landmarks produced by an inferred frame"""
+        if points is None:
+            self._history = []
+            return
+        self._history.append((timestamp, points.copy(), None if world is None else world.copy()))
+        del self._history[:-2]
+
+    def predict(self, timestamp):
+        """Linearly extrapolate landmarks for a skipped frame"""
+        return self._extrapolate(timestamp, 1)
+
+    def predict_world(self, timestamp):
+        """Extrapolate world landmarks for a skipped frame
+
+        Holds the last world landmarks if only the newest inferred frame had
+        them; None if it had none.
+        """
+        return self._extrapolate(timestamp, 2)
+
+    def _extrapolate(self, timestamp, field):
+        if len(self._history) < 2:
+            return None
+        t0, p0 = self._history[0][0], self._history[0][field]
+        t1, p1 = self._history[1][0], self._history[1][field]
+        if p1 is None:
+            return None
+        if p0 is None or t1 <= t0:
+            return p1
+        alpha = (timestamp - t1) / (t1 - t0)
+        predicted = p1 + (p1 - p0) * alpha
+        # Keep the visibility of the last real observation
+        predicted[:, 3] = p1[:, 3]
+        return predicted.astype(np.float32, copy=False)
+
+    def record_latency(self, latency):
+        """Update the latency estimate and adjust the quality level"""
+        if self.ema_latency is None:
+            self.ema_latency = latency
+        else:
+            self.ema_latency += self.smoothing * (latency - self.ema_latency)
+
+        if self.ema_latency > self.target_latency:
+            self._over_budget += 1
+            self._under_budget = 0
+        elif self.ema_latency < self.target_latency * self.headroom:
+            self._under_budget += 1
+            self._over_budget = 0
+        else:
+            self._over_budget = 0
+            self._under_budget = 0
+
+        if self._over_budget >= self.degrade_after and self.level_index < len(self.levels) - 1:
+            self._set_level(self.level_index + 1)
+        elif self._under_budget >= self.upgrade_after and self.level_index > 0:
+            self._set_level(self.level_index - 1)
+
+    def _set_level(self, index):
+        self.level_index = index
+        self.level_changes += 1
+        self._over_budget = 0
+        self._under_budget = 0
+        # The new level has a different cost; start measuring afresh
+        self.ema_latency = None
+
+    def stats(self):
+        """Return the current level and latency estimate"""
+        return {
+            "quality_level": self.level.name,
+            "latency_ms": round((self.ema_latency or 0.0) * 1000, 1),
+            "target_ms": round(self.target_latency * 1000, 1),
+            "level_changes": self.level_changes,
+        }
@@ -1,113 +1,520 @@
+import time
+_script_started = time.perf_counter()
+
 import streamlit as st
 import cv2
-import mediapipe as mp
 import numpy as np
-from PIL import Image
-from exercise_tracker import ExerciseTracker
-import time
-import threading
+from exercise_tracker import ExerciseTracker, FIXED_FEEDBACK
+from exercises import exercise_names, get_exercise
+from adaptive import AdaptiveController
+from metrics import FrameMetrics, NULL_METRICS
+from event_server import EventServer
+from video_stream import MJPEGServer, encode_jpeg
+from landmark_filter import FILTERS, create_filter
+from multi_person import MultiPoseDetector, MultiPersonSession
+from tts_worker import SpeechWorker, PRIORITY_REP, PRIORITY_SESSION, PRIORITY_HINT
+import metrics as metrics_registry
+from pipeline import FramePipeline
+from capture_manager import CaptureManager
+from session_store import SessionStore
+from landmark_log import LOG_EXTENSION, MAX_MEMBER_LENGTH, LandmarkRecorder
+from synthetic_motion import SYNTHETIC_EXERCISES, SyntheticMotion, draw_skeleton
+from pose_pool import PosePool
+from pose_backends import available_backends, create_backend
+from roi import RoiTracker
+import importlib.util
+import logging
 import os
+from contextlib import contextmanager
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+from functools import partial
 
-# Conditionally import pyttsx3 - it may not work on Streamlit Cloud
-try:
-    import pyttsx3
-    PYTTSX3_AVAILABLE = True
-except ImportError:
-    PYTTSX3_AVAILABLE = False
-
-# Initialize MediaPipe Pose
-mp_pose = mp.solutions.pose
-pose = mp_pose.Pose(
-    min_detection_confidence=0.5,
-    min_tracking_confidence=0.5
-)
-mp_drawing = mp.solutions.drawing_utils
-
-# Initialize text-to-speech engine with error handling
-tts_available = False
-tts_lock = threading.Lock()  # Add a lock for thread safety
+# pyttsx3 may not work on Streamlit Cloud; it's only imported by the speech worker
+PYTTSX3_AVAILABLE = importlib.util.find_spec("pyttsx3") is not None
+
+# Diagnostics such as startup timings go to the "fitfusion" logger; set
+# FITFUSION_LOG_LEVEL=INFO to see them on the console
+logger = logging.getLogger("fitfusion")
+if os.environ.get('FITFUSION_LOG_LEVEL') and not logger.handlers:
+    logger.addHandler(logging.StreamHandler())
+    logger.setLevel(os.environ['FITFUSION_LOG_LEVEL'].upper())
+
+# Streamlit re-executes this script on every rerun, so anything expensive or
+# process-wide (models, engines, servers, pools) comes from a cached factory
+
+@st.cache_resource
+def startup_timings():
+    """Process-wide record of one-off initialization costs (seconds)"""
+    return {}
+
+@contextmanager
+def timed_startup(name):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        startup_timings()[name] = time.perf_counter() - started
+
+# Only the first run of the script pays for the imports
+startup_timings().setdefault("imports", time.perf_counter() - _script_started)
+
+def report_first_frame(name):
+    """Record the time from script start to the first frame shown, logged once per process"""
+    timings = startup_timings()
+    if name in timings:
+        return
+    timings[name] = time.perf_counter() - _script_started
+    logger.info("FitFusion startup timing: %s",
+                ", ".join(f"{stage}={seconds * 1000:.0f}ms" for stage, seconds in timings.items()))
+
+# Pose backend used unless another one is picked in the sidebar
+default_pose_backend = os.environ.get('FITFUSION_POSE_BACKEND', 'mediapipe')
+
+def create_pose(backend="mediapipe", **options):
+    """Create a pose backend (MediaPipe is only imported when one is built)"""
+    if backend == "mediapipe":
+        options.setdefault("model_complexity", 1)
+    with timed_startup(f"pose_backend_{backend}"):
+        return create_backend(backend, **options)
+
+# Multi-person mode uses the Tasks API, which detects several people per call
+def create_multi_pose(num_poses=4):
+    """Create a multi-person pose detector (MediaPipe Tasks PoseLandmarker)"""
+    with timed_startup("multi_pose_detector"):
+        return MultiPoseDetector(num_poses=num_poses)
+
+# Pose graphs kept per process (default: one per CPU core); size it to the
+# number of devices streaming at once
+pose_pool_size = int(os.environ.get('FITFUSION_POSE_POOL_SIZE', '0')) or None
+
+@st.cache_resource
+def get_pose_pool():
+    """Pose graphs are built lazily, one per session, and survive reruns"""
+    return PosePool(create_pose, max_size=pose_pool_size)
+
+@st.cache_resource
+def get_multi_pose_pool():
+    return PosePool(create_multi_pose, max_size=pose_pool_size)
 
-# We'll initialize the TTS engine later in the main function if available
-engine = None
+@st.cache_resource
+def get_capture_manager():
+    """Cameras are opened once per server and shared by every session watching them"""
+    return CaptureManager()
+
+pose_pool = get_pose_pool()
+multi_pose_pool = get_multi_pose_pool()
+capture_manager = get_capture_manager()
+
+@st.cache_resource
+def get_speech_worker():
+    """Start the single speech worker; returns (worker, error message)"""
+    try:
+        with timed_startup("tts_engine"):
+            return SpeechWorker(cached_phrases=FIXED_FEEDBACK).start(), None
+    except Exception as e:
+        return None, str(e)
+
+# Set by main() on every run from the cached speech worker
+tts_available = False
+speech_worker = None
 
 # Check if we're running on Streamlit Cloud
 is_streamlit_cloud = os.environ.get('STREAMLIT_SHARING', '') == 'true' or \
                     os.environ.get('STREAMLIT_CLOUD', '') == 'true'
 
-# Global variable to store the last feedback
-last_feedback = ""
+# Optional metrics export, configured through the environment
+metrics_port = os.environ.get('FITFUSION_METRICS_PORT', '')
+metrics_json_path = os.environ.get('FITFUSION_METRICS_JSON', '')
 
-def speak_feedback(feedback):
-    """Speak the feedback safely"""
-    global last_feedback, engine
-    
+# MJPEG stream server, started on first use (one per process). Like the event
+# server it only listens on localhost unless FITFUSION_STREAM_HOST says otherwise
+stream_host = os.environ.get('FITFUSION_STREAM_HOST', '127.0.0.1')
+stream_port = int(os.environ.get('FITFUSION_STREAM_PORT', '8502'))
+stream_url = os.environ.get('FITFUSION_STREAM_URL', f'http://localhost:{stream_port}')
+
+@st.cache_resource
+def get_mjpeg_server():
+    """Return the process-wide MJPEG server, starting it if needed"""
+    return MJPEGServer(stream_port, stream_host)
+
+# Live event server (SSE/WebSocket) for leaderboards and displays, one per process
+events_host = os.environ.get('FITFUSION_EVENTS_HOST', '127.0.0.1')
+events_port = int(os.environ.get('FITFUSION_EVENTS_PORT', '8503'))
+events_url = os.environ.get('FITFUSION_EVENTS_URL', f'http://localhost:{events_port}')
+
+@st.cache_resource
+def get_event_server():
+    """Return the process-wide event server, starting it if needed"""
+    return EventServer(events_port, events_host)
+
+# Where "Record Landmarks" saves its logs for offline replay
+recordings_dir = os.environ.get('FITFUSION_RECORDINGS_DIR', 'recordings')
+
+@st.cache_resource
+def get_session_store():
+    """Return the process-wide workout history database, opening it if needed"""
+    return SessionStore()
+
+def workout_recorder(member, exercise_type):
+    """Return the history recorder of the running workout, starting one if needed
+
+    A workout spans every rerun of the processing loop until Stop or a change
+    of member or exercise, so widget changes don't split it into several
+    sessions.
+    """
+    workout = st.session_state.get('workout')
+    if workout is not None and (workout["member"], workout["exercise"]) != (member, exercise_type):
+        end_workout()
+        workout = None
+    if workout is None:
+        workout = st.session_state.workout = {
+            "member": member,
+            "exercise": exercise_type,
+            "recorder": get_session_store().start_session(member, exercise_type),
+        }
+    return workout["recorder"]
+
+def end_workout():
+    """Close the running workout's history session, if any"""
+    workout = st.session_state.pop('workout', None)
+    if workout is not None:
+        workout["recorder"].close()
+
+def speak_feedback(feedback, priority=PRIORITY_HINT):
+    """Queue the feedback on the speech worker (never blocks the frame loop)"""
     # Only proceed if TTS is available and enabled
     if not (tts_available and st.session_state.voice_enabled):
         return
-        
-    # Only speak if feedback has changed
-    if feedback == last_feedback:
-        return
-        
-    last_feedback = feedback
     
     # Skip actual TTS on Streamlit Cloud as it won't work there
     if is_streamlit_cloud:
         return
     
-    # Use the lock to prevent multiple threads from using the engine simultaneously
-    if tts_lock.acquire(blocking=False):
-        try:
-            # Define a function that releases the lock when done
-            def speak_and_release():
-                try:
-                    engine.say(feedback)
-                    engine.runAndWait()
-                except Exception as e:
-                    # Silently handle errors to prevent app crashes
-                    pass
-                finally:
-                    # Always release the lock
-                    tts_lock.release()
-            
-            # Start a thread for speaking
-            thread = threading.Thread(target=speak_and_release)
-            thread.daemon = True  # Make thread a daemon so it doesn't block app exit
-            thread.start()
-        except Exception:
-            # If anything goes wrong, make sure to release the lock
-            tts_lock.release()
-
-def process_frame(frame, exercise_tracker):
+    # The tracker repeats its hint every frame: only speak when it changes.
+    # The worker also coalesces repeats across sessions and drops stale hints
+    if feedback == st.session_state.get('last_spoken_feedback'):
+        return
+    st.session_state.last_spoken_feedback = feedback
+    speech_worker.say(feedback, priority)
+
+def current_session_id():
+    """Return the id of the Streamlit session running this thread"""
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx is not None else "default"
+
+def draw_landmarks(rgb_frame, points):
+    """Draw the pose skeleton in place, skipping landmarks that aren't visible"""
+    draw_skeleton(rgb_frame, points, landmark_color=(255, 0, 0), connection_color=(224, 224, 224),
+                  thickness=2, radius=3, min_visibility=0.5)
+
+def detect_pose(rgb_frame, session_id, adaptive=None, backend="mediapipe", backend_options=None,
+                roi=None):
+    """Run pose inference, honouring the adaptive controller's quality level
+
+    With an RoiTracker the model only sees the region around the previous
+    frame's landmarks, retrying on the full frame if the athlete is lost.
+    Returns (points, world): the (33, 4) landmark array in full-frame
+    coordinates, or None if nobody was found, and the backend's 3D world
+    landmarks when it provides them.
+    """
+    options = dict(backend_options or {}, backend=backend)
+    now = time.time()
+    if adaptive is not None and not adaptive.should_infer():
+        # Skipped frame: extrapolate from the previous inference results
+        return adaptive.predict(now), adaptive.predict_world(now)
+    
+    # Downscale the model input; landmarks are normalized so no remapping needed
+    scale = adaptive.level.scale if adaptive is not None else 1.0
+    
+    def infer(image):
+        if scale < 1.0:
+            image = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        with pose_pool.session(session_id, **options) as pose:
+            if pose is None:
+                # Every pooled graph is in use: skip this frame
+                return None, None
+            return pose.process(image, now), pose.last_world
+    
+    if roi is None:
+        points, world = infer(rgb_frame)
+    else:
+        # World landmarks are hip-centred meters, so cropping doesn't change them
+        image, box = roi.crop(rgb_frame)
+        points, world = infer(image)
+        if points is not None:
+            points = roi.to_frame(points, box, rgb_frame.shape)
+        elif image is not rgb_frame:
+            # Lost the athlete inside the crop: look at the whole frame again
+            points, world = infer(rgb_frame)
+        roi.update(points, rgb_frame.shape)
+    
+    if adaptive is not None:
+        adaptive.observe(now, points, world)
+    return points, world
+
+def process_frame(frame, exercise_tracker, session_id="default", adaptive=None, metrics=None,
+                  buffers=None, draw_overlay=True, recorder=None, landmark_recorder=None,
+                  backend="mediapipe", backend_options=None, roi=None, events=None):
+    """Run pose tracking on a BGR frame and return (annotated RGB frame, count, feedback)
+
+    The frame is converted to RGB once, into a recycled buffer when given,
+    and annotations are drawn in place on that same buffer. With a recorder
+    the joint angles and completed reps are saved to the workout history;
+    a landmark_recorder logs the raw landmarks for replay and an events
+    channel publishes counts to external subscribers.
+    """
+    started = time.perf_counter()
+    metrics = metrics or NULL_METRICS
+    
     # Convert the BGR image to RGB
-    rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    with metrics.stage("color_convert"):
+        rgb_frame = buffers.acquire(frame.shape) if buffers is not None else None
+        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=rgb_frame)
     
-    # Process the frame and get pose landmarks
-    results = pose.process(rgb_frame)
+    # Process the frame with this session's pose backend; a read-only
+    # image lets MediaPipe use the buffer without copying it
+    with metrics.stage("pose"):
+        rgb_frame.flags.writeable = False
+        try:
+            points, world = detect_pose(rgb_frame, session_id, adaptive, backend, backend_options, roi)
+        finally:
+            rgb_frame.flags.writeable = True
     
-    # Draw pose landmarks on the frame
-    annotated_frame = frame.copy()
     count = 0
     feedback = ""
     
-    if results.pose_landmarks:
-        mp_drawing.draw_landmarks(
-            annotated_frame,
-            results.pose_landmarks,
-            mp_pose.POSE_CONNECTIONS
-        )
+    if points is not None:
+        # Draw pose landmarks on the frame
+        if draw_overlay:
+            with metrics.stage("draw_landmarks"):
+                draw_landmarks(rgb_frame, points)
         
         # Update exercise count and get feedback
-        count, feedback = exercise_tracker.update(results.pose_landmarks.landmark)
+        previous_count = exercise_tracker.count
+        with metrics.stage("tracker"):
+            count, feedback = exercise_tracker.update(points, world_landmarks=world)
+        
+        if recorder is not None:
+            with metrics.stage("record"):
+                recorder.record_frame(exercise_tracker.timestamp, exercise_tracker.angles)
+                if count > previous_count:
+                    recorder.record_rep(exercise_tracker.timestamp)
+        
+        if events is not None:
+            if count > previous_count:
+                last_rep = exercise_tracker.analytics.last_rep if exercise_tracker.analytics else None
+                events.rep(count, exercise_tracker.timestamp, **(last_rep._asdict() if last_rep else {}))
+            events.frame(count, feedback, exercise_tracker.timestamp)
         
         # Add feedback text to the frame
-        cv2.putText(annotated_frame, feedback, (10, 30), 
-                    cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
+        if draw_overlay:
+            with metrics.stage("put_text"):
+                cv2.putText(rgb_frame, feedback, (10, 30), 
+                            cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
+        
+        # Speak the feedback if voice is enabled; rep completions go first
+        speak_feedback(feedback, PRIORITY_REP if count > previous_count else PRIORITY_HINT)
+    
+    if landmark_recorder is not None:
+        with metrics.stage("record"):
+            if points is not None:
+                landmark_recorder.write(exercise_tracker.timestamp, points, world)
+            else:
+                landmark_recorder.write(time.time(), None)
+    
+    elapsed = time.perf_counter() - started
+    metrics.record("process_frame", elapsed)
+    metrics.frame_done()
+    if adaptive is not None:
+        adaptive.record_latency(elapsed)
+    
+    return rgb_frame, count, feedback
+
+def process_frame_multi(frame, multi_session, session_id="default", num_poses=4, metrics=None,
+                        buffers=None, draw_overlay=True, events=None):
+    """Track every person in a BGR frame; returns (annotated RGB frame, {id: count}, feedback)"""
+    started = time.perf_counter()
+    metrics = metrics or NULL_METRICS
+    
+    with metrics.stage("color_convert"):
+        rgb_frame = buffers.acquire(frame.shape) if buffers is not None else None
+        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=rgb_frame)
+    
+    # One inference call detects everyone in the frame
+    now = time.time()
+    with metrics.stage("pose"):
+        with multi_pose_pool.session(session_id, num_poses=num_poses) as detector:
+            if detector is None:
+                poses, world_poses = [], None
+            else:
+                poses = detector.detect(rgb_frame, now)
+                world_poses = detector.world_poses
+    
+    with metrics.stage("tracker"):
+        people = multi_session.update(poses, timestamp=now, world_poses=world_poses)
+    
+    if draw_overlay:
+        height, width = rgb_frame.shape[:2]
+        with metrics.stage("draw_landmarks"):
+            for person_id, points, count, _ in people:
+                draw_landmarks(rgb_frame, points)
+                # Label each athlete above their head
+                x, y = points[0, :2]
+                cv2.putText(rgb_frame, f"#{person_id}: {count}",
+                            (int(x * width) - 30, max(int(y * height) - 40, 20)),
+                            cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 0), 2)
+    
+    feedback = " | ".join(f"#{person_id}: {feedback}" for person_id, _, _, feedback in people)
+    if events is not None:
+        events.frame(multi_session.counts(), feedback, now)
+    metrics.record("process_frame", time.perf_counter() - started)
+    metrics.frame_done()
+    return rgb_frame, multi_session.counts(), feedback
+
+def describe_rep_analytics(analytics):
+    """One-line summary of the last rep and the running tempo consistency"""
+    last_rep = analytics.last_rep if analytics is not None else None
+    if last_rep is None:
+        return ""
+    text = (f"Last rep: {last_rep.duration:.1f}s (eccentric {last_rep.eccentric:.1f}s, "
+            f"concentric {last_rep.concentric:.1f}s), range {last_rep.range_of_motion:.0f}°, "
+            f"form {last_rep.form_score}/100")
+    consistency = analytics.tempo_consistency()
+    if consistency is not None:
+        text += f" | tempo consistency {consistency:.0%}"
+    asymmetry = analytics.asymmetry_feedback()
+    if asymmetry:
+        text += f" | {asymmetry}"
+    return text
+
+# Demo mode: a synthetic athlete drawn over a gradient, refreshed at DEMO_FPS.
+# Without fragments (Streamlit < 1.33, e.g. the pinned 1.32) the whole page is
+# redrawn in a loop instead, so that stays at the original 2 Hz
+DEMO_FPS = 10
+DEMO_FALLBACK_FPS = 2
+
+@st.cache_resource
+def demo_background(exercise_type, width=640, height=480):
+    """Gradient background with captions (RGB), built once per exercise"""
+    rows = np.arange(height, dtype=np.float32)[:, None]
+    gradient = np.concatenate([40 + rows / 8, 10 + rows / 16, 80 + rows / 6], axis=1)
+    frame = np.empty((height, width, 3), dtype=np.uint8)
+    frame[:] = gradient.astype(np.uint8)[:, None, :]
+    cv2.putText(frame, f"FitFusion - {exercise_type}", (20, 40),
+                cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
+    cv2.putText(frame, "DEMO MODE - no camera access required", (20, height - 20),
+                cv2.FONT_HERSHEY_SIMPLEX, 0.6, (200, 200, 200), 1)
+    # Shared by every viewer; frames are drawn on a copy
+    frame.flags.writeable = False
+    return frame
+
+def new_demo(exercise_type):
+    """Per-session demo state: synthetic motion feeding a real ExerciseTracker"""
+    # Exercises without a synthetic motion get a still (plank) pose
+    motion_type = exercise_type if exercise_type in SYNTHETIC_EXERCISES else "Plank"
+    return {
+        "exercise_type": exercise_type,
+        "motion": SyntheticMotion(motion_type),
+        "tracker": ExerciseTracker(exercise_type),
+        "smoothing": None,
+        "started_at": time.time(),
+        "frame": np.empty_like(demo_background(exercise_type)),
+    }
+
+def reset_demo():
+    st.session_state.pop('demo', None)
+
+def render_demo_frame():
+    """Advance the demo by one frame and draw it with the count and feedback"""
+    demo = st.session_state.get('demo')
+    if demo is None:
+        return
+    now = time.time()
+    elapsed = now - demo["started_at"]
+    points = demo["motion"].frame(elapsed)
+    count, feedback = demo["tracker"].update(points, timestamp=now)
+    
+    frame = demo["frame"]
+    np.copyto(frame, demo_background(demo["exercise_type"]))
+    draw_landmarks(frame, points)
+    st.image(encode_jpeg(frame))
+    report_first_frame("first_demo_frame")
+    
+    # Use columns for a better mobile layout
+    stat_col1, stat_col2 = st.columns(2)
+    with stat_col1:
+        st.metric("Exercise Count", count)
+    with stat_col2:
+        minutes, seconds = divmod(int(elapsed), 60)
+        st.metric("Workout Time", f"{minutes:02d}:{seconds:02d}")
+    st.info(feedback or f"Continue your {demo['exercise_type']} routine")
+    rep_summary = describe_rep_analytics(demo["tracker"].analytics)
+    if rep_summary:
+        st.caption(rep_summary)
+
+# st.fragment (st.experimental_fragment before 1.37) reruns just the demo
+# frame on a timer; without it the demo falls back to an in-place loop
+_fragment = getattr(st, "fragment", None) or getattr(st, "experimental_fragment", None)
+demo_fragment = _fragment(run_every=1.0 / DEMO_FPS)(render_demo_frame) if _fragment else None
+
+def show_history(member):
+    """Show a member's daily totals and most recent sessions"""
+    store = get_session_store()
+    with st.expander(f"Workout History - {member}", expanded=True):
+        history_exercise = st.selectbox("Exercise", ["All"] + list(exercise_names()),
+                                        key="history_exercise")
+        exercise_filter = None if history_exercise == "All" else history_exercise
+        since = time.strftime("%Y-%m-%d", time.localtime(time.time() - 90 * 86400))
+        days = store.daily_summary(member, exercise_filter, since=since)
+        if not days:
+            st.info("No workouts recorded yet.")
+            return
+        
+        # Reps per day over the last 90 days
+        totals = {}
+        for day, _, _, reps, _ in days:
+            totals[day] = totals.get(day, 0) + reps
+        st.bar_chart({"Reps": dict(sorted(totals.items()))})
         
-        # Speak the feedback if voice is enabled
-        speak_feedback(feedback)
+        st.dataframe([
+            {"Exercise": session["exercise"],
+             "Started": time.strftime("%Y-%m-%d %H:%M", time.localtime(session["started_at"])),
+             "Minutes": round(((session["ended_at"] or session["started_at"]) - session["started_at"]) / 60, 1),
+             "Reps": session["reps"]}
+            for session in store.recent_sessions(member, exercise_filter)
+        ], use_container_width=True)
+
+def show_camera_help(camera_selection):
+    """Explain how to fix a camera that failed to open"""
+    st.error(f"""Failed to access camera {camera_selection}. Please try:
+        1. Select a different camera from the sidebar
+        2. Make sure your webcam is connected and not being used by another application
+        3. Check if your webcam is enabled in system settings
+        4. Try enabling 'Use Mock Camera' option above for a demo without a real camera
+        5. If using Linux, you may need to grant camera permissions
+    """)
     
-    return annotated_frame, count, feedback
+    # Provide troubleshooting help
+    with st.expander("Camera Troubleshooting"):
+        st.markdown("""### Linux Camera Permissions
+        If you're on Linux, try these commands in terminal to check and fix camera permissions:
+        ```bash
+        # List video devices
+        ls -l /dev/video*
+        
+        # Check if your user has permission to access the camera
+        groups $(whoami) | grep video
+        
+        # If not in video group, add yourself (may require restart)
+        sudo usermod -a -G video $(whoami)
+        ```
+        
+        ### Other Common Issues
+        - Make sure no other application is using the camera
+        - Check system settings to ensure camera is enabled
+        - Try unplugging and reconnecting your webcam
+        - Restart your computer
+        """)
 
 def main():
     st.set_page_config(
@@ -139,8 +546,8 @@ def main():
     if 'voice_enabled' not in st.session_state:
         st.session_state.voice_enabled = True
         
-    # Initialize TTS engine here to avoid Streamlit's script rerun issues
-    global engine, tts_available
+    # The TTS engine is started once per process and reused by every rerun
+    global speech_worker, tts_available
     
     # Skip TTS initialization on Streamlit Cloud
     if is_streamlit_cloud:
@@ -148,25 +555,24 @@ def main():
             st.sidebar.info("ℹ️ Voice feedback is disabled on Streamlit Cloud")
             st.session_state.cloud_warning_shown = True
         tts_available = False
-    elif PYTTSX3_AVAILABLE and engine is None:
-        try:
-            engine = pyttsx3.init()
-            engine.setProperty('rate', 150)  # Speed of speech
-            engine.setProperty('volume', 1.0)  # Volume level
-            tts_available = True
-        except Exception as e:
-            st.sidebar.warning("⚠️ Voice feedback unavailable: " + str(e))
-            tts_available = False
+    elif PYTTSX3_AVAILABLE:
+        speech_worker, tts_error = get_speech_worker()
+        tts_available = speech_worker is not None
+        if tts_error:
+            st.sidebar.warning("⚠️ Voice feedback unavailable: " + tts_error)
     else:
         if 'tts_warning_shown' not in st.session_state:
             st.sidebar.warning("⚠️ Text-to-speech module not available")
             st.session_state.tts_warning_shown = True
         tts_available = False
     
+    # Workouts are saved to the history under the member's name
+    member = st.sidebar.text_input("Member", value="guest").strip() or "guest"
+    
     # Sidebar for exercise selection
     exercise_type = st.sidebar.selectbox(
         "Select Exercise Type",
-        ["Push-ups", "Squats", "Crunches", "Pull-ups", "Plank"]
+        list(exercise_names())
     )
     
     # Voice assistant toggle (only if TTS is available and not on Streamlit Cloud)
@@ -181,8 +587,7 @@ def main():
             voice_volume = st.sidebar.slider("Volume", 0.0, 1.0, 1.0)
             
             # Update voice settings
-            engine.setProperty('rate', voice_rate)
-            engine.setProperty('volume', voice_volume)
+            speech_worker.configure(rate=voice_rate, volume=voice_volume)
     elif is_streamlit_cloud:
         st.session_state.voice_enabled = False
     else:
@@ -191,49 +596,45 @@ def main():
     
     # Add exercise instructions
     st.sidebar.markdown("### Exercise Instructions")
-    if exercise_type == "Push-ups":
-        st.sidebar.markdown("""
-        - Start in a plank position
-        - Lower your body until your chest nearly touches the floor
-        - Push back up to the starting position
-        - Keep your body straight throughout the movement
-        """)
-    elif exercise_type == "Squats":
-        st.sidebar.markdown("""
-        - Stand with feet shoulder-width apart
-        - Lower your body by bending your knees
-        - Keep your back straight and chest up
-        - Return to the starting position
-        """)
-    elif exercise_type == "Crunches":
-        st.sidebar.markdown("""
-        - Lie on your back with knees bent
-        - Place hands behind your head
-        - Lift your upper body towards your knees
-        - Lower back down with control
-        """)
-    elif exercise_type == "Pull-ups":
-        st.sidebar.markdown("""
-        - Hang from a bar with hands shoulder-width apart
-        - Pull your body up until your chin clears the bar
-        - Lower yourself back down with control
-        - Keep your core engaged throughout
-        """)
-    elif exercise_type == "Plank":
-        st.sidebar.markdown("""
-        - Start in a push-up position
-        - Lower onto your forearms
-        - Keep your body in a straight line
-        - Hold the position
-        """)
+    st.sidebar.markdown("\n".join(f"- {step}" for step in get_exercise(exercise_type).instructions))
+    
+    # Landmark smoothing lets the trackers ignore jitter (and run at lower FPS)
+    st.sidebar.markdown("### Tracking Settings")
+    smoothing = st.sidebar.selectbox("Landmark Smoothing", list(FILTERS), index=0)
+    hysteresis = st.sidebar.slider("Threshold Hysteresis (°)", 0, 15, 3,
+                                   help="How far past a threshold an angle must go to change phase")
+    bilateral = st.sidebar.checkbox("Track Both Sides (3D)", value=False,
+                                    help="Measure joints on both sides in 3D and follow the more "
+                                         "visible one; also flags left/right differences")
     
-    # Initialize exercise tracker
+    # Initialize exercise tracker; switching exercises parks the current tracker
+    # as a snapshot so switching back resumes its count
     if 'tracker' not in st.session_state or st.session_state.exercise_type != exercise_type:
-        st.session_state.tracker = ExerciseTracker(exercise_type)
+        parked = st.session_state.setdefault("parked_trackers", {})
+        if 'tracker' in st.session_state:
+            parked[st.session_state.exercise_type] = st.session_state.tracker.snapshot()
+        snapshot = parked.pop(exercise_type, None)
+        end_workout()
+        st.session_state.tracker = ExerciseTracker.restore(snapshot) if snapshot else \
+            ExerciseTracker(exercise_type)
         st.session_state.exercise_type = exercise_type
+        st.session_state.smoothing = None
         # Speak welcome message if voice is enabled
         if st.session_state.voice_enabled:
-            speak_feedback(f"Starting {exercise_type} exercise. Follow the instructions on screen.")
+            speak_feedback(f"Starting {exercise_type} exercise. Follow the instructions on screen.",
+                           PRIORITY_SESSION)
+    
+    # Apply the tracking settings to the current tracker
+    st.session_state.tracker.hysteresis = hysteresis
+    if st.session_state.tracker.bilateral != bilateral:
+        st.session_state.tracker.bilateral = bilateral
+    if st.session_state.smoothing != smoothing:
+        st.session_state.tracker.landmark_filter = create_filter(smoothing)
+        st.session_state.smoothing = smoothing
+    
+    # Past workouts, aggregated in the database rather than loaded in full
+    if st.sidebar.checkbox("Show Workout History", value=False):
+        show_history(member)
     
     # Camera handling with fallback options
     st.sidebar.markdown("### Camera Settings")
@@ -260,84 +661,39 @@ def main():
             st.info("📷 Running in demo mode with simulated camera feed")
         with col2:
             if st.button("⟳ Refresh", help="Refresh the demo"):
-                st.experimental_rerun()
-        # Create a placeholder for the mock video
-        video_placeholder = st.empty()
-        feedback_placeholder = st.empty()
-        count_placeholder = st.empty()
+                reset_demo()
         
         # Create a stop button
         stop_button = st.button("Stop")
         
-        # Create a more visually appealing mock frame
-        mock_frame = np.zeros((480, 640, 3), dtype=np.uint8)
-        # Add a gradient background
-        for i in range(480):
-            mock_frame[i, :] = [int(40 + i/8), int(10 + i/16), int(80 + i/6)]
-            
-        # Add text
-        cv2.putText(mock_frame, f"FitFusion - {exercise_type}", (50, 100), 
-                    cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
-        cv2.putText(mock_frame, "DEMO MODE", (180, 240), 
-                    cv2.FONT_HERSHEY_SIMPLEX, 1.5, (255, 255, 255), 2)
-        cv2.putText(mock_frame, "No camera access required", (150, 300), 
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.8, (200, 200, 200), 1)
-        
-        # Initialize exercise tracker
-        if 'tracker' not in st.session_state or st.session_state.exercise_type != exercise_type:
-            st.session_state.tracker = ExerciseTracker(exercise_type)
-            st.session_state.exercise_type = exercise_type
-        
-        # Use session state to track demo count and time
-        if 'demo_count' not in st.session_state:
-            st.session_state.demo_count = 0
-            st.session_state.last_update = time.time()
-            st.session_state.demo_feedback = ""
-        
-        # Update count based on time passed
-        current_time = time.time()
-        if current_time - st.session_state.last_update > 2:  # Update every 2 seconds
-            st.session_state.demo_count = (st.session_state.demo_count + 1) % 30
-            st.session_state.last_update = current_time
-            
-            # Generate different feedback messages based on count
-            if st.session_state.demo_count % 5 == 0:
-                st.session_state.demo_feedback = f"Great form! Keep going with {exercise_type}"
-            elif st.session_state.demo_count % 5 == 2:
-                st.session_state.demo_feedback = "Remember to maintain proper posture"
-            elif st.session_state.demo_count % 5 == 4:
-                st.session_state.demo_feedback = "Almost there! One more rep"
-            else:
-                st.session_state.demo_feedback = f"Continue your {exercise_type} routine"
-        
-        # Display the mock frame and stats
-        video_placeholder.image(mock_frame, channels="RGB")
-        
-        # Use columns for a better mobile layout
-        stat_col1, stat_col2 = st.columns(2)
-        with stat_col1:
-            count_placeholder.metric("Exercise Count", st.session_state.demo_count)
-        with stat_col2:
-            # Add a timer
-            elapsed = int(time.time() - st.session_state.last_update + st.session_state.demo_count * 2)
-            minutes, seconds = divmod(elapsed, 60)
-            time_str = f"{minutes:02d}:{seconds:02d}"
-            st.metric("Workout Time", time_str)
-        
-        feedback_placeholder.info(st.session_state.demo_feedback)
-        
         # Check if stop button was pressed
         if stop_button:
             st.success("Workout complete! Great job!")
-            # Reset demo state
-            if 'demo_count' in st.session_state:
-                del st.session_state.demo_count
-                del st.session_state.last_update
+            reset_demo()
             return
-            
-        # Auto-rerun to update the UI
-        time.sleep(0.5)  # Short delay to prevent too many reruns
-        st.experimental_rerun()
+        
+        # The synthetic athlete drives a real tracker with the chosen settings
+        demo = st.session_state.get('demo')
+        if demo is None or demo["exercise_type"] != exercise_type:
+            demo = st.session_state.demo = new_demo(exercise_type)
+        demo["tracker"].hysteresis = hysteresis
+        if demo["smoothing"] != smoothing:
+            demo["tracker"].landmark_filter = create_filter(smoothing)
+            demo["smoothing"] = smoothing
+        
+        if demo_fragment is not None:
+            # Only the fragment reruns on its timer, not the whole script
+            demo_fragment()
+        else:
+            # Older Streamlit: update placeholders in place until Stop reruns the script
+            demo_placeholder = st.empty()
+            while True:
+                tick = time.time()
+                with demo_placeholder.container():
+                    render_demo_frame()
+                remaining = 1.0 / DEMO_FALLBACK_FPS - (time.time() - tick)
+                if remaining > 0:
+                    time.sleep(remaining)
         return
     
     # Real camera mode
@@ -345,96 +701,241 @@ def main():
     camera_options = ["Default Camera (0)", "Alternative Camera 1 (1)", "Alternative Camera 2 (2)", "Custom Camera Path"]
     camera_selection = st.sidebar.selectbox("Select Camera Source", camera_options)
     
-    # Map selection to camera index
+    # Map selection to camera index; the camera itself is opened right before
+    # the processing loop, inside the try/finally that releases it
     if camera_selection == "Custom Camera Path":
-        camera_path = st.sidebar.text_input("Enter camera path or URL", "/dev/video0")
-        try:
-            cap = cv2.VideoCapture(camera_path)
-        except Exception as e:
-            st.error(f"Error with custom camera path: {str(e)}")
-            st.info("Try enabling 'Use Mock Camera' option above for a demo without a real camera.")
-            return
+        camera_source = st.sidebar.text_input("Enter camera path or URL", "/dev/video0")
     else:
         # Extract index from selection (0, 1, or 2)
-        camera_index = 0 if "0" in camera_selection else 1 if "1" in camera_selection else 2
-        try:
-            cap = cv2.VideoCapture(camera_index)
-        except Exception as e:
-            st.error(f"Error accessing camera {camera_index}: {str(e)}")
-            st.info("Try enabling 'Use Mock Camera' option above for a demo without a real camera.")
-            return
+        camera_source = 0 if "0" in camera_selection else 1 if "1" in camera_selection else 2
     
-    # Check if camera opened successfully
-    if not cap.isOpened():
-        st.error(f"""Failed to access camera {camera_selection}. Please try:
-            1. Select a different camera from the sidebar
-            2. Make sure your webcam is connected and not being used by another application
-            3. Check if your webcam is enabled in system settings
-            4. Try enabling 'Use Mock Camera' option above for a demo without a real camera
-            5. If using Linux, you may need to grant camera permissions
-        """)
-        
-        # Provide troubleshooting help
-        with st.expander("Camera Troubleshooting"):
-            st.markdown("""### Linux Camera Permissions
-            If you're on Linux, try these commands in terminal to check and fix camera permissions:
-            ```bash
-            # List video devices
-            ls -l /dev/video*
-            
-            # Check if your user has permission to access the camera
-            groups $(whoami) | grep video
-            
-            # If not in video group, add yourself (may require restart)
-            sudo usermod -a -G video $(whoami)
-            ```
-            
-            ### Other Common Issues
-            - Make sure no other application is using the camera
-            - Check system settings to ensure camera is enabled
-            - Try unplugging and reconnecting your webcam
-            - Restart your computer
-            """)
-        return
+    # Pipeline settings
+    render_fps = st.sidebar.slider("Display FPS", 5, 30, 15,
+                                   help="How often the video is pushed to the browser")
+    show_overlay = st.sidebar.checkbox("Show Pose Overlay", value=True)
+    multi_person = st.sidebar.checkbox("Multi-person Mode", value=False,
+                                       help="Count reps for everyone in view (group classes)")
+    max_people = st.sidebar.slider("Max People", 2, 10, 4) if multi_person else 1
+    video_delivery = st.sidebar.selectbox(
+        "Video Delivery", ["JPEG", "MJPEG Stream", "PNG (lossless)"],
+        help="JPEG and MJPEG use far less CPU and bandwidth than PNG frames"
+    )
+    jpeg_quality = 70
+    max_stream_width = None
+    if video_delivery != "PNG (lossless)":
+        jpeg_quality = st.sidebar.slider("JPEG Quality", 30, 95, 70)
+        stream_width = st.sidebar.selectbox("Max Video Width", ["640", "480", "320", "960", "Full"])
+        max_stream_width = None if stream_width == "Full" else int(stream_width)
+    backends = available_backends() or ["mediapipe"]
+    pose_backend = st.sidebar.selectbox(
+        "Pose Backend", backends,
+        index=backends.index(default_pose_backend) if default_pose_backend in backends else 0,
+        help="Run `python benchmark.py --mode backends` to find the fastest one on this machine"
+    )
+    backend_options = {}
+    if pose_backend != "mediapipe":
+        threads = st.sidebar.slider("Inference Threads", 0, os.cpu_count() or 1, 0,
+                                    help="0 lets the runtime decide")
+        if threads:
+            backend_options["num_threads"] = threads
+    crop_to_athlete = st.sidebar.checkbox("Crop to Athlete", value=True,
+                                          help="Run the pose model on the region around the "
+                                               "athlete instead of the whole frame")
+    publish_events = st.sidebar.checkbox("Publish Live Events", value=False,
+                                         help="Stream counts and feedback to leaderboards and "
+                                              "displays over SSE/WebSocket")
+    show_metrics = st.sidebar.checkbox("Show Performance Metrics", value=False)
+    record_landmarks = st.sidebar.checkbox("Record Landmarks", value=False,
+                                           help="Save the detected landmarks so the session can "
+                                                "be replayed with landmark_log.py")
+    adaptive_quality = st.sidebar.checkbox("Adaptive Quality", value=True,
+                                           help="Lower the pose model's input resolution and "
+                                                "skip frames when frames take too long")
+    adaptive = None
+    if adaptive_quality:
+        latency_budget = st.sidebar.slider("Latency Budget (ms)", 20, 200, 60)
+        adaptive = AdaptiveController(target_latency=latency_budget / 1000.0)
     
     # Create placeholders for the video and feedback
     video_placeholder = st.empty()
     feedback_placeholder = st.empty()
     count_placeholder = st.empty()
+    analytics_placeholder = st.empty()
+    metrics_placeholder = st.sidebar.empty()
     
     # Add a stop button
     stop_button = st.button("Stop")
     
+    # Stop ends the workout without reopening the camera, and hands this
+    # session's pose graphs back to the pool
+    if stop_button:
+        end_workout()
+        pose_pool.release(current_session_id())
+        multi_pose_pool.release(current_session_id())
+        st.success("Workout complete! Great job!")
+        # Speak goodbye message if voice is enabled
+        if st.session_state.voice_enabled:
+            speak_feedback("Exercise session completed. Great job!", PRIORITY_SESSION)
+        return
+    
+    # Per-stage timings for this session, also exported over HTTP/JSON if configured
+    session_id = current_session_id()
+    metrics = FrameMetrics(labels={"session": session_id})
+    metrics_registry.register(session_id, metrics)
+    if metrics_port:
+        metrics_registry.start_metrics_server(int(metrics_port))
+    last_metrics_export = last_metrics_panel = time.time()
+    
+    # Everything acquired from here on (camera, channels, recorders, threads)
+    # is released in the finally block, even if a rerun interrupts the setup
+    cap = pipeline = stream_channel = event_channel = recorder = landmark_recorder = None
     try:
-        # Process webcam feed
-        while cap.isOpened() and not stop_button:
-            ret, frame = cap.read()
-            if not ret:
-                st.error("Lost connection to webcam")
-                break
-                
-            # Process the frame
-            processed_frame, count, feedback = process_frame(frame, st.session_state.tracker)
-            
-            # Convert the frame to RGB for display
-            rgb_frame = cv2.cvtColor(processed_frame, cv2.COLOR_BGR2RGB)
+        try:
+            cap = capture_manager.open(camera_source)
+        except Exception as e:
+            st.error(f"Error accessing camera {camera_selection}: {str(e)}")
+            st.info("Try enabling 'Use Mock Camera' option above for a demo without a real camera.")
+            return
+        if not cap.isOpened():
+            show_camera_help(camera_selection)
+            return
+        
+        # In MJPEG mode the browser pulls frames from a separate HTTP stream
+        if video_delivery == "MJPEG Stream":
+            stream_channel = get_mjpeg_server().channel(
+                session_id, max_fps=render_fps, quality=jpeg_quality, max_width=max_stream_width)
+            video_placeholder.markdown(
+                f'<img src="{stream_url}{stream_channel.path}" style="width: 100%;">',
+                unsafe_allow_html=True)
+        
+        # Counts and feedback for external subscribers, pushed from the inference thread
+        if publish_events:
+            # Published under a random id: the session id also keys the video stream
+            event_channel = get_event_server().channel(member=member, exercise=exercise_type)
+            st.sidebar.caption(f"Live events: {events_url}/events?session={event_channel.session_id}")
+        
+        # Capture and inference run on background threads; attach the script
+        # context so they can still read st.session_state (e.g. voice settings)
+        roi = RoiTracker() if crop_to_athlete and not multi_person else None
+        if multi_person:
+            # One tracker per person, configured like the single-person tracker
+            def make_tracker():
+                return ExerciseTracker(exercise_type, create_filter(smoothing), hysteresis, bilateral)
+            pipeline = FramePipeline(cap, MultiPersonSession(make_tracker),
+                                     partial(process_frame_multi, session_id=session_id,
+                                             num_poses=max_people, metrics=metrics,
+                                             draw_overlay=show_overlay, events=event_channel),
+                                     thread_hook=add_script_run_ctx, metrics=metrics)
+        else:
+            recorder = workout_recorder(member, exercise_type)
+            if record_landmarks:
+                os.makedirs(recordings_dir, exist_ok=True)
+                # The member name is free text: keep it out of the path and
+                # short enough for the fixed-size log header. The tracker
+                # settings and starting point let replay reproduce the count
+                log_name = f"{time.strftime('%Y%m%d-%H%M%S')}-{session_id[:8]}{LOG_EXTENSION}"
+                tracker = st.session_state.tracker
+                landmark_recorder = LandmarkRecorder(os.path.join(recordings_dir, log_name), exercise_type,
+                                                     member=member[:MAX_MEMBER_LENGTH], smoothing=smoothing,
+                                                     hysteresis=hysteresis, bilateral=bilateral,
+                                                     start_count=tracker.count, start_state=tracker.state)
+            pipeline = FramePipeline(cap, st.session_state.tracker,
+                                     partial(process_frame, session_id=session_id,
+                                             adaptive=adaptive, metrics=metrics,
+                                             draw_overlay=show_overlay, recorder=recorder,
+                                             landmark_recorder=landmark_recorder,
+                                             backend=pose_backend, backend_options=backend_options,
+                                             roi=roi, events=event_channel),
+                                     thread_hook=add_script_run_ctx, metrics=metrics)
+        
+        pipeline.start()
+        render_interval = 1.0 / render_fps
+        last_rep_summary = ""
+        
+        # Render the newest processed frame at the configured rate
+        while pipeline.running:
+            tick = time.time()
+            result = pipeline.latest(timeout=render_interval)
+            if result is None:
+                continue
+            _, rgb_frame, count, feedback = result
             
-            # Display the frame
-            video_placeholder.image(rgb_frame, channels="RGB")
+            # Display the frame (already RGB and annotated)
+            with metrics.stage("display"):
+                if stream_channel is not None:
+                    stream_channel.publish(rgb_frame)
+                elif video_delivery == "JPEG":
+                    # Pre-encoded bytes are sent as-is instead of as a PNG
+                    video_placeholder.image(encode_jpeg(rgb_frame, jpeg_quality, max_stream_width))
+                else:
+                    video_placeholder.image(rgb_frame, channels="RGB")
+            # Everything above encoded the frame synchronously; hand its buffer back
+            pipeline.release(rgb_frame)
+            report_first_frame("first_camera_frame")
             
             # Display feedback and count
             feedback_placeholder.write(f"Feedback: {feedback}")
-            count_placeholder.write(f"Exercise Count: {count}")
+            if multi_person:
+                count_placeholder.write("Exercise Counts: " + ", ".join(
+                    f"#{person_id}: {person_count}" for person_id, person_count in count.items()))
+            else:
+                count_placeholder.write(f"Exercise Count: {count}")
+                rep_summary = describe_rep_analytics(st.session_state.tracker.analytics)
+                if rep_summary != last_rep_summary:
+                    analytics_placeholder.caption(rep_summary)
+                    last_rep_summary = rep_summary
+            
+            # Refresh the metrics panel about once a second
+            if show_metrics and time.time() - last_metrics_panel > 1:
+                last_metrics_panel = time.time()
+                with metrics_placeholder.container():
+                    st.markdown("### Performance")
+                    st.metric("FPS", f"{metrics.fps():.1f}")
+                    st.dataframe([dict(stage=name, **values) for name, values in metrics.summary().items()],
+                                 use_container_width=True)
+                    stats = pipeline.stats()
+                    stats["dropped_frames"] = metrics.dropped
+                    if adaptive is not None:
+                        stats.update(adaptive.stats())
+                    if roi is not None:
+                        stats.update(roi.stats())
+                    if event_channel is not None:
+                        stats["events"] = get_event_server().stats()
+                    stats["startup_ms"] = {stage: round(seconds * 1000, 1)
+                                           for stage, seconds in startup_timings().items()}
+                    st.json(stats)
             
-            # Add a small delay to control frame rate
-            time.sleep(0.01)  # 10ms delay
+            # Periodically dump metrics to the configured JSON file
+            if metrics_json_path and time.time() - last_metrics_export > 5:
+                metrics.write_json(metrics_json_path)
+                last_metrics_export = time.time()
+            
+            # Wait for the next render tick
+            remaining = render_interval - (time.time() - tick)
+            if remaining > 0:
+                time.sleep(remaining)
+        
+        if pipeline.error:
+            st.error(pipeline.error)
     
     finally:
         # Release resources
-        cap.release()
-        # Speak goodbye message if voice is enabled
-        if st.session_state.voice_enabled:
-            speak_feedback("Exercise session completed. Great job!")
+        if pipeline is not None:
+            pipeline.stop()
+        if cap is not None:
+            cap.release()
+        # The workout stays open across reruns; just persist what it recorded
+        if recorder is not None:
+            recorder.flush()
+        if landmark_recorder is not None:
+            landmark_recorder.close()
+        metrics_registry.unregister(session_id)
+        if stream_channel is not None:
+            get_mjpeg_server().remove(session_id)
+        if event_channel is not None:
+            event_channel.close()
+        if metrics_json_path:
+            metrics.write_json(metrics_json_path)
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -0,0 +1,202 @@
+"""Headless batch analysis of recorded workout videos
+
+Usage:
+    python batch_analysis.py VIDEO_DIR --exercise Squats [--workers N] [--output DIR] [--backend NAME]
+
+Each video is scored by a worker process with a fresh pose backend (graph),
+so no tracking state carries over from the previous clip. Videos are
+distributed across workers file by file, since the rep state machine needs
+to see a clip's frames in order. Results mirror the input directory layout
+(e.g. week1/squats.mp4 -> OUTPUT/week1/squats.mp4.json).
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import time
+
+import cv2
+import numpy as np
+
+from exercise_tracker import ExerciseTracker, EXERCISE_TYPES, JOINT_ANGLE_NAMES
+from pose_backends import add_backend_arguments, backend_options_from_args, create_backend
+
+VIDEO_EXTENSIONS = (".mp4", ".mov", ".avi", ".mkv", ".webm", ".m4v")
+
+# Pose backend name and options of the current worker process
+_worker_backend = ("mediapipe", {})
+
+
+def _init_worker(backend, options):
+    global _worker_backend
+    # Let each process use one core; parallelism comes from the pool
+    cv2.setNumThreads(1)
+    _worker_backend = (backend, options)
+
+
+def find_videos(input_dir):
+    """Return the sorted video files found under input_dir"""
+    videos = []
+    for root, _, files in os.walk(input_dir):
+        for name in files:
+            if name.lower().endswith(VIDEO_EXTENSIONS):
+                videos.append(os.path.join(root, name))
+    return sorted(videos)
+
+
+def analyze_video(path, exercise_type, pose=None, backend="mediapipe", backend_options=None):
+    """Run pose inference and rep counting over one video file
+
+    Returns a dict with the final count, per-rep timings and the per-frame
+    joint angle trace (timestamps in seconds from the start of the clip).
+    Without a pose backend a fresh one is created and closed; a caller
+    passing its own must not reuse it across clips without a reset.
+    """
+    own_pose = pose is None
+    if own_pose:
+        pose = create_backend(backend, **(backend_options or {}))
+
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        if own_pose:
+            pose.close()
+        return {"file": path, "exercise_type": exercise_type, "error": "Could not open video"}
+
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    tracker = ExerciseTracker(exercise_type)
+    times = []
+    angles = []
+    reps = []
+    frame_index = 0
+    started = time.time()
+
+    try:
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            timestamp = frame_index / fps
+            frame_index += 1
+
+            points = pose.process(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB), timestamp)
+            if points is None:
+                continue
+
+            previous_count = tracker.count
+            count, _ = tracker.update(points, timestamp=timestamp)
+            times.append(timestamp)
+            angles.append(tracker.angles.copy())
+
+            # Hold exercises (plank) count seconds rather than reps and have
+            # no analytics. A rep runs from leaving the rest position until
+            # it is counted, so pauses between reps aren't included
+            last_rep = tracker.analytics.last_rep if tracker.analytics is not None else None
+            if count > previous_count and last_rep is not None:
+                reps.append({
+                    "rep": count,
+                    "start": round(last_rep.finished_at - last_rep.duration, 3),
+                    "end": round(last_rep.finished_at, 3),
+                    "duration": round(last_rep.duration, 3),
+                    "eccentric": round(last_rep.eccentric, 3),
+                    "concentric": round(last_rep.concentric, 3),
+                    "range_of_motion": round(last_rep.range_of_motion, 1),
+                    "form_score": last_rep.form_score,
+                })
+    finally:
+        cap.release()
+        if own_pose:
+            pose.close()
+
+    return {
+        "file": path,
+        "exercise_type": exercise_type,
+        "count": tracker.count,
+        "frames": frame_index,
+        "frames_with_pose": len(times),
+        "fps": fps,
+        "processing_seconds": round(time.time() - started, 3),
+        "reps": reps,
+        "angle_names": list(JOINT_ANGLE_NAMES),
+        "times": np.asarray(times, dtype=np.float32),
+        "angles": np.asarray(angles, dtype=np.float32).reshape(-1, len(JOINT_ANGLE_NAMES)),
+    }
+
+
+def _analyze_in_worker(args):
+    path, exercise_type = args
+    backend, options = _worker_backend
+    try:
+        return analyze_video(path, exercise_type, backend=backend, backend_options=options)
+    except Exception as e:
+        return {"file": path, "exercise_type": exercise_type, "error": str(e)}
+
+
+def save_result(result, output_dir, input_dir=None):
+    """Write the summary as JSON and the angle trace as a compressed .npz
+
+    Outputs are named after the video's path relative to input_dir,
+    extension included, so clips with the same name in different folders
+    (or with different extensions) don't overwrite each other.
+    """
+    if input_dir:
+        name = os.path.relpath(result["file"], input_dir)
+    else:
+        name = os.path.basename(result["file"])
+    base = os.path.join(output_dir, name)
+    os.makedirs(os.path.dirname(base), exist_ok=True)
+    summary = {k: v for k, v in result.items() if k not in ("times", "angles")}
+    with open(base + ".json", "w") as f:
+        json.dump(summary, f, indent=2)
+    if "angles" in result:
+        np.savez_compressed(base + "_angles.npz", times=result["times"], angles=result["angles"])
+
+
+def analyze_directory(input_dir, exercise_type, workers=None, output_dir=None,
+                      backend="mediapipe", backend_options=None):
+    """Analyze every video under input_dir using a pool of worker processes
+
+    Yields results as they complete; when output_dir is given each result is
+    also written there.
+    """
+    videos = find_videos(input_dir)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    workers = min(workers or os.cpu_count() or 1, max(len(videos), 1))
+
+    with multiprocessing.Pool(workers, initializer=_init_worker,
+                              initargs=(backend, backend_options or {})) as pool:
+        jobs = [(path, exercise_type) for path in videos]
+        for result in pool.imap_unordered(_analyze_in_worker, jobs):
+            if output_dir:
+                save_result(result, output_dir, input_dir)
+            yield result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Count reps in recorded workout videos")
+    parser.add_argument("input_dir", help="Directory containing video files")
+    parser.add_argument("--exercise", required=True, choices=EXERCISE_TYPES,
+                        help="Exercise performed in the videos")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Number of worker processes (default: all cores)")
+    parser.add_argument("--output", default="batch_results",
+                        help="Directory for per-file results")
+    add_backend_arguments(parser)
+    args = parser.parse_args()
+
+    started = time.time()
+    processed = 0
+    for result in analyze_directory(args.input_dir, args.exercise, args.workers,
+                                    args.output, args.backend, backend_options_from_args(args)):
+        processed += 1
+        if "error" in result:
+            print(f"{result['file']}: ERROR {result['error']}")
+        else:
+            print(f"{result['file']}: {result['count']} reps "
+                  f"({result['frames']} frames in {result['processing_seconds']}s)")
+
+    print(f"Analyzed {processed} videos in {time.time() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,258 @@
+"""Reproducible benchmarks for the pose-to-rep pipeline
+
+Usage:
+    python benchmark.py [--frames N] [--exercise NAME ...] [--mode tracker|pipeline|backends]
+                        [--landmarks FILE.npz|FILE.fflm] [--output-dir DIR] [--compare FILE.json]
+
+"tracker" mode replays landmark sequences straight into ExerciseTracker.update;
+"pipeline" mode renders synthetic video and runs it through app.process_frame
+(pose inference included); "backends" mode times each installed pose backend
+(see pose_backends.py) on the same rendered frames. No camera is needed.
+Results are written as JSON named after the current commit so runs can be
+compared across commits.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import time
+import tracemalloc
+from functools import partial
+
+import numpy as np
+
+from exercise_tracker import ExerciseTracker, EXERCISE_TYPES
+from landmark_log import LOG_EXTENSION, LandmarkLog
+from pose_backends import available_backends, create_backend
+from synthetic_motion import generate_sequence, render_skeleton
+
+
+def _latency_summary(latencies):
+    latencies = np.asarray(latencies) * 1000
+    total = latencies.sum() / 1000
+    return {
+        "fps": round(len(latencies) / total, 1) if total > 0 else None,
+        "mean_ms": round(float(latencies.mean()), 4),
+        "p50_ms": round(float(np.percentile(latencies, 50)), 4),
+        "p95_ms": round(float(np.percentile(latencies, 95)), 4),
+        "p99_ms": round(float(np.percentile(latencies, 99)), 4),
+        "max_ms": round(float(latencies.max()), 4),
+    }
+
+
+def _measure(step, n_frames, reset, warmup=10):
+    """Time step(i) per frame, then rerun under tracemalloc for memory stats
+
+    reset() is called before each pass so every pass sees the same sequence.
+    """
+    reset()
+    for i in range(min(warmup, n_frames)):
+        step(i)
+
+    reset()
+    latencies = np.empty(n_frames)
+    for i in range(n_frames):
+        start = time.perf_counter()
+        step(i)
+        latencies[i] = time.perf_counter() - start
+    result = _latency_summary(latencies)
+
+    # Separate pass: tracing slows everything down, so it isn't timed
+    transient = np.empty(n_frames)
+    reset()
+    tracemalloc.start()
+    try:
+        for i in range(n_frames):
+            before, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            step(i)
+            _, peak = tracemalloc.get_traced_memory()
+            transient[i] = peak - before
+        _, peak_total = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    result["alloc_bytes_per_frame"] = int(transient.mean())
+    result["peak_traced_kib"] = round(peak_total / 1024, 1)
+    return result
+
+
+def bench_tracker(exercise_type, times, points):
+    """Replay landmark arrays through ExerciseTracker.update"""
+    state = {}
+
+    def reset():
+        state["tracker"] = ExerciseTracker(exercise_type)
+
+    def step(i):
+        state["tracker"].update(points[i], timestamp=times[i])
+
+    result = _measure(step, len(points), reset)
+    result["count"] = state["tracker"].count
+    return result
+
+
+def bench_pipeline(exercise_type, times, points, width=640, height=480):
+    """Render synthetic video and run it through app.process_frame"""
+    import app
+
+    frames = [render_skeleton(p, width, height) for p in points]
+    session_id = f"benchmark-{exercise_type}"
+    state = {}
+
+    def reset():
+        state["tracker"] = ExerciseTracker(exercise_type)
+        # Start each pass with a fresh Pose graph (no carried-over tracking)
+        app.pose_pool.release(session_id)
+
+    def step(i):
+        app.process_frame(frames[i], state["tracker"], session_id=session_id)
+
+    result = _measure(step, len(frames), reset)
+    result["count"] = state["tracker"].count
+    app.pose_pool.release(session_id)
+    return result
+
+
+def bench_backend(backend_name, exercise_type, times, points, width=640, height=480,
+                  batch_size=1, **options):
+    """Run one pose backend on rendered synthetic frames, batch_size frames per call"""
+    import cv2
+
+    frames = [cv2.cvtColor(render_skeleton(p, width, height), cv2.COLOR_BGR2RGB) for p in points]
+    n_batches = max(len(frames) // batch_size, 1)
+    state = {}
+
+    def reset():
+        if "backend" in state:
+            state["backend"].close()
+        state["backend"] = create_backend(backend_name, **options)
+        state["tracker"] = ExerciseTracker(exercise_type)
+        state["detected"] = 0
+
+    def step(i):
+        batch = slice(i * batch_size, (i + 1) * batch_size)
+        stamps = times[batch]
+        for timestamp, detected in zip(stamps, state["backend"].process_batch(frames[batch], stamps)):
+            if detected is not None:
+                state["detected"] += 1
+                state["tracker"].update(detected, timestamp=timestamp)
+
+    result = _measure(step, n_batches, reset)
+    state["backend"].close()
+    # Latencies are per call; report throughput per frame
+    if result["fps"]:
+        result["fps"] = round(result["fps"] * batch_size, 1)
+    result["batch_size"] = batch_size
+    result["frames_with_pose"] = state["detected"]
+    result["count"] = state["tracker"].count
+    return result
+
+
+def load_landmarks(path):
+    """Load a recorded (times, points) landmark sequence from .npz or a landmark log"""
+    if path.endswith(LOG_EXTENSION):
+        log = LandmarkLog(path)
+        detected = log.detected
+        return np.asarray(log.times[detected]), np.asarray(log.points[detected])
+    data = np.load(path)
+    points = data["points"].astype(np.float32, copy=False)
+    times = data["times"] if "times" in data else np.arange(len(points)) / 30.0
+    return times, points
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"],
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return "unknown"
+
+
+def _max_rss_kib():
+    try:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    except ImportError:
+        return None
+
+
+def compare(current, baseline):
+    """Print the fps/latency change of each benchmark against a baseline run"""
+    for name, result in current["results"].items():
+        previous = baseline["results"].get(name)
+        if not previous:
+            continue
+        for key in ("fps", "p50_ms", "p99_ms", "alloc_bytes_per_frame"):
+            old, new = previous.get(key), result.get(key)
+            if old:
+                change = (new - old) / old * 100
+                print(f"  {name:<24} {key:<22} {old:>12} -> {new:>12} ({change:+.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the pose-to-rep pipeline")
+    parser.add_argument("--frames", type=int, default=900, help="Frames per benchmark")
+    parser.add_argument("--exercise", nargs="+", choices=EXERCISE_TYPES, default=list(EXERCISE_TYPES))
+    parser.add_argument("--mode", choices=("tracker", "pipeline", "backends"), default="tracker")
+    parser.add_argument("--backend", nargs="+", default=None,
+                        help="Pose backends to compare in backends mode (default: all installed)")
+    parser.add_argument("--batch-size", type=int, default=1,
+                        help="Frames per backend call in backends mode")
+    parser.add_argument("--threads", type=int, default=None,
+                        help="Inference threads for the Tasks and ONNX backends")
+    parser.add_argument("--landmarks", help="Replay a recorded landmark sequence (.npz or .fflm) instead")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output-dir", default="benchmark_results")
+    parser.add_argument("--compare", help="Previous results JSON to compare against")
+    args = parser.parse_args()
+
+    results = {}
+    for exercise_type in args.exercise:
+        if args.landmarks:
+            times, points = load_landmarks(args.landmarks)
+        else:
+            times, points = generate_sequence(exercise_type, args.frames, seed=args.seed)
+        runs = {}
+        if args.mode == "backends":
+            for backend_name in args.backend or available_backends():
+                options = {"num_threads": args.threads} if args.threads and backend_name != "mediapipe" else {}
+                runs[f"backends/{backend_name}/{exercise_type}"] = partial(
+                    bench_backend, backend_name, batch_size=args.batch_size, **options)
+        else:
+            bench = bench_tracker if args.mode == "tracker" else bench_pipeline
+            runs[f"{args.mode}/{exercise_type}"] = bench
+        for name, bench in runs.items():
+            results[name] = bench(exercise_type, times, points)
+            r = results[name]
+            print(f"{name:<24} {r['fps']:>10} fps  p50 {r['p50_ms']}ms  p99 {r['p99_ms']}ms  "
+                  f"{r['alloc_bytes_per_frame']} B/frame  count={r['count']}")
+
+    commit = git_commit()
+    report = {
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "frames": args.frames,
+        "seed": args.seed,
+        "max_rss_kib": _max_rss_kib(),
+        "results": results,
+    }
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    path = os.path.join(args.output_dir, f"{args.mode}-{commit}.json")
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Saved results to {path}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
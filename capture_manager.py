@@ -0,0 +1,397 @@
+"""Shared camera ingestion and fair inference scheduling
+
+A CaptureManager opens each source (USB device index, RTSP/HTTP URL or
+video file) once and decodes it on its own thread. Any number of sessions
+can watch the same source; each gets a SharedCapture, a VideoCapture-like
+view that copies the newest decoded frame, so a camera is never decoded
+twice. An InferenceScheduler runs the pose/rep pipeline for many streams
+on a fixed pool of worker threads, giving each stream a frame-rate budget
+and always serving the stream that has waited longest.
+"""
+import os
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from metrics import NULL_METRICS
+from pipeline import BufferPool, BufferRing, LatestQueue
+
+
+def normalize_source(source):
+    """Map "0" to device index 0; paths and URLs are returned unchanged"""
+    if isinstance(source, str) and source.strip().isdigit():
+        return int(source)
+    return source
+
+
+def _is_file(source):
+    return isinstance(source, str) and "://" not in source and os.path.isfile(source)
+
+
+class SharedSource:
+    """One decoded camera/stream/file, read by a single background thread"""
+
+    def __init__(self, source, open_fn=cv2.VideoCapture):
+        self.source = source
+        self.open_fn = open_fn
+        self.cap = None
+        # Set once open() has finished, successfully or not
+        self.ready = threading.Event()
+        self.seq = 0
+        self.captured_at = None
+        self.users = 0
+        self.error = None
+        self._frame_interval = 0.0
+        self._frame = None
+        # One buffer being decoded into, one published
+        self._buffers = BufferRing(2)
+        self._cond = threading.Condition()
+        self._listeners = []
+        self._stopped = False
+        self._thread = None
+
+    def open(self):
+        """Open the source (slow for unreachable streams) and start decoding it"""
+        try:
+            self.cap = self.open_fn(self.source)
+            # Files are paced at their own frame rate instead of decoded flat out
+            fps = self.cap.get(cv2.CAP_PROP_FPS) if _is_file(self.source) else 0
+            self._frame_interval = 1.0 / fps if fps and fps > 0 else 0.0
+            if self.cap.isOpened():
+                self.start()
+        except Exception as e:
+            self.error = f"Could not open {self.source}: {e}"
+            raise
+        finally:
+            self.ready.set()
+        return self
+
+    def isOpened(self):
+        return not self._stopped and self.cap is not None and self.cap.isOpened()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name=f"fitfusion-source-{self.source}")
+        self._thread.daemon = True  # Don't block app exit
+        self._thread.start()
+        return self
+
+    def add_listener(self, callback):
+        """Call callback() (on the decode thread) whenever a new frame arrives"""
+        self._listeners.append(callback)
+
+    def remove_listener(self, callback):
+        if callback in self._listeners:
+            self._listeners.remove(callback)
+
+    def _run(self):
+        next_frame = time.time()
+        while not self._stopped and self.cap.isOpened():
+            ret, frame = self.cap.read(self._buffers.next())
+            if not ret:
+                self.error = f"Lost connection to {self.source}"
+                break
+            self._buffers.replace(frame)
+            with self._cond:
+                self._frame = frame
+                self.seq += 1
+                self.captured_at = time.time()
+                self._cond.notify_all()
+            for callback in list(self._listeners):
+                callback()
+            if self._frame_interval:
+                next_frame += self._frame_interval
+                delay = next_frame - time.time()
+                if delay > 0:
+                    time.sleep(delay)
+        self._stopped = True
+        with self._cond:
+            self._cond.notify_all()
+        for callback in list(self._listeners):
+            callback()
+
+    def latest(self, after_seq=0, out=None, timeout=None):
+        """Copy the newest frame newer than after_seq into out
+
+        Returns (seq, captured_at, frame), or None on timeout or once the
+        source has stopped. The copy is made under the lock, so the decode
+        thread can keep reusing its own two buffers.
+        """
+        with self._cond:
+            if self.seq <= after_seq and not self._stopped:
+                self._cond.wait(timeout)
+            if self.seq <= after_seq or self._frame is None:
+                return None
+            frame = self._frame
+            if out is None or out.shape != frame.shape or out.dtype != frame.dtype:
+                out = np.empty_like(frame)
+            np.copyto(out, frame)
+            return self.seq, self.captured_at, out
+
+    def close(self, timeout=1.0):
+        # A source still being opened is closed once open() returns
+        self.ready.wait()
+        self._stopped = True
+        with self._cond:
+            self._cond.notify_all()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+        if self.cap is not None:
+            self.cap.release()
+
+
+class SharedCapture:
+    """cv2.VideoCapture-like view of a SharedSource, usable by FramePipeline
+
+    read() blocks until a frame newer than the last one returned is decoded.
+    release() only drops this viewer; the source closes with its last viewer.
+    """
+
+    def __init__(self, manager, source):
+        self.manager = manager
+        self.source = source
+        self.last_seq = 0
+        self.last_captured_at = None
+        self._released = False
+
+    def isOpened(self):
+        return not self._released and self.source.isOpened()
+
+    def read(self, image=None, timeout=5.0):
+        if self._released:
+            return False, None
+        item = self.source.latest(self.last_seq, out=image, timeout=timeout)
+        if item is None:
+            return False, None
+        self.last_seq, self.last_captured_at, frame = item
+        return True, frame
+
+    def get(self, prop):
+        return self.source.cap.get(prop)
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self.manager._release(self.source)
+
+
+class CaptureManager:
+    """Opens each source once and shares it between every viewer
+
+    Sources are opened outside the manager's lock: a stream that takes long
+    to connect only holds up the viewers of that same source.
+    """
+
+    def __init__(self, open_fn=cv2.VideoCapture):
+        self.open_fn = open_fn
+        self._sources = {}
+        self._lock = threading.Lock()
+
+    def open(self, source):
+        """Return a SharedCapture for source, starting its decoder if needed"""
+        key = normalize_source(source)
+        stale = None
+        with self._lock:
+            shared = self._sources.get(key)
+            # Reuse a source that is open or still being opened by another viewer
+            build = shared is None or (shared.ready.is_set() and not shared.isOpened())
+            if build:
+                stale = shared
+                shared = self._sources[key] = SharedSource(key, self.open_fn)
+            shared.users += 1
+        if stale is not None:
+            stale.close()
+
+        if not build:
+            shared.ready.wait()
+            return SharedCapture(self, shared)
+        try:
+            shared.open()
+        except Exception:
+            self._release(shared)
+            raise
+        return SharedCapture(self, shared)
+
+    def _release(self, shared):
+        with self._lock:
+            shared.users -= 1
+            if shared.users > 0:
+                return
+            if self._sources.get(shared.source) is shared:
+                del self._sources[shared.source]
+        shared.close()
+
+    def stats(self):
+        """Return viewers, frames decoded and errors per open source"""
+        with self._lock:
+            return {str(key): {"users": shared.users, "frames": shared.seq, "error": shared.error}
+                    for key, shared in self._sources.items()}
+
+    def close(self):
+        with self._lock:
+            sources = list(self._sources.values())
+            self._sources.clear()
+        for shared in sources:
+            shared.close()
+
+
+class _Stream:
+    """Scheduling state of one stream registered with an InferenceScheduler"""
+
+    def __init__(self, name, capture, tracker, process_fn, max_fps, queue_size):
+        self.name = name
+        self.capture = capture
+        self.tracker = tracker
+        self.process_fn = process_fn
+        self.interval = 1.0 / max_fps if max_fps else 0.0
+        # Input: one being processed (only ever by the worker that holds the
+        # stream); output: one being written, queued, on display
+        self.frame_buffers = BufferRing(1)
+        self.render_buffers = BufferPool(queue_size + 2)
+        self.results = LatestQueue(queue_size, on_drop=lambda item: self.render_buffers.release(item[1]))
+        self.next_due = 0.0
+        self.busy = False
+        self.processed = 0
+        self.skipped = 0
+        self.error = None
+
+    def has_frame(self):
+        return self.capture.source.seq > self.capture.last_seq
+
+
+class InferenceScheduler:
+    """Runs process_fn for many streams on a shared pool of worker threads
+
+    Each stream is processed by at most one worker at a time, so its tracker
+    sees frames in order, and at most max_fps times per second. When the
+    pool is saturated the stream that has been due the longest goes first,
+    so every stream gets its share; frames that arrive in between are
+    skipped rather than queued.
+    """
+
+    def __init__(self, workers=None, thread_hook=None, metrics=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.thread_hook = thread_hook
+        self.metrics = metrics or NULL_METRICS
+        self._streams = {}
+        self._cond = threading.Condition()
+        self._stop_event = threading.Event()
+        self._threads = []
+
+    @property
+    def running(self):
+        return not self._stop_event.is_set()
+
+    def add_stream(self, name, capture, tracker, process_fn, max_fps=10, queue_size=1):
+        """Schedule process_fn(frame, tracker, buffers=...) on frames from capture
+
+        process_fn has the FramePipeline signature and returns
+        (frame, count, feedback). Returns the stream; read results with
+        latest(name).
+        """
+        stream = _Stream(name, capture, tracker, process_fn, max_fps, queue_size)
+        with self._cond:
+            if name in self._streams:
+                raise ValueError(f"Stream {name!r} is already scheduled")
+            self._streams[name] = stream
+        capture.source.add_listener(self._wake)
+        return stream
+
+    def remove_stream(self, name):
+        with self._cond:
+            stream = self._streams.pop(name, None)
+        if stream is not None:
+            stream.capture.source.remove_listener(self._wake)
+            stream.results.close()
+        return stream
+
+    def stream(self, name):
+        return self._streams[name]
+
+    def latest(self, name, timeout=None):
+        """Return the newest (captured_at, frame, count, feedback) of a stream
+
+        The frame is the caller's until it hands it back with release().
+        """
+        return self._streams[name].results.get(timeout)
+
+    def release(self, name, frame):
+        """Return a result frame from latest() once it has been used"""
+        stream = self._streams.get(name)
+        if stream is not None:
+            stream.render_buffers.release(frame)
+
+    def start(self):
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._worker_loop, name=f"fitfusion-worker-{index}")
+            thread.daemon = True  # Don't block app exit
+            if self.thread_hook is not None:
+                self.thread_hook(thread)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def stop(self, timeout=1.0):
+        self._stop_event.set()
+        self._wake()
+        for thread in self._threads:
+            if thread is not threading.current_thread():
+                thread.join(timeout)
+        self._threads = []
+
+    def stats(self):
+        """Return processed/skipped frames and errors per stream"""
+        with self._cond:
+            return {name: {"processed": stream.processed, "skipped": stream.skipped,
+                           "error": stream.error}
+                    for name, stream in self._streams.items()}
+
+    def _wake(self):
+        with self._cond:
+            self._cond.notify_all()
+
+    def _next_stream(self):
+        """Claim the most overdue idle stream with a new frame, or None"""
+        with self._cond:
+            while self.running:
+                now = time.time()
+                ready = [s for s in self._streams.values()
+                         if not s.busy and s.error is None and s.has_frame()]
+                due = [s for s in ready if s.next_due <= now]
+                if due:
+                    stream = min(due, key=lambda s: s.next_due)
+                    stream.busy = True
+                    return stream
+                timeout = min(s.next_due for s in ready) - now if ready else 0.1
+                self._cond.wait(max(timeout, 0.001))
+            return None
+
+    def _worker_loop(self):
+        while self.running:
+            stream = self._next_stream()
+            if stream is None:
+                continue
+            started = time.time()
+            try:
+                previous_seq = stream.capture.last_seq
+                ret, frame = stream.capture.read(stream.frame_buffers.next(), timeout=0)
+                if ret:
+                    stream.frame_buffers.replace(frame)
+                    stream.skipped += max(stream.capture.last_seq - previous_seq - 1, 0)
+                    with self.metrics.stage("scheduled_inference"):
+                        processed_frame, count, feedback = stream.process_fn(
+                            frame, stream.tracker, buffers=stream.render_buffers)
+                    stream.processed += 1
+                    if stream.results.put((stream.capture.last_captured_at,
+                                           processed_frame, count, feedback)):
+                        self.metrics.frame_dropped()
+            except Exception as e:
+                stream.error = f"Frame processing failed: {e}"
+                stream.results.close()
+            finally:
+                with self._cond:
+                    stream.busy = False
+                    # Never bank more than one interval of unused budget
+                    stream.next_due = max(stream.next_due + stream.interval, started)
+                    self._cond.notify_all()
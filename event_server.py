@@ -0,0 +1,332 @@
+"""Live rep count events for leaderboards, wall displays and other apps
+
+An EventServer runs an asyncio loop on a background thread and pushes the
+events of every session to any number of subscribers:
+
+    GET /events     Server-Sent Events (EventSource in the browser)
+    GET /ws         WebSocket; each event is one JSON text message
+    GET /sessions   JSON snapshot of each session's latest state
+
+Sessions are published under an opaque id chosen per channel (unless the
+publisher names it, as stations.py does), never the Streamlit session id,
+which also keys other per-session resources. The server listens on
+localhost unless another host is given.
+
+Subscriptions can be narrowed with ?session=<id>[,<id>...] and
+?types=frame,rep,end. Every event is a JSON object such as
+
+    {"type": "rep", "session": "3f2a", "seq": 812, "time": 1718.2, "count": 12, ...}
+
+Publishing never blocks: the inference thread hands events to the loop in
+batches and each event is serialized once for all subscribers. Each
+subscriber has a bounded queue; when a client falls behind, the oldest
+pending frame events are dropped first (only the newest state matters for a
+display), and a client that cannot even keep up with rep events, or whose
+socket stays blocked for write_timeout, is disconnected.
+"""
+import asyncio
+import base64
+import hashlib
+import json
+import secrets
+import struct
+import threading
+import time
+from collections import deque
+from urllib.parse import parse_qs, urlsplit
+
+WEBSOCKET_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+EVENT_TYPES = ("frame", "rep", "end")
+
+
+class Event:
+    """One published event, encoded lazily and at most once per wire format"""
+
+    __slots__ = ("kind", "session", "data", "_json", "_sse", "_ws")
+
+    def __init__(self, kind, session, data):
+        self.kind = kind
+        self.session = session
+        self.data = data
+        self._json = self._sse = self._ws = None
+
+    def json(self):
+        if self._json is None:
+            self._json = json.dumps(self.data, separators=(",", ":"))
+        return self._json
+
+    def sse(self):
+        if self._sse is None:
+            self._sse = f"id: {self.data['seq']}\nevent: {self.kind}\ndata: {self.json()}\n\n".encode("utf-8")
+        return self._sse
+
+    def ws(self):
+        if self._ws is None:
+            self._ws = _ws_frame(0x1, self.json().encode("utf-8"))
+        return self._ws
+
+
+def _ws_frame(opcode, payload):
+    """Encode an unmasked (server to client) WebSocket frame"""
+    length = len(payload)
+    if length < 126:
+        header = struct.pack("!BB", 0x80 | opcode, length)
+    elif length < 1 << 16:
+        header = struct.pack("!BBH", 0x80 | opcode, 126, length)
+    else:
+        header = struct.pack("!BBQ", 0x80 | opcode, 127, length)
+    return header + payload
+
+
+class _Subscriber:
+    """A connected client's filters and bounded queue of pending events"""
+
+    def __init__(self, sessions, kinds, queue_size, encode):
+        self.sessions = sessions
+        self.kinds = kinds
+        self.queue_size = queue_size
+        self.encode = encode
+        self.queue = deque()
+        self.wake = asyncio.Event()
+        self.overflowed = False
+        self.dropped = 0
+
+    def wants(self, event):
+        return (self.sessions is None or event.session in self.sessions) and event.kind in self.kinds
+
+    def offer(self, event):
+        if len(self.queue) >= self.queue_size:
+            # Make room by dropping the oldest frame event; reps are never dropped
+            for index, pending in enumerate(self.queue):
+                if pending.kind == "frame":
+                    del self.queue[index]
+                    self.dropped += 1
+                    break
+            else:
+                self.overflowed = True
+                self.wake.set()
+                return
+        self.queue.append(event)
+        self.wake.set()
+
+
+class EventChannel:
+    """Publishes one session's frame, rep and end events
+
+    Frame events are rate limited to max_fps; rep events always go out.
+    Extra keyword arguments (e.g. member, exercise) are added to every event.
+    Safe to call from the inference thread.
+    """
+
+    def __init__(self, server, session_id, max_fps=10, **info):
+        self.server = server
+        self.session_id = session_id
+        self.max_fps = max_fps
+        self.info = info
+        self._last_frame = 0.0
+
+    def _publish(self, kind, timestamp, fields):
+        data = dict(self.info, time=timestamp or time.time())
+        data.update(fields)
+        self.server.publish(kind, self.session_id, data)
+
+    def frame(self, count, feedback, timestamp=None, **fields):
+        now = time.time()
+        if now - self._last_frame < 1.0 / self.max_fps:
+            return False
+        self._last_frame = now
+        self._publish("frame", timestamp, dict(fields, count=count, feedback=feedback))
+        return True
+
+    def rep(self, count, timestamp=None, **fields):
+        self._publish("rep", timestamp, dict(fields, count=count))
+
+    def close(self):
+        self._publish("end", None, {})
+
+
+class EventServer:
+    """Asyncio SSE/WebSocket server for live session events (one per process)"""
+
+    def __init__(self, port=8503, host="127.0.0.1", queue_size=64, heartbeat=15.0, write_timeout=10.0):
+        self.port = port
+        self.queue_size = queue_size
+        self.heartbeat = heartbeat
+        self.write_timeout = write_timeout
+        self.published = 0
+        self.dropped = 0
+        self.disconnected = 0
+        self._subscribers = set()
+        self._latest = {}
+        self._inbox = deque()
+        self._scheduled = False
+        self._loop = asyncio.new_event_loop()
+        thread = threading.Thread(target=self._loop.run_forever, name="fitfusion-events")
+        thread.daemon = True
+        thread.start()
+        # Surface bind errors to the caller
+        self._server = asyncio.run_coroutine_threadsafe(
+            asyncio.start_server(self._handle, host, port), self._loop).result()
+
+    def channel(self, session_id=None, **options):
+        """Create a channel; without a session_id it gets a random, unguessable one"""
+        return EventChannel(self, session_id or secrets.token_urlsafe(12), **options)
+
+    def publish(self, kind, session_id, data):
+        """Queue an event for every interested subscriber (thread-safe, never blocks)"""
+        self._inbox.append(Event(kind, session_id, data))
+        # One wakeup per batch: the loop drains everything queued so far
+        if not self._scheduled:
+            self._scheduled = True
+            self._loop.call_soon_threadsafe(self._dispatch)
+
+    def _dispatch(self):
+        self._scheduled = False
+        while self._inbox:
+            event = self._inbox.popleft()
+            self.published += 1
+            event.data.update(type=event.kind, session=event.session, seq=self.published)
+            if event.kind == "end":
+                self._latest.pop(event.session, None)
+            else:
+                self._latest[event.session] = event
+            for subscriber in self._subscribers:
+                if subscriber.wants(event):
+                    subscriber.offer(event)
+
+    async def _handle(self, reader, writer):
+        writer.transport.set_write_buffer_limits(high=64 * 1024)
+        try:
+            request = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), 10)
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError,
+                ConnectionError):
+            writer.close()
+            return
+        lines = request.decode("latin-1").split("\r\n")
+        try:
+            method, target, _ = lines[0].split(" ", 2)
+        except ValueError:
+            writer.close()
+            return
+        headers = {}
+        for line in lines[1:]:
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+        url = urlsplit(target)
+        query = parse_qs(url.query)
+
+        try:
+            if method != "GET":
+                await self._respond(writer, "405 Method Not Allowed", b"")
+            elif url.path == "/events":
+                await self._serve_sse(writer, self._subscriber(query, Event.sse))
+            elif url.path == "/ws" and headers.get("upgrade", "").lower() == "websocket":
+                await self._serve_websocket(reader, writer, headers, self._subscriber(query, Event.ws))
+            elif url.path == "/sessions":
+                body = "[" + ",".join(event.json() for event in self._latest.values()) + "]"
+                await self._respond(writer, "200 OK", body.encode("utf-8"), "application/json")
+            else:
+                await self._respond(writer, "404 Not Found", b"")
+        except (ConnectionError, asyncio.TimeoutError):
+            pass
+        finally:
+            writer.close()
+
+    async def _respond(self, writer, status, body, content_type="text/plain"):
+        writer.write(f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\n"
+                     f"Content-Length: {len(body)}\r\nAccess-Control-Allow-Origin: *\r\n"
+                     f"Connection: close\r\n\r\n".encode("latin-1") + body)
+        await writer.drain()
+
+    def _subscriber(self, query, encode):
+        sessions = ",".join(query.get("session", []))
+        kinds = ",".join(query.get("types", []))
+        subscriber = _Subscriber(set(sessions.split(",")) if sessions else None,
+                                 set(kinds.split(",")) if kinds else set(EVENT_TYPES),
+                                 self.queue_size, encode)
+        # Start from the latest state of every matching session
+        for event in self._latest.values():
+            if subscriber.wants(event):
+                subscriber.offer(event)
+        return subscriber
+
+    async def _pump(self, writer, subscriber, ping):
+        """Write queued events to the client until it falls behind or goes away"""
+        self._subscribers.add(subscriber)
+        try:
+            while not writer.is_closing():
+                try:
+                    await asyncio.wait_for(subscriber.wake.wait(), self.heartbeat)
+                except asyncio.TimeoutError:
+                    writer.write(ping)
+                subscriber.wake.clear()
+                if subscriber.overflowed:
+                    self.disconnected += 1
+                    return
+                # Write everything pending, then wait for the socket once
+                while subscriber.queue:
+                    writer.write(subscriber.encode(subscriber.queue.popleft()))
+                try:
+                    await asyncio.wait_for(writer.drain(), self.write_timeout)
+                except asyncio.TimeoutError:
+                    self.disconnected += 1
+                    return
+        finally:
+            self._subscribers.discard(subscriber)
+            self.dropped += subscriber.dropped
+
+    async def _serve_sse(self, writer, subscriber):
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\n"
+                     b"Cache-Control: no-cache\r\nAccess-Control-Allow-Origin: *\r\n"
+                     b"Connection: keep-alive\r\n\r\nretry: 2000\n\n")
+        await self._pump(writer, subscriber, b": ping\n\n")
+
+    async def _serve_websocket(self, reader, writer, headers, subscriber):
+        key = headers.get("sec-websocket-key", "")
+        accept = base64.b64encode(hashlib.sha1((key + WEBSOCKET_GUID).encode("ascii")).digest())
+        writer.write(b"HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\n"
+                     b"Connection: Upgrade\r\nSec-WebSocket-Accept: " + accept + b"\r\n\r\n")
+        # Clients only send control frames; read them alongside the event pump
+        pump = asyncio.ensure_future(self._pump(writer, subscriber, _ws_frame(0x9, b"")))
+        control = asyncio.ensure_future(self._read_websocket(reader, writer))
+        try:
+            await asyncio.wait([pump, control], return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            pump.cancel()
+            control.cancel()
+
+    async def _read_websocket(self, reader, writer):
+        """Answer pings and return when the client closes the connection"""
+        try:
+            while True:
+                first, second = await reader.readexactly(2)
+                opcode, length = first & 0x0F, second & 0x7F
+                if length == 126:
+                    length, = struct.unpack("!H", await reader.readexactly(2))
+                elif length == 127:
+                    length, = struct.unpack("!Q", await reader.readexactly(8))
+                mask = await reader.readexactly(4) if second & 0x80 else b""
+                if length > 1 << 16:
+                    return
+                payload = await reader.readexactly(length)
+                if mask:
+                    payload = bytes(byte ^ mask[index % 4] for index, byte in enumerate(payload))
+                if opcode == 0x8:
+                    writer.write(_ws_frame(0x8, payload[:2]))
+                    return
+                if opcode == 0x9:
+                    writer.write(_ws_frame(0xA, payload))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            return
+
+    def stats(self):
+        return {
+            "subscribers": len(self._subscribers),
+            "sessions": len(self._latest),
+            "published": self.published,
+            "dropped": self.dropped + sum(s.dropped for s in list(self._subscribers)),
+            "disconnected_slow": self.disconnected,
+        }
+
+    def close(self):
+        self._loop.call_soon_threadsafe(self._server.close)
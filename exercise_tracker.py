@@ -1,172 +1,405 @@
-import mediapipe as mp
+import copy
+import enum
+import math
 import numpy as np
+import struct
 import time
 
+from exercises import HOLD_MESSAGE, LANDMARK_NAMES, exercise_names, get_exercise
+from rep_analytics import create_analyzer
+
+# MediaPipe Pose's 33 landmarks (same names and indices as
+# mp.solutions.pose.PoseLandmark), defined here so the tracker and tools
+# built on it don't need to import MediaPipe
+PoseLandmark = enum.IntEnum("PoseLandmark", LANDMARK_NAMES, start=0)
+
+# Skeleton edges between landmarks (same as mp.solutions.pose.POSE_CONNECTIONS)
+POSE_CONNECTIONS = frozenset([
+    (0, 1), (1, 2), (2, 3), (3, 7), (0, 4), (4, 5), (5, 6), (6, 8), (9, 10),
+    (11, 12), (11, 13), (13, 15), (15, 17), (15, 19), (15, 21), (17, 19),
+    (12, 14), (14, 16), (16, 18), (16, 20), (16, 22), (18, 20),
+    (11, 23), (12, 24), (23, 24), (23, 25), (24, 26), (25, 27), (26, 28),
+    (27, 29), (28, 30), (29, 31), (30, 32), (27, 31), (28, 32),
+])
+
+# Each landmark's counterpart on the other side of the body (itself on the midline)
+MIRROR_LANDMARKS = np.array([
+    PoseLandmark["_".join({"LEFT": "RIGHT", "RIGHT": "LEFT"}.get(part, part)
+                          for part in name.split("_"))].value
+    for name in PoseLandmark.__members__
+], dtype=np.intp)
+
+# In bilateral mode both sides count when each is at least this visible
+BILATERAL_MIN_VISIBILITY = 0.5
+
+# Exercises supported by ExerciseTracker
+EXERCISE_TYPES = exercise_names()
+
+# Feedback phrases that don't depend on the count (used to pre-cache speech)
+FIXED_FEEDBACK = tuple(sorted({
+    rule.message
+    for name in EXERCISE_TYPES
+    for rule in get_exercise(name).transitions + get_exercise(name).hints
+    if "{" not in rule.message
+}))
+
+# Number of landmarks produced by MediaPipe Pose
+NUM_LANDMARKS = 33
+
+# Joint angles computed every frame, as (first, vertex, last) landmark triples
+JOINT_ANGLES = (
+    ("left_elbow", PoseLandmark.LEFT_SHOULDER, PoseLandmark.LEFT_ELBOW, PoseLandmark.LEFT_WRIST),
+    ("right_elbow", PoseLandmark.RIGHT_SHOULDER, PoseLandmark.RIGHT_ELBOW, PoseLandmark.RIGHT_WRIST),
+    ("left_knee", PoseLandmark.LEFT_HIP, PoseLandmark.LEFT_KNEE, PoseLandmark.LEFT_ANKLE),
+    ("right_knee", PoseLandmark.RIGHT_HIP, PoseLandmark.RIGHT_KNEE, PoseLandmark.RIGHT_ANKLE),
+    ("left_hip", PoseLandmark.LEFT_SHOULDER, PoseLandmark.LEFT_HIP, PoseLandmark.LEFT_KNEE),
+    ("right_hip", PoseLandmark.RIGHT_SHOULDER, PoseLandmark.RIGHT_HIP, PoseLandmark.RIGHT_KNEE),
+)
+JOINT_ANGLE_NAMES = tuple(name for name, _, _, _ in JOINT_ANGLES)
+(ANGLE_LEFT_ELBOW, ANGLE_RIGHT_ELBOW, ANGLE_LEFT_KNEE,
+ ANGLE_RIGHT_KNEE, ANGLE_LEFT_HIP, ANGLE_RIGHT_HIP) = range(len(JOINT_ANGLES))
+
+# Tracker snapshot: format version, flags, count, last count time, rep start
+# time (NaN when not started), frame timestamp and hysteresis, followed by
+# the exercise type, phase state and feedback as length-prefixed UTF-8
+# strings. Version 1 had no flags (always zero there).
+SNAPSHOT_VERSION = 2
+SNAPSHOT_BILATERAL = 0x01
+_SNAPSHOT = struct.Struct("<BB2xidddd")
+_SNAPSHOT_STRING = struct.Struct("<H")
+
+_ANGLE_A = np.array([a.value for _, a, _, _ in JOINT_ANGLES], dtype=np.intp)
+_ANGLE_B = np.array([b.value for _, _, b, _ in JOINT_ANGLES], dtype=np.intp)
+_ANGLE_C = np.array([c.value for _, _, _, c in JOINT_ANGLES], dtype=np.intp)
+
+
+def landmarks_to_array(landmarks, out=None):
+    """Copy MediaPipe landmarks into a (33, 4) float32 array of x, y, z, visibility"""
+    if isinstance(landmarks, np.ndarray):
+        return landmarks
+    if out is None:
+        out = np.empty((NUM_LANDMARKS, 4), dtype=np.float32)
+    for i, lm in enumerate(landmarks):
+        row = out[i]
+        row[0] = lm.x
+        row[1] = lm.y
+        row[2] = lm.z
+        row[3] = lm.visibility
+    return out
+
+
+def compute_angles(points, a_index, b_index, c_index, out=None):
+    """Compute the angles at b for every (a, b, c) landmark index triple in one pass"""
+    a = points[a_index]
+    b = points[b_index]
+    c = points[c_index]
+    radians = (np.arctan2(c[:, 1] - b[:, 1], c[:, 0] - b[:, 0]) -
+               np.arctan2(a[:, 1] - b[:, 1], a[:, 0] - b[:, 0]))
+    angles = np.abs(np.degrees(radians))
+    angles = np.where(angles > 180.0, 360.0 - angles, angles)
+    if out is None:
+        return angles
+    out[:] = angles
+    return out
+
+
+def compute_angles_3d(points, a_index, b_index, c_index, out=None):
+    """Compute the 3D angles at b for every (a, b, c) index triple in one pass
+
+    Uses x, y and z, so it is meant for metric world landmarks.
+    """
+    u = points[a_index, :3] - points[b_index, :3]
+    v = points[c_index, :3] - points[b_index, :3]
+    cosine = np.einsum("ij,ij->i", u, v) / np.maximum(
+        np.linalg.norm(u, axis=1) * np.linalg.norm(v, axis=1), 1e-9)
+    angles = np.degrees(np.arccos(np.clip(cosine, -1.0, 1.0)))
+    if out is None:
+        return angles
+    out[:] = angles
+    return out
+
+
+def compute_joint_angles(points, out=None):
+    """Compute every angle in JOINT_ANGLES from a landmark array in one pass"""
+    return compute_angles(points, _ANGLE_A, _ANGLE_B, _ANGLE_C, out)
+
+
+class CompiledExercise:
+    """An ExerciseDefinition flattened into arrays for the table-driven engine
+
+    The angles needed are JOINT_ANGLES followed by any extra triples the
+    rules use, and every rule (transitions first, then hints) becomes one
+    row of the state/angle/sign/threshold tables so all rules are tested
+    with a single vectorized comparison per frame.
+    """
+
+    def __init__(self, definition):
+        self.definition = definition
+        self.hold = definition.hold
+
+        triples = [(a.name, b.name, c.name) for _, a, b, c in JOINT_ANGLES]
+        rules = definition.transitions + definition.hints
+        for rule in rules:
+            if tuple(rule.angle) not in triples:
+                triples.append(tuple(rule.angle))
+        self.angle_a = np.array([PoseLandmark[a].value for a, _, _ in triples], dtype=np.intp)
+        self.angle_b = np.array([PoseLandmark[b].value for _, b, _ in triples], dtype=np.intp)
+        self.angle_c = np.array([PoseLandmark[c].value for _, _, c in triples], dtype=np.intp)
+        # Every triple followed by its mirror image, for bilateral tracking
+        self.side_a = np.concatenate([self.angle_a, MIRROR_LANDMARKS[self.angle_a]])
+        self.side_b = np.concatenate([self.angle_b, MIRROR_LANDMARKS[self.angle_b]])
+        self.side_c = np.concatenate([self.angle_c, MIRROR_LANDMARKS[self.angle_c]])
+
+        states = [definition.start_state]
+        for rule in definition.transitions:
+            for state in (rule.state, rule.next_state):
+                if state not in states:
+                    states.append(state)
+        for rule in definition.hints:
+            if rule.state not in states:
+                states.append(rule.state)
+        self.states = tuple(states)
+        self.state_ids = {state: i for i, state in enumerate(states)}
+
+        n_transitions = len(definition.transitions)
+        self.rule_state = np.array([self.state_ids[r.state] for r in rules], dtype=np.intp)
+        self.rule_angle = np.array([triples.index(tuple(r.angle)) for r in rules], dtype=np.intp)
+        self.rule_sign = np.array([1.0 if r.op == ">" else -1.0 for r in rules], dtype=np.float32)
+        self.rule_threshold = np.array([r.threshold for r in rules], dtype=np.float32)
+        self.rule_is_transition = np.arange(len(rules)) < n_transitions
+        self.rule_next_state = [self.state_ids[r.next_state] for r in definition.transitions]
+        self.rule_counts = [r.counts for r in definition.transitions]
+        self.rule_message = [r.message for r in rules]
+
+    def compute_angles(self, points, out=None):
+        return compute_angles(points, self.angle_a, self.angle_b, self.angle_c, out)
+
+    def match(self, angles, state_id, hysteresis=0.0):
+        """Return the index of the first rule that fires, or -1"""
+        if not len(self.rule_state):
+            return -1
+        # Transitions must clear their threshold by the hysteresis margin
+        margin = self.rule_is_transition * np.float32(hysteresis)
+        fired = (self.rule_state == state_id) & (
+            self.rule_sign * (angles[self.rule_angle] - self.rule_threshold) > margin)
+        hits = np.flatnonzero(fired)
+        return int(hits[0]) if len(hits) else -1
+
+
+_compiled = {}
+
+
+def compile_exercise(exercise_type):
+    """Return the compiled form of a registered exercise (cached)"""
+    definition = get_exercise(exercise_type)
+    compiled = _compiled.get(exercise_type)
+    if compiled is None or compiled.definition is not definition:
+        compiled = _compiled[exercise_type] = CompiledExercise(definition)
+    return compiled
+
+
 class ExerciseTracker:
-    def __init__(self, exercise_type):
+    # Fixed attribute set: no per-instance dict, and snapshot() below
+    # captures everything that isn't a reusable buffer
+    __slots__ = ("exercise_type", "exercise", "_landmark_filter", "world_filter", "hysteresis", "count",
+                 "_state_id", "last_count_time", "feedback", "rep_start_time", "timestamp",
+                 "points", "all_angles", "angles", "analytics", "_bilateral", "side_angles",
+                 "asymmetry")
+
+    def __init__(self, exercise_type, landmark_filter=None, hysteresis=0.0, bilateral=False):
         self.exercise_type = exercise_type
+        self.exercise = compile_exercise(exercise_type)
+        # Optional temporal filter applied to the landmarks before angles
+        self.landmark_filter = landmark_filter
+        # Extra margin (degrees) an angle must pass a threshold by to change state
+        self.hysteresis = hysteresis
         self.count = 0
-        self.state = "down"  # Initial state for push-ups and squats
+        # Phase state as an index into exercise.states ("down" for the built-in exercises)
+        self._state_id = 0
         self.last_count_time = time.time()
         self.feedback = ""
         self.rep_start_time = None
+        # Time of the frame being processed (wall clock unless given)
+        self.timestamp = self.last_count_time
+        # Reused every frame to avoid per-frame allocations
+        self.points = np.zeros((NUM_LANDMARKS, 4), dtype=np.float32)
+        self.all_angles = np.zeros(len(self.exercise.angle_a), dtype=np.float32)
+        # The standard JOINT_ANGLES come first
+        # Bilateral mode: each angle on both sides, and their difference
+        n_angles = len(self.exercise.angle_a)
+        self.side_angles = np.zeros(2 * n_angles, dtype=np.float32)
+        self.asymmetry = np.full(n_angles, np.nan, dtype=np.float32)
+        self.bilateral = bilateral
+        # Tempo, range of motion and form score of every rep (None for
+        # holds and exercises that never count a rep)
+        self.analytics = create_analyzer(self.exercise)
+    
+    @property
+    def landmark_filter(self):
+        return self._landmark_filter
+    
+    @landmark_filter.setter
+    def landmark_filter(self, landmark_filter):
+        self._landmark_filter = landmark_filter
+        # World landmarks are another coordinate frame: same filter, own state
+        self.world_filter = None
+        if landmark_filter is not None:
+            self.world_filter = copy.deepcopy(landmark_filter)
+            self.world_filter.reset()
+    
+    @property
+    def bilateral(self):
+        """Track both sides of the body (in 3D when world landmarks are given)"""
+        return self._bilateral
+    
+    @bilateral.setter
+    def bilateral(self, enabled):
+        self._bilateral = bool(enabled)
+        # The standard JOINT_ANGLES come first; in bilateral mode they are
+        # measured per side while the rules see the fused angles
+        source = self.side_angles if self._bilateral else self.all_angles
+        self.angles = source[:len(JOINT_ANGLES)]
+        self.asymmetry[:] = np.nan
+    
+    @property
+    def state(self):
+        return self.exercise.states[self._state_id]
+    
+    @state.setter
+    def state(self, state):
+        self._state_id = self.exercise.state_ids[state]
+    
+    def snapshot(self):
+        """Serialize the counting state to a few dozen bytes
         
-    def calculate_angle(self, a, b, c):
-        """Calculate the angle between three points"""
-        a = np.array(a)
-        b = np.array(b)
-        c = np.array(c)
-        
-        radians = np.arctan2(c[1]-b[1], c[0]-b[0]) - np.arctan2(a[1]-b[1], a[0]-b[0])
-        angle = np.abs(radians*180.0/np.pi)
-        
-        if angle > 180.0:
-            angle = 360-angle
-            
-        return angle
+        The landmark filter, rep analytics and per-frame buffers are not
+        included; a restored tracker's filter starts over on its first frame
+        and its analytics with the next rep.
+        """
+        rep_start_time = math.nan if self.rep_start_time is None else self.rep_start_time
+        flags = SNAPSHOT_BILATERAL if self._bilateral else 0
+        data = [_SNAPSHOT.pack(SNAPSHOT_VERSION, flags, self.count, self.last_count_time,
+                               rep_start_time, self.timestamp, self.hysteresis)]
+        for text in (self.exercise_type, self.state, self.feedback):
+            encoded = text.encode("utf-8")
+            data.append(_SNAPSHOT_STRING.pack(len(encoded)))
+            data.append(encoded)
+        return b"".join(data)
     
-    def track_pushup(self, landmarks):
-        """Track push-up exercise"""
-        if landmarks:
-            # Get relevant landmarks
-            left_shoulder = [landmarks[mp.solutions.pose.PoseLandmark.LEFT_SHOULDER.value].x,
-                           landmarks[mp.solutions.pose.PoseLandmark.LEFT_SHOULDER.value].y]
-            left_elbow = [landmarks[mp.solutions.pose.PoseLandmark.LEFT_ELBOW.value].x,
-                         landmarks[mp.solutions.pose.PoseLandmark.LEFT_ELBOW.value].y]
-            left_wrist = [landmarks[mp.solutions.pose.PoseLandmark.LEFT_WRIST.value].x,
-                         landmarks[mp.solutions.pose.PoseLandmark.LEFT_WRIST.value].y]
-            
-            # Calculate angle
-            angle = self.calculate_angle(left_shoulder, left_elbow, left_wrist)
-            
-            # Count logic
-            if angle < 90 and self.state == "down":
-                self.state = "up"
-                self.feedback = "Good form! Keep going up"
-            elif angle > 160 and self.state == "up":
-                self.state = "down"
-                self.count += 1
-                self.last_count_time = time.time()
-                self.feedback = f"Rep {self.count} completed!"
-            elif self.state == "up" and angle < 160:
-                self.feedback = "Go all the way up!"
-            elif self.state == "down" and angle > 90:
-                self.feedback = "Go lower for a proper push-up"
-                
-        return self.count, self.feedback
+    @classmethod
+    def restore(cls, data, landmark_filter=None):
+        """Create a tracker from snapshot() bytes"""
+        version, flags, count, last_count_time, rep_start_time, timestamp, hysteresis = \
+            _SNAPSHOT.unpack_from(data)
+        if version not in (1, SNAPSHOT_VERSION):
+            raise ValueError(f"Unsupported tracker snapshot version {version}")
+        offset = _SNAPSHOT.size
+        texts = []
+        for _ in range(3):
+            length, = _SNAPSHOT_STRING.unpack_from(data, offset)
+            offset += _SNAPSHOT_STRING.size
+            texts.append(bytes(data[offset:offset + length]).decode("utf-8"))
+            offset += length
+        exercise_type, state, feedback = texts
+        
+        tracker = cls(exercise_type, landmark_filter, hysteresis, bool(flags & SNAPSHOT_BILATERAL))
+        tracker.count = count
+        tracker.state = state
+        tracker.last_count_time = last_count_time
+        tracker.rep_start_time = None if math.isnan(rep_start_time) else rep_start_time
+        tracker.timestamp = timestamp
+        tracker.feedback = feedback
+        return tracker
     
-    def track_squat(self, landmarks):
-        """Track squat exercise"""
-        if landmarks:
-            # Get relevant landmarks
-            left_hip = [landmarks[mp.solutions.pose.PoseLandmark.LEFT_HIP.value].x,
-                       landmarks[mp.solutions.pose.PoseLandmark.LEFT_HIP.value].y]
-            left_knee = [landmarks[mp.solutions.pose.PoseLandmark.LEFT_KNEE.value].x,
-                        landmarks[mp.solutions.pose.PoseLandmark.LEFT_KNEE.value].y]
-            left_ankle = [landmarks[mp.solutions.pose.PoseLandmark.LEFT_ANKLE.value].x,
-                         landmarks[mp.solutions.pose.PoseLandmark.LEFT_ANKLE.value].y]
-            
-            # Calculate angle
-            angle = self.calculate_angle(left_hip, left_knee, left_ankle)
-            
-            # Count logic
-            if angle < 90 and self.state == "down":
-                self.state = "up"
-                self.feedback = "Good depth! Now stand up"
-            elif angle > 160 and self.state == "up":
-                self.state = "down"
-                self.count += 1
-                self.last_count_time = time.time()
-                self.feedback = f"Rep {self.count} completed!"
-            elif self.state == "up" and angle < 160:
-                self.feedback = "Stand up straight!"
-            elif self.state == "down" and angle > 90:
-                self.feedback = "Go lower for a proper squat"
-                
-        return self.count, self.feedback
+    def __reduce__(self):
+        # Pickle (e.g. to another worker process) as a snapshot
+        return _restore_tracker, (self.snapshot(), self.landmark_filter)
     
-    def track_crunch(self, landmarks):
-        """Track crunch exercise"""
-        if landmarks:
-            # Get relevant landmarks
-            left_shoulder = [landmarks[mp.solutions.pose.PoseLandmark.LEFT_SHOULDER.value].x,
-                           landmarks[mp.solutions.pose.PoseLandmark.LEFT_SHOULDER.value].y]
-            left_hip = [landmarks[mp.solutions.pose.PoseLandmark.LEFT_HIP.value].x,
-                       landmarks[mp.solutions.pose.PoseLandmark.LEFT_HIP.value].y]
-            left_knee = [landmarks[mp.solutions.pose.PoseLandmark.LEFT_KNEE.value].x,
-                        landmarks[mp.solutions.pose.PoseLandmark.LEFT_KNEE.value].y]
-            
-            # Calculate angle between shoulder, hip, and knee
-            angle = self.calculate_angle(left_shoulder, left_hip, left_knee)
-            
-            # Count logic
-            if angle < 60 and self.state == "down":
-                self.state = "up"
-                self.feedback = "Good crunch! Now lower down"
-            elif angle > 120 and self.state == "up":
-                self.state = "down"
-                self.count += 1
-                self.last_count_time = time.time()
-                self.feedback = f"Rep {self.count} completed!"
-            elif self.state == "up" and angle > 60:
-                self.feedback = "Keep your core engaged!"
-            elif self.state == "down" and angle < 120:
-                self.feedback = "Lower down completely"
-                
+    def track_reps(self):
+        """Advance the exercise's phase state machine using the current angles"""
+        exercise = self.exercise
+        rule = exercise.match(self.all_angles, self._state_id, self.hysteresis)
+        counted = False
+        if rule >= 0:
+            if rule < len(exercise.rule_next_state):
+                self._state_id = exercise.rule_next_state[rule]
+                if exercise.rule_counts[rule]:
+                    self.count += 1
+                    self.last_count_time = self.timestamp
+                    counted = True
+            self.feedback = exercise.rule_message[rule].format(count=self.count)
+        if self.analytics is not None:
+            self.analytics.observe(self.timestamp, self.all_angles, self._state_id, counted,
+                                   self.asymmetry if self._bilateral else None)
         return self.count, self.feedback
     
-    def track_pullup(self, landmarks):
-        """Track pull-up exercise"""
-        if landmarks:
-            # Get relevant landmarks
-            left_shoulder = [landmarks[mp.solutions.pose.PoseLandmark.LEFT_SHOULDER.value].x,
-                           landmarks[mp.solutions.pose.PoseLandmark.LEFT_SHOULDER.value].y]
-            left_elbow = [landmarks[mp.solutions.pose.PoseLandmark.LEFT_ELBOW.value].x,
-                         landmarks[mp.solutions.pose.PoseLandmark.LEFT_ELBOW.value].y]
-            left_wrist = [landmarks[mp.solutions.pose.PoseLandmark.LEFT_WRIST.value].x,
-                         landmarks[mp.solutions.pose.PoseLandmark.LEFT_WRIST.value].y]
-            
-            # Calculate angle
-            angle = self.calculate_angle(left_shoulder, left_elbow, left_wrist)
-            
-            # Count logic
-            if angle > 160 and self.state == "down":
-                self.state = "up"
-                self.feedback = "Good form! Keep pulling up"
-            elif angle < 90 and self.state == "up":
-                self.state = "down"
-                self.count += 1
-                self.last_count_time = time.time()
-                self.feedback = f"Rep {self.count} completed!"
-            elif self.state == "up" and angle > 90:
-                self.feedback = "Pull up higher!"
-            elif self.state == "down" and angle < 160:
-                self.feedback = "Lower down completely"
-                
+    def track_hold(self):
+        """Track the duration of a hold exercise (e.g. plank) in seconds"""
+        if self.rep_start_time is None:
+            self.rep_start_time = self.timestamp
+        
+        duration = int(self.timestamp - self.rep_start_time)
+        self.count = duration
+        self.feedback = HOLD_MESSAGE.format(duration=duration)
         return self.count, self.feedback
     
-    def track_plank(self, landmarks):
-        """Track plank exercise duration"""
-        if landmarks:
-            # For plank, we track duration in seconds
-            if self.rep_start_time is None:
-                self.rep_start_time = time.time()
-            
-            duration = int(time.time() - self.rep_start_time)
-            self.count = duration
-            self.feedback = f"Hold for {duration} seconds"
-        return self.count, self.feedback
+    def compute_bilateral_angles(self, landmarks, world_landmarks=None):
+        """Measure every angle on both sides and fuse them by visibility
+        
+        Angles are 3D when world landmarks are given. Where both sides are
+        visible the angle is their visibility-weighted mean and asymmetry
+        holds (this side - other side); otherwise the more visible side is
+        used and asymmetry is NaN.
+        """
+        exercise = self.exercise
+        n_angles = len(exercise.angle_a)
+        if world_landmarks is not None:
+            compute_angles_3d(world_landmarks, exercise.side_a, exercise.side_b, exercise.side_c,
+                              out=self.side_angles)
+        else:
+            compute_angles(landmarks, exercise.side_a, exercise.side_b, exercise.side_c,
+                           out=self.side_angles)
+        visibility = np.clip(landmarks[:, 3], 0.0, 1.0)
+        side_visibility = np.minimum(np.minimum(visibility[exercise.side_a], visibility[exercise.side_b]),
+                                     visibility[exercise.side_c])
+        own, other = self.side_angles[:n_angles], self.side_angles[n_angles:]
+        own_visibility, other_visibility = side_visibility[:n_angles], side_visibility[n_angles:]
+        both = (own_visibility >= BILATERAL_MIN_VISIBILITY) & (other_visibility >= BILATERAL_MIN_VISIBILITY)
+        fused = (own * own_visibility + other * other_visibility) / np.maximum(
+            own_visibility + other_visibility, 1e-6)
+        self.all_angles[:] = np.where(both, fused, np.where(own_visibility >= other_visibility, own, other))
+        self.asymmetry[:] = np.where(both, own - other, np.nan)
+        return self.all_angles
     
-    def update(self, landmarks):
-        """Update exercise count based on exercise type"""
-        if self.exercise_type == "Push-ups":
-            return self.track_pushup(landmarks)
-        elif self.exercise_type == "Squats":
-            return self.track_squat(landmarks)
-        elif self.exercise_type == "Crunches":
-            return self.track_crunch(landmarks)
-        elif self.exercise_type == "Pull-ups":
-            return self.track_pullup(landmarks)
-        elif self.exercise_type == "Plank":
-            return self.track_plank(landmarks)
-        return self.count, self.feedback 
\ No newline at end of file
+    def update(self, landmarks, timestamp=None, world_landmarks=None):
+        """Update exercise count based on exercise type
+        
+        timestamp is the frame time in seconds; recorded video passes its own
+        clock here, live capture defaults to the wall clock. world_landmarks
+        (metric 3D landmarks, e.g. MediaPipe's pose_world_landmarks) are
+        used in bilateral mode when available.
+        """
+        self.timestamp = time.time() if timestamp is None else timestamp
+        if landmarks is None or len(landmarks) == 0:
+            return self.count, self.feedback
+        
+        # Convert the landmarks once and compute all joint angles together
+        landmarks = landmarks_to_array(landmarks, out=self.points)
+        if self._landmark_filter is not None:
+            landmarks = self._landmark_filter(landmarks, self.timestamp)
+        if self._bilateral:
+            if world_landmarks is not None:
+                world_landmarks = landmarks_to_array(world_landmarks)
+                if self.world_filter is not None:
+                    world_landmarks = self.world_filter(world_landmarks, self.timestamp)
+            self.compute_bilateral_angles(landmarks, world_landmarks)
+        else:
+            self.exercise.compute_angles(landmarks, out=self.all_angles)
+        
+        if self.exercise.hold:
+            return self.track_hold()
+        return self.track_reps()
+
+
+def _restore_tracker(data, landmark_filter):
+    return ExerciseTracker.restore(data, landmark_filter)
@@ -0,0 +1,189 @@
+"""Declarative exercise definitions
+
+Each exercise is data: the joint angles it watches, the phase transitions
+(with the thresholds that trigger them), form hints and on-screen
+instructions. ExerciseTracker compiles a definition once into index and
+threshold arrays and runs it with a shared table-driven engine, so new
+exercises can be added here, or from a JSON file named by the
+FITFUSION_EXERCISES_FILE environment variable, without writing tracker code.
+
+Angles are (first, vertex, last) triples of MediaPipe PoseLandmark names.
+A rule fires when `angle <op> threshold` holds in the given state; the
+first matching transition wins, otherwise the first matching hint sets the
+feedback.
+"""
+import json
+import os
+from collections import OrderedDict, namedtuple
+
+# MediaPipe Pose's 33 landmark names, in index order (the tracker's PoseLandmark)
+LANDMARK_NAMES = (
+    "NOSE", "LEFT_EYE_INNER", "LEFT_EYE", "LEFT_EYE_OUTER", "RIGHT_EYE_INNER", "RIGHT_EYE",
+    "RIGHT_EYE_OUTER", "LEFT_EAR", "RIGHT_EAR", "MOUTH_LEFT", "MOUTH_RIGHT",
+    "LEFT_SHOULDER", "RIGHT_SHOULDER", "LEFT_ELBOW", "RIGHT_ELBOW", "LEFT_WRIST", "RIGHT_WRIST",
+    "LEFT_PINKY", "RIGHT_PINKY", "LEFT_INDEX", "RIGHT_INDEX", "LEFT_THUMB", "RIGHT_THUMB",
+    "LEFT_HIP", "RIGHT_HIP", "LEFT_KNEE", "RIGHT_KNEE", "LEFT_ANKLE", "RIGHT_ANKLE",
+    "LEFT_HEEL", "RIGHT_HEEL", "LEFT_FOOT_INDEX", "RIGHT_FOOT_INDEX",
+)
+
+# Move to next_state when the angle passes the threshold; counts=True adds a rep
+Transition = namedtuple("Transition", ["state", "angle", "op", "threshold", "next_state",
+                                       "message", "counts"], defaults=(False,))
+# Form feedback shown while in state when the angle condition holds
+Hint = namedtuple("Hint", ["state", "angle", "op", "threshold", "message"])
+# concentric_first: the first half of a rep (leaving the rest position) is the
+# lifting phase, e.g. crunches; otherwise a rep starts with the lowering phase
+ExerciseDefinition = namedtuple("ExerciseDefinition", [
+    "name", "instructions", "transitions", "hints", "hold", "start_state", "concentric_first"
+], defaults=((), (), False, "down", False))
+
+LEFT_ELBOW = ("LEFT_SHOULDER", "LEFT_ELBOW", "LEFT_WRIST")
+LEFT_KNEE = ("LEFT_HIP", "LEFT_KNEE", "LEFT_ANKLE")
+LEFT_HIP = ("LEFT_SHOULDER", "LEFT_HIP", "LEFT_KNEE")
+
+REP_MESSAGE = "Rep {count} completed!"
+HOLD_MESSAGE = "Hold for {duration} seconds"
+
+BUILTIN_EXERCISES = (
+    ExerciseDefinition(
+        name="Push-ups",
+        instructions=(
+            "Start in a plank position",
+            "Lower your body until your chest nearly touches the floor",
+            "Push back up to the starting position",
+            "Keep your body straight throughout the movement",
+        ),
+        transitions=(
+            Transition("down", LEFT_ELBOW, "<", 90, "up", "Good form! Keep going up"),
+            Transition("up", LEFT_ELBOW, ">", 160, "down", REP_MESSAGE, counts=True),
+        ),
+        hints=(
+            Hint("up", LEFT_ELBOW, "<", 160, "Go all the way up!"),
+            Hint("down", LEFT_ELBOW, ">", 90, "Go lower for a proper push-up"),
+        ),
+    ),
+    ExerciseDefinition(
+        name="Squats",
+        instructions=(
+            "Stand with feet shoulder-width apart",
+            "Lower your body by bending your knees",
+            "Keep your back straight and chest up",
+            "Return to the starting position",
+        ),
+        transitions=(
+            Transition("down", LEFT_KNEE, "<", 90, "up", "Good depth! Now stand up"),
+            Transition("up", LEFT_KNEE, ">", 160, "down", REP_MESSAGE, counts=True),
+        ),
+        hints=(
+            Hint("up", LEFT_KNEE, "<", 160, "Stand up straight!"),
+            Hint("down", LEFT_KNEE, ">", 90, "Go lower for a proper squat"),
+        ),
+    ),
+    ExerciseDefinition(
+        name="Crunches",
+        instructions=(
+            "Lie on your back with knees bent",
+            "Place hands behind your head",
+            "Lift your upper body towards your knees",
+            "Lower back down with control",
+        ),
+        transitions=(
+            Transition("down", LEFT_HIP, "<", 60, "up", "Good crunch! Now lower down"),
+            Transition("up", LEFT_HIP, ">", 120, "down", REP_MESSAGE, counts=True),
+        ),
+        hints=(
+            Hint("up", LEFT_HIP, ">", 60, "Keep your core engaged!"),
+            Hint("down", LEFT_HIP, "<", 120, "Lower down completely"),
+        ),
+        concentric_first=True,
+    ),
+    ExerciseDefinition(
+        name="Pull-ups",
+        instructions=(
+            "Hang from a bar with hands shoulder-width apart",
+            "Pull your body up until your chin clears the bar",
+            "Lower yourself back down with control",
+            "Keep your core engaged throughout",
+        ),
+        transitions=(
+            Transition("down", LEFT_ELBOW, ">", 160, "up", "Good form! Keep pulling up"),
+            Transition("up", LEFT_ELBOW, "<", 90, "down", REP_MESSAGE, counts=True),
+        ),
+        hints=(
+            Hint("up", LEFT_ELBOW, ">", 90, "Pull up higher!"),
+            Hint("down", LEFT_ELBOW, "<", 160, "Lower down completely"),
+        ),
+    ),
+    ExerciseDefinition(
+        name="Plank",
+        instructions=(
+            "Start in a push-up position",
+            "Lower onto your forearms",
+            "Keep your body in a straight line",
+            "Hold the position",
+        ),
+        hold=True,
+    ),
+)
+
+_registry = OrderedDict()
+
+
+def register_exercise(definition):
+    """Add (or replace) an exercise definition, raising ValueError if it is invalid"""
+    states = {definition.start_state}
+    for rule in definition.transitions:
+        states.update((rule.state, rule.next_state))
+    for rule in definition.transitions + definition.hints:
+        if rule.op not in ("<", ">"):
+            raise ValueError(f"{definition.name}: unsupported comparison {rule.op!r}")
+        if len(rule.angle) != 3:
+            raise ValueError(f"{definition.name}: angles need three landmarks, got {rule.angle!r}")
+        for landmark in rule.angle:
+            if landmark not in LANDMARK_NAMES:
+                raise ValueError(f"{definition.name}: unknown landmark {landmark!r}")
+        if rule.state not in states:
+            raise ValueError(f"{definition.name}: no transition uses state {rule.state!r}")
+    _registry[definition.name] = definition
+    return definition
+
+
+def get_exercise(name):
+    """Return the definition of an exercise by name"""
+    try:
+        return _registry[name]
+    except KeyError:
+        raise ValueError(f"Unknown exercise type: {name}") from None
+
+
+def exercise_names():
+    return tuple(_registry)
+
+
+def definition_from_dict(data):
+    """Build an ExerciseDefinition from JSON-style dicts and lists"""
+    return ExerciseDefinition(
+        name=data["name"],
+        instructions=tuple(data.get("instructions", ())),
+        transitions=tuple(Transition(r["state"], tuple(r["angle"]), r["op"], r["threshold"],
+                                     r["next_state"], r["message"], r.get("counts", False))
+                          for r in data.get("transitions", ())),
+        hints=tuple(Hint(h["state"], tuple(h["angle"]), h["op"], h["threshold"], h["message"])
+                    for h in data.get("hints", ())),
+        hold=data.get("hold", False),
+        start_state=data.get("start_state", "down"),
+        concentric_first=data.get("concentric_first", False),
+    )
+
+
+def load_exercises(path):
+    """Register every exercise defined in a JSON file (a list of definitions)"""
+    with open(path) as f:
+        return [register_exercise(definition_from_dict(item)) for item in json.load(f)]
+
+
+for _definition in BUILTIN_EXERCISES:
+    register_exercise(_definition)
+
+if os.environ.get("FITFUSION_EXERCISES_FILE"):
+    load_exercises(os.environ["FITFUSION_EXERCISES_FILE"])
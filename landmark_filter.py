@@ -0,0 +1,91 @@
+import math
+
+import numpy as np
+
+from exercise_tracker import NUM_LANDMARKS
+
+
+class OneEuroFilter:
+    """One Euro filter over a (33, 4) landmark array
+
+    Smooths x, y, z heavily when landmarks move slowly (jitter) and lightly
+    when they move fast (real motion), see Casiez et al., CHI 2012. Updates
+    are weighted by landmark visibility so occluded points move less.
+    Memory is fixed and each update is a handful of vectorized operations.
+    """
+
+    def __init__(self, min_cutoff=2.0, beta=20.0, d_cutoff=1.0):
+        self.min_cutoff = min_cutoff
+        self.beta = beta
+        self.d_cutoff = d_cutoff
+        self.out = np.zeros((NUM_LANDMARKS, 4), dtype=np.float32)
+        self._derivative = np.zeros((NUM_LANDMARKS, 3), dtype=np.float32)
+        self._last_time = None
+
+    def reset(self):
+        self._last_time = None
+
+    @staticmethod
+    def _alpha(dt, cutoff):
+        tau = 1.0 / (2.0 * math.pi * cutoff)
+        return 1.0 / (1.0 + tau / dt)
+
+    def __call__(self, points, timestamp):
+        """Return the filtered landmarks (a view of an internal buffer)"""
+        if self._last_time is None or timestamp <= self._last_time:
+            self.out[:] = points
+            self._derivative[:] = 0.0
+            self._last_time = timestamp
+            return self.out
+
+        dt = timestamp - self._last_time
+        self._last_time = timestamp
+        previous = self.out[:, :3]
+        visibility = np.clip(points[:, 3:4], 0.0, 1.0)
+
+        # Smoothed speed of each coordinate
+        speed = (points[:, :3] - previous) / dt
+        self._derivative += self._alpha(dt, self.d_cutoff) * (speed - self._derivative)
+
+        # Faster landmarks get a higher cutoff, i.e. less smoothing
+        cutoff = self.min_cutoff + self.beta * np.abs(self._derivative)
+        alpha = 1.0 / (1.0 + 1.0 / (2.0 * math.pi * cutoff * dt))
+        previous += alpha * visibility * (points[:, :3] - previous)
+        self.out[:, 3] = points[:, 3]
+        return self.out
+
+
+class EMAFilter:
+    """Visibility-weighted exponential moving average over a (33, 4) landmark array"""
+
+    def __init__(self, alpha=0.6):
+        self.alpha = alpha
+        self.out = np.zeros((NUM_LANDMARKS, 4), dtype=np.float32)
+        self._initialized = False
+
+    def reset(self):
+        self._initialized = False
+
+    def __call__(self, points, timestamp=None):
+        """Return the filtered landmarks (a view of an internal buffer)"""
+        if not self._initialized:
+            self.out[:] = points
+            self._initialized = True
+            return self.out
+        weight = self.alpha * np.clip(points[:, 3:4], 0.0, 1.0)
+        self.out[:, :3] += weight * (points[:, :3] - self.out[:, :3])
+        self.out[:, 3] = points[:, 3]
+        return self.out
+
+
+FILTERS = {
+    "One Euro": OneEuroFilter,
+    "EMA": EMAFilter,
+    "Off": None,
+}
+
+
+def create_filter(name):
+    """Create a landmark filter by display name (None for "Off")"""
+    factory = FILTERS[name]
+    return factory() if factory is not None else None
@@ -0,0 +1,251 @@
+"""Landmark recording and deterministic replay
+
+A landmark log is a small fixed header followed by fixed-size records, one
+per processed frame: the frame timestamp, whether a pose was detected, the
+raw (33, 4) landmark array and, when the backend gives them, the 3D world
+landmarks. The header also keeps the tracker settings of the live run
+(smoothing, hysteresis, bilateral mode, starting count and state), which
+replay uses unless told otherwise. Records are appended as they arrive, so a
+log cut short by a crash is still readable up to its last whole record, and
+the file can be memory-mapped as a NumPy structured array without parsing.
+
+Replaying a log feeds the recorded landmarks and timestamps straight into
+ExerciseTracker.update, with no video decode or inference, so counting can
+be re-run on hours of workouts in seconds:
+
+    python landmark_log.py recordings/*.fflm --exercise Squats [--expect 12]
+"""
+import argparse
+import json
+import struct
+import sys
+import time
+
+import numpy as np
+
+from exercise_tracker import NUM_LANDMARKS, EXERCISE_TYPES, ExerciseTracker
+from landmark_filter import FILTERS, create_filter
+
+LOG_EXTENSION = ".fflm"
+MAGIC = b"FFLM"
+VERSION = 2
+
+# magic, version, header size, record size, landmarks per record, then a
+# JSON metadata blob padded to HEADER_SIZE (256 bytes in version 1 logs)
+HEADER_SIZE = 512
+# Longest member name worth storing: leaves room for the rest of the
+# metadata even at 4 UTF-8 bytes per character
+MAX_MEMBER_LENGTH = 32
+_HEADER_PREFIX = struct.Struct("<4sHHII")
+
+RECORD_DTYPE = np.dtype([
+    ("timestamp", "<f8"),
+    ("detected", "<u4"),
+    ("has_world", "<u4"),
+    ("points", "<f4", (NUM_LANDMARKS, 4)),
+    ("world", "<f4", (NUM_LANDMARKS, 4)),
+])
+
+# Record layout of each readable version
+_RECORD_DTYPES = {
+    1: np.dtype([
+        ("timestamp", "<f8"),
+        ("detected", "<u4"),
+        ("points", "<f4", (NUM_LANDMARKS, 4)),
+    ]),
+    VERSION: RECORD_DTYPE,
+}
+
+
+def _pack_header(metadata):
+    blob = json.dumps(metadata, ensure_ascii=False).encode("utf-8")
+    if _HEADER_PREFIX.size + len(blob) > HEADER_SIZE:
+        raise ValueError("Landmark log metadata is too large")
+    prefix = _HEADER_PREFIX.pack(MAGIC, VERSION, HEADER_SIZE, RECORD_DTYPE.itemsize, NUM_LANDMARKS)
+    return (prefix + blob).ljust(HEADER_SIZE, b"\0")
+
+
+class LandmarkRecorder:
+    """Appends one fixed-size record per frame to a landmark log
+
+    Records are staged in a preallocated NumPy array and written in blocks
+    of batch_size, so recording costs one array copy per frame.
+    """
+
+    def __init__(self, path, exercise_type="", batch_size=64, **metadata):
+        self.path = path
+        self.frames = 0
+        self._file = open(path, "wb")
+        metadata.update(exercise=exercise_type, created=time.time())
+        self._file.write(_pack_header(metadata))
+        self._batch = np.zeros(batch_size, dtype=RECORD_DTYPE)
+        self._filled = 0
+
+    def write(self, timestamp, points, world=None):
+        """Record a frame; points is a (33, 4) array, or None if no pose was found"""
+        record = self._batch[self._filled]
+        record["timestamp"] = timestamp
+        if points is None:
+            record["detected"] = 0
+            record["points"] = 0.0
+        else:
+            record["detected"] = 1
+            record["points"] = points
+        if points is None or world is None:
+            record["has_world"] = 0
+            record["world"] = 0.0
+        else:
+            record["has_world"] = 1
+            record["world"] = world
+        self._filled += 1
+        self.frames += 1
+        if self._filled == len(self._batch):
+            self.flush()
+
+    def flush(self):
+        if self._filled:
+            self._file.write(self._batch[:self._filled].tobytes())
+            self._filled = 0
+        self._file.flush()
+
+    def close(self):
+        if not self._file.closed:
+            self.flush()
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class LandmarkLog:
+    """Read-only, memory-mapped view of a landmark log"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            header = f.read(HEADER_SIZE)
+        if len(header) < _HEADER_PREFIX.size:
+            raise ValueError(f"{path} is not a landmark log")
+        magic, version, header_size, record_size, num_landmarks = _HEADER_PREFIX.unpack_from(header)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a landmark log")
+        dtype = _RECORD_DTYPES.get(version)
+        if dtype is None or record_size != dtype.itemsize or num_landmarks != NUM_LANDMARKS:
+            raise ValueError(f"{path}: unsupported landmark log version {version}")
+        self.metadata = json.loads(header[_HEADER_PREFIX.size:header_size].rstrip(b"\0") or b"{}")
+
+        # Ignore a partially written trailing record
+        with open(path, "rb") as f:
+            f.seek(0, 2)
+            size = f.tell()
+        count = max(size - header_size, 0) // record_size
+        self.records = np.memmap(path, dtype=dtype, mode="r", offset=header_size,
+                                 shape=(count,)) if count else np.zeros(0, dtype=dtype)
+
+    @property
+    def exercise_type(self):
+        return self.metadata.get("exercise", "")
+
+    @property
+    def times(self):
+        return self.records["timestamp"]
+
+    @property
+    def points(self):
+        return self.records["points"]
+
+    @property
+    def detected(self):
+        return self.records["detected"].astype(bool)
+
+    def create_tracker(self, exercise_type=None, smoothing=None, hysteresis=None, bilateral=None):
+        """Build a tracker configured like the live one, unless overridden
+
+        Logs without recorded settings (version 1) fall back to the replay
+        CLI's defaults. The recorded starting count and state are only
+        applied when replaying the exercise the log was recorded with.
+        """
+        metadata = self.metadata
+        exercise_type = exercise_type or self.exercise_type
+        if smoothing is None:
+            smoothing = metadata.get("smoothing", "One Euro")
+        if hysteresis is None:
+            hysteresis = metadata.get("hysteresis", 3.0)
+        if bilateral is None:
+            bilateral = metadata.get("bilateral", False)
+        tracker = ExerciseTracker(exercise_type, create_filter(smoothing), hysteresis, bilateral)
+        if exercise_type == self.exercise_type:
+            tracker.count = metadata.get("start_count", 0)
+            if "start_state" in metadata:
+                tracker.state = metadata["start_state"]
+        return tracker
+
+    def __len__(self):
+        return len(self.records)
+
+
+def replay(log, tracker, on_frame=None):
+    """Feed every detected frame of a log into tracker.update as fast as possible
+
+    on_frame(index, count, feedback) is called after each update. Returns
+    the tracker's final count.
+    """
+    if isinstance(log, str):
+        log = LandmarkLog(log)
+    records = log.records
+    detected = np.flatnonzero(records["detected"])
+    times = records["timestamp"]
+    points = records["points"]
+    has_world = records["has_world"] if "has_world" in records.dtype.names else None
+    for index in detected.tolist():
+        world = records["world"][index] if has_world is not None and has_world[index] else None
+        count, feedback = tracker.update(points[index], timestamp=float(times[index]),
+                                         world_landmarks=world)
+        if on_frame is not None:
+            on_frame(index, count, feedback)
+    return tracker.count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-run rep counting on recorded landmark logs")
+    parser.add_argument("logs", nargs="+", help=f"Landmark log files ({LOG_EXTENSION})")
+    parser.add_argument("--exercise", choices=EXERCISE_TYPES,
+                        help="Exercise to count (default: the one the log was recorded with)")
+    parser.add_argument("--smoothing", choices=list(FILTERS), default=None,
+                        help="Landmark filter (default: the one the log was recorded with)")
+    parser.add_argument("--hysteresis", type=float, default=None,
+                        help="Threshold margin in degrees (default: the recorded one)")
+    parser.add_argument("--bilateral", dest="bilateral", action="store_const", const=True, default=None,
+                        help="Track both sides (default: as recorded)")
+    parser.add_argument("--no-bilateral", dest="bilateral", action="store_const", const=False)
+    parser.add_argument("--expect", type=int, nargs="+",
+                        help="Expected count per log; exit with an error on any mismatch")
+    args = parser.parse_args()
+
+    if args.expect and len(args.expect) != len(args.logs):
+        parser.error("--expect needs one count per log")
+
+    failures = 0
+    for index, path in enumerate(args.logs):
+        log = LandmarkLog(path)
+        exercise_type = args.exercise or log.exercise_type
+        tracker = log.create_tracker(exercise_type, args.smoothing, args.hysteresis, args.bilateral)
+        started = time.perf_counter()
+        count = replay(log, tracker)
+        elapsed = time.perf_counter() - started
+        status = ""
+        if args.expect:
+            ok = count == args.expect[index]
+            failures += not ok
+            status = "  OK" if ok else f"  MISMATCH (expected {args.expect[index]})"
+        print(f"{path}: {exercise_type} count={count} "
+              f"({len(log)} frames in {elapsed:.3f}s, {len(log) / max(elapsed, 1e-9):.0f} fps){status}")
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in sorted(labels.items())) + "}"
+
+
+class _Stage:
+    def __init__(self, window):
+        self.samples = deque(maxlen=window)
+        self.count = 0
+        self.total = 0.0
+
+
+class FrameMetrics:
+    """Per-stage latency, FPS and dropped frame counters for the frame loop
+
+    Latency percentiles are computed over a sliding window of recent samples
+    so memory stays fixed; totals are kept for Prometheus-style export.
+    """
+
+    def __init__(self, window=1000, labels=None):
+        self.window = window
+        self.labels = labels or {}
+        self.frames = 0
+        self.dropped = 0
+        self.started_at = time.time()
+        self._frame_times = deque(maxlen=120)
+        self._stages = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name):
+        """Time the enclosed block as one sample of the named stage"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def record(self, name, seconds):
+        with self._lock:
+            stage = self._stages.get(name)
+            if stage is None:
+                stage = self._stages[name] = _Stage(self.window)
+            stage.samples.append(seconds)
+            stage.count += 1
+            stage.total += seconds
+
+    def frame_done(self):
+        """Mark one frame as fully processed"""
+        with self._lock:
+            self.frames += 1
+            self._frame_times.append(time.perf_counter())
+
+    def frame_dropped(self, n=1):
+        with self._lock:
+            self.dropped += n
+
+    def fps(self):
+        """Frames per second over the recent frame window"""
+        with self._lock:
+            if len(self._frame_times) < 2:
+                return 0.0
+            span = self._frame_times[-1] - self._frame_times[0]
+            return (len(self._frame_times) - 1) / span if span > 0 else 0.0
+
+    def summary(self):
+        """Return {stage: {p50, p95, p99, mean, count}} with latencies in ms"""
+        with self._lock:
+            stages = {name: (np.fromiter(stage.samples, dtype=np.float64), stage.count, stage.total)
+                      for name, stage in self._stages.items()}
+        result = {}
+        for name, (samples, count, total) in stages.items():
+            if not len(samples):
+                continue
+            percentiles = np.percentile(samples, [q * 100 for q in QUANTILES]) * 1000
+            result[name] = {
+                "p50": round(float(percentiles[0]), 2),
+                "p95": round(float(percentiles[1]), 2),
+                "p99": round(float(percentiles[2]), 2),
+                "mean": round(total / count * 1000, 2),
+                "count": count,
+            }
+        return result
+
+    def to_dict(self):
+        return {
+            "labels": self.labels,
+            "uptime_seconds": round(time.time() - self.started_at, 1),
+            "frames": self.frames,
+            "dropped_frames": self.dropped,
+            "fps": round(self.fps(), 1),
+            "stages_ms": self.summary(),
+        }
+
+    def write_json(self, path):
+        """Write the current metrics to a JSON file (atomically replaced)"""
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
+        os.replace(tmp_path, path)
+
+    def to_prometheus(self):
+        """Render the metrics in the Prometheus text exposition format"""
+        base = _format_labels(self.labels)
+        lines = [
+            f"fitfusion_frames_total{base} {self.frames}",
+            f"fitfusion_dropped_frames_total{base} {self.dropped}",
+            f"fitfusion_fps{base} {self.fps():.3f}",
+        ]
+        with self._lock:
+            stages = {name: (np.fromiter(stage.samples, dtype=np.float64), stage.count, stage.total)
+                      for name, stage in self._stages.items()}
+        for name, (samples, count, total) in sorted(stages.items()):
+            labels = dict(self.labels, stage=name)
+            if len(samples):
+                for q, value in zip(QUANTILES, np.percentile(samples, [q * 100 for q in QUANTILES])):
+                    quantile_labels = _format_labels(dict(labels, quantile=q))
+                    lines.append(f"fitfusion_stage_latency_seconds{quantile_labels} {value:.6f}")
+            lines.append(f"fitfusion_stage_latency_seconds_sum{_format_labels(labels)} {total:.6f}")
+            lines.append(f"fitfusion_stage_latency_seconds_count{_format_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+
+class _NullMetrics:
+    """Stand-in used when no metrics are collected"""
+
+    @contextmanager
+    def stage(self, name):
+        yield
+
+    def record(self, name, seconds):
+        pass
+
+    def frame_done(self):
+        pass
+
+    def frame_dropped(self, n=1):
+        pass
+
+
+NULL_METRICS = _NullMetrics()
+
+# Metrics of every active session, exported together by the HTTP endpoint
+_registry = {}
+_registry_lock = threading.Lock()
+_server = None
+
+
+def register(session_id, metrics):
+    with _registry_lock:
+        _registry[session_id] = metrics
+
+
+def unregister(session_id):
+    with _registry_lock:
+        _registry.pop(session_id, None)
+
+
+def prometheus_text():
+    """Render the metrics of all registered sessions"""
+    with _registry_lock:
+        all_metrics = list(_registry.values())
+    return "".join(metrics.to_prometheus() for metrics in all_metrics)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.rstrip("/") not in ("", "/metrics"):
+            self.send_error(404)
+            return
+        body = prometheus_text().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Keep scrapes out of the Streamlit log
+        pass
+
+
+def start_metrics_server(port, host="0.0.0.0"):
+    """Serve /metrics on a background thread (started at most once per process)"""
+    global _server
+    with _registry_lock:
+        if _server is None:
+            _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+            thread = threading.Thread(target=_server.serve_forever, name="fitfusion-metrics")
+            thread.daemon = True
+            thread.start()
+    return _server
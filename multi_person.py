@@ -0,0 +1,125 @@
+"""Multi-person pose tracking with one ExerciseTracker per athlete
+
+Uses the MediaPipe Tasks PoseLandmarker, which detects up to num_poses
+people in a single inference call, so the per-frame model cost is shared by
+everyone in view. Detected poses are matched to the previous frame's people
+by landmark centroid to keep stable IDs, and each ID gets its own tracker.
+"""
+import numpy as np
+
+from pose_backends import DEFAULT_TASKS_MODEL_PATH, MediaPipeTasksBackend
+
+
+class MultiPoseDetector(MediaPipeTasksBackend):
+    """PoseLandmarker returning a (33, 4) landmark array per detected person"""
+
+    def __init__(self, num_poses=4, model_path=DEFAULT_TASKS_MODEL_PATH, num_threads=None):
+        super().__init__(model_path, num_threads=num_threads, num_poses=num_poses)
+
+    def detect(self, rgb_frame, timestamp):
+        """Return one landmark array per detected person"""
+        return self.detect_all(rgb_frame, timestamp)
+
+
+class PersonTracker:
+    """Assigns stable IDs to poses across frames by nearest landmark centroid"""
+
+    def __init__(self, max_distance=0.15, max_missed=15):
+        self.max_distance = max_distance
+        self.max_missed = max_missed
+        self.next_id = 1
+        self._centroids = np.zeros((0, 2), dtype=np.float32)
+        self._ids = []
+        self._missed = []
+
+    def assign(self, poses):
+        """Return a person ID for each pose, in the same order"""
+        if not poses:
+            self._age(set())
+            return []
+
+        centroids = np.array([_centroid(points) for points in poses], dtype=np.float32)
+        ids = [None] * len(poses)
+        matched = set()
+
+        if len(self._ids):
+            # Distance from every known person to every detection, matched greedily
+            distances = np.linalg.norm(self._centroids[:, None, :] - centroids[None, :, :], axis=2)
+            for flat in np.argsort(distances, axis=None):
+                track, pose = np.unravel_index(flat, distances.shape)
+                if distances[track, pose] > self.max_distance:
+                    break
+                if track in matched or ids[pose] is not None:
+                    continue
+                matched.add(track)
+                ids[pose] = self._ids[track]
+                self._centroids[track] = centroids[pose]
+                self._missed[track] = 0
+
+        for pose, person_id in enumerate(ids):
+            if person_id is None:
+                ids[pose] = self.next_id
+                self.next_id += 1
+                self._ids.append(ids[pose])
+                self._missed.append(0)
+                self._centroids = np.vstack([self._centroids, centroids[pose:pose + 1]])
+                matched.add(len(self._ids) - 1)
+
+        self._age(matched)
+        return ids
+
+    def _age(self, matched):
+        keep = []
+        for track in range(len(self._ids)):
+            if track not in matched:
+                self._missed[track] += 1
+            if self._missed[track] <= self.max_missed:
+                keep.append(track)
+        self._ids = [self._ids[t] for t in keep]
+        self._missed = [self._missed[t] for t in keep]
+        self._centroids = self._centroids[keep]
+
+    @property
+    def active_ids(self):
+        return list(self._ids)
+
+
+def _centroid(points):
+    visible = points[:, 3] > 0.5
+    xy = points[visible, :2] if visible.any() else points[:, :2]
+    return xy.mean(axis=0)
+
+
+class MultiPersonSession:
+    """Keeps one ExerciseTracker per tracked person"""
+
+    def __init__(self, make_tracker, person_tracker=None):
+        self.make_tracker = make_tracker
+        self.person_tracker = person_tracker or PersonTracker()
+        self.trackers = {}
+
+    def update(self, poses, timestamp=None, world_poses=None):
+        """Update every person's tracker; returns [(person_id, points, count, feedback)]
+
+        world_poses, if given, are the 3D world landmarks of each pose, in the
+        same order (used by bilateral trackers).
+        """
+        results = []
+        for index, person_id in enumerate(self.person_tracker.assign(poses)):
+            points = poses[index]
+            world = world_poses[index] if world_poses else None
+            tracker = self.trackers.get(person_id)
+            if tracker is None:
+                tracker = self.trackers[person_id] = self.make_tracker()
+            count, feedback = tracker.update(points, timestamp=timestamp, world_landmarks=world)
+            results.append((person_id, points, count, feedback))
+
+        # Forget trackers of people who have left the frame
+        active = set(self.person_tracker.active_ids)
+        for person_id in list(self.trackers):
+            if person_id not in active:
+                del self.trackers[person_id]
+        return results
+
+    def counts(self):
+        return {person_id: tracker.count for person_id, tracker in self.trackers.items()}
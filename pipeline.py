@@ -0,0 +1,250 @@
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+from metrics import NULL_METRICS
+
+
+class BufferRing:
+    """Fixed set of reusable frame buffers handed out round-robin
+
+    A buffer is reused after `size - 1` newer ones have been handed out,
+    whether or not its consumer is done with it. Only use it where one
+    thread owns every buffer (or copies out under a lock); frames handed
+    between threads through queues go through a BufferPool instead.
+    """
+
+    def __init__(self, size=3):
+        self._buffers = [None] * size
+        self._index = -1
+
+    def next(self, shape=None, dtype=np.uint8):
+        """Advance to the next buffer, (re)allocating it if shape differs
+
+        With shape=None the slot is returned as-is (None until filled).
+        """
+        self._index = (self._index + 1) % len(self._buffers)
+        buffer = self._buffers[self._index]
+        if shape is not None and (buffer is None or buffer.shape != tuple(shape) or buffer.dtype != dtype):
+            buffer = self._buffers[self._index] = np.empty(shape, dtype=dtype)
+        return buffer
+
+    def replace(self, buffer):
+        """Store buffer in the current slot (e.g. an array returned by cap.read)"""
+        self._buffers[self._index] = buffer
+        return buffer
+
+
+class BufferPool:
+    """Free list of reusable frame buffers with explicit ownership
+
+    acquire() hands out a buffer nobody else holds and release() returns it
+    once its holder is done, so a buffer is never written while still being
+    read. A buffer that is never released is simply garbage collected:
+    forgetting a release costs an allocation, never a corrupted frame.
+    """
+
+    def __init__(self, max_free=4):
+        self.max_free = max_free
+        self.allocated = 0
+        self._free = []
+        self._lock = threading.Lock()
+
+    def acquire(self, shape=None, dtype=np.uint8):
+        """Return a free buffer of shape, allocating one if none is free
+
+        With shape=None any free buffer is returned (None if there is none),
+        e.g. for cap.read, which reallocates if the size doesn't match.
+        """
+        with self._lock:
+            while self._free:
+                buffer = self._free.pop()
+                # Buffers of another size (e.g. after a resolution change) are dropped
+                if shape is None or (buffer.shape == tuple(shape) and buffer.dtype == dtype):
+                    return buffer
+        if shape is None:
+            return None
+        self.allocated += 1
+        return np.empty(shape, dtype=dtype)
+
+    def release(self, buffer):
+        """Give a buffer back once nothing reads or writes it any more"""
+        if buffer is None:
+            return
+        with self._lock:
+            if len(self._free) < self.max_free and not any(b is buffer for b in self._free):
+                self._free.append(buffer)
+
+
+class LatestQueue:
+    """Bounded queue that drops the oldest item when full
+
+    on_drop(item) is called for every dropped item, e.g. to release its
+    buffers.
+    """
+
+    def __init__(self, maxsize=1, on_drop=None):
+        self.maxsize = max(1, int(maxsize))
+        self.on_drop = on_drop
+        self.dropped = 0
+        self._items = deque()
+        self._cond = threading.Condition()
+        self._closed = False
+
+    def put(self, item):
+        """Add an item, discarding the oldest one if the queue is full
+
+        Returns True if an item was dropped to make room.
+        """
+        with self._cond:
+            dropped = self._items.popleft() if len(self._items) >= self.maxsize else None
+            if dropped is not None:
+                self.dropped += 1
+            self._items.append(item)
+            self._cond.notify()
+        if dropped is not None and self.on_drop is not None:
+            self.on_drop(dropped)
+        return dropped is not None
+
+    def get(self, timeout=None):
+        """Return the oldest queued item, or None on timeout/close"""
+        with self._cond:
+            if not self._items and not self._closed:
+                self._cond.wait(timeout)
+            if self._items:
+                return self._items.popleft()
+            return None
+
+    def close(self):
+        """Wake up any waiting consumers"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def __len__(self):
+        with self._cond:
+            return len(self._items)
+
+
+class FramePipeline:
+    """Capture -> inference -> render pipeline running on background threads
+
+    The capture thread keeps only the newest frames from the camera, the
+    inference thread runs process_fn on them and the caller (the Streamlit
+    script thread) pulls the latest result at its own render rate.
+    process_fn(frame, tracker, buffers=...) should write its output frame
+    into buffers.acquire(...) so frames are recycled rather than allocated.
+    Every frame has one owner at a time: the input frame goes back to the
+    pool when process_fn returns, and a result frame when the caller passes
+    it to release() (or when a newer result replaces it unread).
+    """
+
+    def __init__(self, cap, exercise_tracker, process_fn, queue_size=1, thread_hook=None,
+                 metrics=None):
+        self.cap = cap
+        self.metrics = metrics or NULL_METRICS
+        self.exercise_tracker = exercise_tracker
+        self.process_fn = process_fn
+        self.thread_hook = thread_hook
+        # Frames alive at once: one being read, the queued ones, one being processed
+        self.capture_buffers = BufferPool(queue_size + 2)
+        # Output frames alive at once: one being written, the queued ones, one on display
+        self.render_buffers = BufferPool(queue_size + 2)
+        self.frames = LatestQueue(queue_size, on_drop=lambda item: self.capture_buffers.release(item[1]))
+        self.results = LatestQueue(queue_size, on_drop=lambda item: self.render_buffers.release(item[1]))
+        self.error = None
+        self.captured = 0
+        self.processed = 0
+        self.rendered = 0
+        self.started_at = None
+        self._stop_event = threading.Event()
+        self._threads = []
+
+    @property
+    def running(self):
+        return not self._stop_event.is_set()
+
+    def start(self):
+        """Start the capture and inference threads"""
+        self.started_at = time.time()
+        for name, target in (("capture", self._capture_loop), ("inference", self._inference_loop)):
+            thread = threading.Thread(target=target, name=f"fitfusion-{name}")
+            thread.daemon = True  # Don't block app exit
+            if self.thread_hook is not None:
+                self.thread_hook(thread)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def stop(self, timeout=1.0):
+        """Stop the worker threads and wait briefly for them to finish"""
+        self._stop_event.set()
+        self.frames.close()
+        self.results.close()
+        for thread in self._threads:
+            if thread is not threading.current_thread():
+                thread.join(timeout)
+        self._threads = []
+
+    def _capture_loop(self):
+        while self.running and self.cap.isOpened():
+            with self.metrics.stage("capture"):
+                # Decode into a recycled buffer instead of a new array per frame
+                ret, frame = self.cap.read(self.capture_buffers.acquire())
+            if not ret:
+                self.error = "Lost connection to webcam"
+                break
+            self.captured += 1
+            if self.frames.put((time.time(), frame)):
+                self.metrics.frame_dropped()
+        self._stop_event.set()
+        self.frames.close()
+
+    def _inference_loop(self):
+        while self.running:
+            item = self.frames.get(timeout=0.1)
+            if item is None:
+                continue
+            captured_at, frame = item
+            try:
+                processed_frame, count, feedback = self.process_fn(
+                    frame, self.exercise_tracker, buffers=self.render_buffers)
+            except Exception as e:
+                self.error = f"Frame processing failed: {e}"
+                break
+            finally:
+                self.capture_buffers.release(frame)
+            self.processed += 1
+            if self.results.put((captured_at, processed_frame, count, feedback)):
+                self.metrics.frame_dropped()
+        self._stop_event.set()
+        self.results.close()
+
+    def latest(self, timeout=None):
+        """Return the newest (captured_at, frame, count, feedback) result or None
+
+        The frame is the caller's until it hands it back with release().
+        """
+        result = self.results.get(timeout)
+        if result is not None:
+            self.rendered += 1
+        return result
+
+    def release(self, frame):
+        """Return a result frame from latest() once it has been displayed"""
+        self.render_buffers.release(frame)
+
+    def stats(self):
+        """Return queue depths, drop counters and per-stage frame rates"""
+        elapsed = max(time.time() - (self.started_at or time.time()), 1e-6)
+        return {
+            "capture_queue_depth": len(self.frames),
+            "capture_dropped": self.frames.dropped,
+            "result_queue_depth": len(self.results),
+            "result_dropped": self.results.dropped,
+            "capture_fps": round(self.captured / elapsed, 1),
+            "inference_fps": round(self.processed / elapsed, 1),
+            "render_fps": round(self.rendered / elapsed, 1),
+        }
@@ -0,0 +1,315 @@
+"""Pluggable pose estimation backends
+
+Every backend turns an RGB frame into the (33, 4) float32 landmark array
+(x, y, z, visibility in normalized image coordinates, MediaPipe Pose layout)
+that ExerciseTracker consumes, or None when nobody is found:
+
+    backend = create_backend("onnx", model_path="movenet_lightning.onnx")
+    points = backend.process(rgb_frame, timestamp)
+    batch = backend.process_batch(frames, timestamps)
+
+Runtimes are imported when a backend is created, so only the one in use has
+to be installed. Run `python benchmark.py --mode backends` to find the
+fastest backend on a machine.
+"""
+import importlib.util
+import os
+
+import numpy as np
+
+from exercise_tracker import NUM_LANDMARKS, PoseLandmark, landmarks_to_array
+
+DEFAULT_TASKS_MODEL_PATH = os.environ.get("FITFUSION_POSE_MODEL", "models/pose_landmarker_lite.task")
+DEFAULT_ONNX_MODEL_PATH = os.environ.get("FITFUSION_ONNX_MODEL", "models/movenet_singlepose_lightning.onnx")
+
+L = PoseLandmark
+
+# COCO keypoints (MoveNet output order) -> MediaPipe landmarks
+COCO_TO_POSE = (
+    L.NOSE, L.LEFT_EYE, L.RIGHT_EYE, L.LEFT_EAR, L.RIGHT_EAR,
+    L.LEFT_SHOULDER, L.RIGHT_SHOULDER, L.LEFT_ELBOW, L.RIGHT_ELBOW, L.LEFT_WRIST, L.RIGHT_WRIST,
+    L.LEFT_HIP, L.RIGHT_HIP, L.LEFT_KNEE, L.RIGHT_KNEE, L.LEFT_ANKLE, L.RIGHT_ANKLE,
+)
+
+# MediaPipe landmarks COCO doesn't have, placed on the nearest COCO keypoint
+# (with zero visibility so filters and overlays ignore them)
+_COCO_FILL = {
+    L.LEFT_EYE_INNER: L.LEFT_EYE, L.LEFT_EYE_OUTER: L.LEFT_EYE,
+    L.RIGHT_EYE_INNER: L.RIGHT_EYE, L.RIGHT_EYE_OUTER: L.RIGHT_EYE,
+    L.MOUTH_LEFT: L.NOSE, L.MOUTH_RIGHT: L.NOSE,
+    L.LEFT_PINKY: L.LEFT_WRIST, L.LEFT_INDEX: L.LEFT_WRIST, L.LEFT_THUMB: L.LEFT_WRIST,
+    L.RIGHT_PINKY: L.RIGHT_WRIST, L.RIGHT_INDEX: L.RIGHT_WRIST, L.RIGHT_THUMB: L.RIGHT_WRIST,
+    L.LEFT_HEEL: L.LEFT_ANKLE, L.LEFT_FOOT_INDEX: L.LEFT_ANKLE,
+    L.RIGHT_HEEL: L.RIGHT_ANKLE, L.RIGHT_FOOT_INDEX: L.RIGHT_ANKLE,
+}
+_COCO_INDEX = np.array([landmark.value for landmark in COCO_TO_POSE])
+_FILL_TO = np.array([landmark.value for landmark in _COCO_FILL])
+_FILL_FROM = np.array([landmark.value for landmark in _COCO_FILL.values()])
+
+
+class PoseBackend:
+    """Base class: process one frame; process_batch loops unless overridden"""
+
+    name = "base"
+    # 3D world landmarks (meters, hip-centred, same layout) of the last
+    # processed frame, for backends that estimate them
+    last_world = None
+
+    def process(self, rgb_frame, timestamp=None):
+        """Return the (33, 4) landmark array for one RGB frame, or None"""
+        raise NotImplementedError
+
+    def process_batch(self, rgb_frames, timestamps=None):
+        """Return one landmark array (or None) per frame"""
+        if timestamps is None:
+            timestamps = [None] * len(rgb_frames)
+        return [self.process(frame, timestamp) for frame, timestamp in zip(rgb_frames, timestamps)]
+
+    def close(self):
+        pass
+
+
+class MediaPipeLegacyBackend(PoseBackend):
+    """mp.solutions.pose (BlazePose GHUM with built-in tracking)"""
+
+    name = "mediapipe"
+
+    def __init__(self, model_complexity=1, min_detection_confidence=0.5, min_tracking_confidence=0.5):
+        import mediapipe as mp
+
+        self._pose = mp.solutions.pose.Pose(
+            model_complexity=model_complexity,
+            min_detection_confidence=min_detection_confidence,
+            min_tracking_confidence=min_tracking_confidence
+        )
+
+    def process(self, rgb_frame, timestamp=None):
+        results = self._pose.process(rgb_frame)
+        self.last_world = None
+        if not results.pose_landmarks:
+            return None
+        if results.pose_world_landmarks:
+            self.last_world = landmarks_to_array(results.pose_world_landmarks.landmark)
+        return landmarks_to_array(results.pose_landmarks.landmark)
+
+    def close(self):
+        self._pose.close()
+
+
+def tasks_base_options(model_path, num_threads=None, delegate="cpu"):
+    """BaseOptions for a MediaPipe Tasks model, optionally pinning XNNPACK threads
+
+    The Python BaseOptions doesn't expose the thread count, so it is set on
+    the acceleration proto the options are converted to.
+    """
+    from mediapipe.tasks import python as mp_tasks
+
+    if not os.path.exists(model_path):
+        raise FileNotFoundError(
+            f"MediaPipe Tasks model not found at {model_path}; download it from the "
+            "MediaPipe models page or set FITFUSION_POSE_MODEL")
+    delegate = mp_tasks.BaseOptions.Delegate.GPU if delegate == "gpu" \
+        else mp_tasks.BaseOptions.Delegate.CPU
+    if not num_threads or delegate == mp_tasks.BaseOptions.Delegate.GPU:
+        return mp_tasks.BaseOptions(model_asset_path=model_path, delegate=delegate)
+
+    class ThreadedBaseOptions(mp_tasks.BaseOptions):
+        def to_pb2(self):
+            options = super().to_pb2()
+            options.acceleration.xnnpack.num_threads = num_threads
+            return options
+
+    return ThreadedBaseOptions(model_asset_path=model_path, delegate=delegate)
+
+
+class MediaPipeTasksBackend(PoseBackend):
+    """MediaPipe Tasks PoseLandmarker in video mode (CPU/XNNPACK or GPU)"""
+
+    name = "mediapipe-tasks"
+
+    def __init__(self, model_path=DEFAULT_TASKS_MODEL_PATH, num_threads=None, delegate="cpu",
+                 num_poses=1, min_pose_detection_confidence=0.5, min_tracking_confidence=0.5):
+        import mediapipe as mp
+        from mediapipe.tasks.python import vision
+
+        self._mp = mp
+        options = vision.PoseLandmarkerOptions(
+            base_options=tasks_base_options(model_path, num_threads, delegate),
+            running_mode=vision.RunningMode.VIDEO,
+            num_poses=num_poses,
+            min_pose_detection_confidence=min_pose_detection_confidence,
+            min_tracking_confidence=min_tracking_confidence,
+        )
+        self._landmarker = vision.PoseLandmarker.create_from_options(options)
+        self._last_timestamp_ms = -1
+        # World landmarks of every pose found by the last detect_all
+        self.world_poses = []
+
+    def detect_all(self, rgb_frame, timestamp=None):
+        """Return one landmark array per detected person"""
+        # Video mode requires strictly increasing timestamps
+        timestamp_ms = self._last_timestamp_ms + 1 if timestamp is None else int(timestamp * 1000)
+        timestamp_ms = max(timestamp_ms, self._last_timestamp_ms + 1)
+        self._last_timestamp_ms = timestamp_ms
+        image = self._mp.Image(image_format=self._mp.ImageFormat.SRGB, data=rgb_frame)
+        result = self._landmarker.detect_for_video(image, timestamp_ms)
+
+        poses = [self._to_array(landmarks) for landmarks in result.pose_landmarks]
+        self.world_poses = [self._to_array(landmarks) for landmarks in result.pose_world_landmarks]
+        return poses
+
+    @staticmethod
+    def _to_array(landmarks):
+        points = np.empty((NUM_LANDMARKS, 4), dtype=np.float32)
+        for i, lm in enumerate(landmarks):
+            visibility = lm.visibility if lm.visibility is not None else 1.0
+            points[i] = (lm.x, lm.y, lm.z, visibility)
+        return points
+
+    def process(self, rgb_frame, timestamp=None):
+        poses = self.detect_all(rgb_frame, timestamp)
+        self.last_world = self.world_poses[0] if self.world_poses else None
+        return poses[0] if poses else None
+
+    def close(self):
+        self._landmarker.close()
+
+
+class OnnxPoseBackend(PoseBackend):
+    """ONNX Runtime (CPU) running a single-person pose model
+
+    Supports MoveNet-style models (output [N, 1, 17, 3] of y, x, score,
+    mapped onto the MediaPipe layout) and exported BlazePose landmark models
+    (output [N, 165 or 195] of 33 x, y, z, visibility(, presence) in input
+    pixels). Frames are letterboxed to the model input and landmarks mapped
+    back to normalized frame coordinates. When the model's batch dimension
+    is dynamic, process_batch runs all frames in one session.run call.
+    """
+
+    name = "onnx"
+
+    def __init__(self, model_path=DEFAULT_ONNX_MODEL_PATH, num_threads=None, min_score=0.3):
+        import onnxruntime as ort
+
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(f"ONNX pose model not found at {model_path}; "
+                                    "set FITFUSION_ONNX_MODEL")
+        options = ort.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self._session = ort.InferenceSession(model_path, sess_options=options,
+                                             providers=["CPUExecutionProvider"])
+        self.min_score = min_score
+
+        model_input = self._session.get_inputs()[0]
+        self._input_name = model_input.name
+        shape = model_input.shape
+        self._channels_first = shape[1] == 3
+        self._height, self._width = (shape[2], shape[3]) if self._channels_first else (shape[1], shape[2])
+        self._dynamic_batch = not isinstance(shape[0], int) or shape[0] < 1
+        self._input_dtype = {"tensor(int32)": np.int32, "tensor(uint8)": np.uint8}.get(
+            model_input.type, np.float32)
+
+        output_shape = self._session.get_outputs()[0].shape
+        self._blazepose = output_shape[-1] in (165, 195)
+        # Exported BlazePose expects [0, 1] floats; MoveNet takes 0-255 values
+        self._input_scale = 1.0 / 255.0 if self._blazepose and self._input_dtype == np.float32 else 1.0
+
+    def _letterbox(self, rgb_frame, out):
+        """Resize a frame into out keeping its aspect ratio; returns (scale, pad_x, pad_y)"""
+        import cv2
+
+        height, width = rgb_frame.shape[:2]
+        scale = min(self._width / width, self._height / height)
+        new_width, new_height = int(round(width * scale)), int(round(height * scale))
+        pad_x, pad_y = (self._width - new_width) // 2, (self._height - new_height) // 2
+        out[:] = 0
+        out[pad_y:pad_y + new_height, pad_x:pad_x + new_width] = cv2.resize(
+            rgb_frame, (new_width, new_height), interpolation=cv2.INTER_AREA)
+        return scale, pad_x, pad_y
+
+    def _to_frame_coordinates(self, points, frame_shape, scale, pad_x, pad_y):
+        height, width = frame_shape[:2]
+        # Input pixels -> frame pixels -> normalized frame coordinates
+        points[:, 0] = (points[:, 0] - pad_x) / (scale * width)
+        points[:, 1] = (points[:, 1] - pad_y) / (scale * height)
+        points[:, 2] /= scale * width
+
+    def _decode(self, output, frame_shape, scale, pad_x, pad_y):
+        points = np.zeros((NUM_LANDMARKS, 4), dtype=np.float32)
+        if self._blazepose:
+            values = output.reshape(NUM_LANDMARKS, -1)
+            points[:, :3] = values[:, :3]
+            # Visibility is exported as a logit
+            points[:, 3] = 1.0 / (1.0 + np.exp(-values[:, 3]))
+        else:
+            keypoints = output.reshape(-1, 3)
+            points[_COCO_INDEX, 0] = keypoints[:, 1] * self._width
+            points[_COCO_INDEX, 1] = keypoints[:, 0] * self._height
+            points[_COCO_INDEX, 3] = keypoints[:, 2]
+            points[_FILL_TO, :3] = points[_FILL_FROM, :3]
+        self._to_frame_coordinates(points, frame_shape, scale, pad_x, pad_y)
+        if points[:, 3].max() < self.min_score:
+            return None
+        return points
+
+    def process_batch(self, rgb_frames, timestamps=None):
+        if not rgb_frames:
+            return []
+        if not self._dynamic_batch and len(rgb_frames) > 1:
+            return [self.process(frame) for frame in rgb_frames]
+
+        batch = np.empty((len(rgb_frames), self._height, self._width, 3), dtype=np.uint8)
+        transforms = [self._letterbox(frame, batch[i]) for i, frame in enumerate(rgb_frames)]
+        inputs = batch.astype(self._input_dtype)
+        if self._input_scale != 1.0:
+            inputs *= self._input_scale
+        if self._channels_first:
+            inputs = np.ascontiguousarray(inputs.transpose(0, 3, 1, 2))
+        outputs = self._session.run(None, {self._input_name: inputs})[0]
+        return [self._decode(outputs[i], frame.shape, *transform)
+                for i, (frame, transform) in enumerate(zip(rgb_frames, transforms))]
+
+    def process(self, rgb_frame, timestamp=None):
+        return self.process_batch([rgb_frame])[0]
+
+
+BACKENDS = {
+    "mediapipe": MediaPipeLegacyBackend,
+    "mediapipe-tasks": MediaPipeTasksBackend,
+    "onnx": OnnxPoseBackend,
+}
+
+# Python module each backend needs
+_REQUIRES = {"mediapipe": "mediapipe", "mediapipe-tasks": "mediapipe", "onnx": "onnxruntime"}
+
+
+def available_backends():
+    """Names of the backends whose runtime is installed"""
+    return [name for name in BACKENDS if importlib.util.find_spec(_REQUIRES[name]) is not None]
+
+
+def create_backend(name="mediapipe", **options):
+    """Create a pose backend by name with backend-specific options"""
+    try:
+        factory = BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Unknown pose backend: {name}") from None
+    return factory(**options)
+
+
+def add_backend_arguments(parser):
+    """Add --backend, --model-complexity and --threads to a command line parser"""
+    parser.add_argument("--backend", choices=tuple(BACKENDS), default="mediapipe",
+                        help="Pose backend (run `python benchmark.py --mode backends` to compare)")
+    parser.add_argument("--model-complexity", type=int, choices=(0, 1, 2), default=1,
+                        help="MediaPipe Pose model complexity (mediapipe backend)")
+    parser.add_argument("--threads", type=int, default=None,
+                        help="Inference threads for the Tasks and ONNX backends")
+
+
+def backend_options_from_args(args):
+    """create_backend options for arguments added by add_backend_arguments"""
+    if args.backend == "mediapipe":
+        return {"model_complexity": args.model_complexity}
+    return {"num_threads": args.threads} if args.threads else {}
@@ -0,0 +1,165 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+
+class _PoolEntry:
+    def __init__(self):
+        # Set once the factory has returned (pose) or failed (error)
+        self.pose = None
+        self.error = None
+        self.ready = threading.Event()
+        self.lock = threading.Lock()
+        self.users = 0
+        self.last_used = time.time()
+
+
+class PosePool:
+    """Bounded pool of pose estimator instances, one per session
+
+    MediaPipe keeps tracking state per graph, so every session gets its own
+    instance. Instances idle for longer than idle_timeout are closed. When
+    the pool is full, the least recently used instance that has been idle
+    for reclaim_after seconds is reclaimed; a session that is still
+    streaming uses its graph far more often than that, so it keeps it.
+    If nothing can be reclaimed within wait_timeout, session() yields None
+    and the caller skips the frame instead of failing.
+    Instances are built outside the pool lock, so a slow graph build only
+    holds up sessions asking for that same instance.
+    """
+
+    def __init__(self, factory, max_size=None, idle_timeout=300.0, reclaim_after=10.0,
+                 wait_timeout=1.0):
+        self.factory = factory
+        self.max_size = max_size or os.cpu_count() or 4
+        self.idle_timeout = idle_timeout
+        self.reclaim_after = reclaim_after
+        self.wait_timeout = wait_timeout
+        # Frames that got no instance because the pool stayed full
+        self.unavailable = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # Notified whenever an instance stops being used or leaves the pool
+        self._freed = threading.Condition(self._lock)
+
+    @contextmanager
+    def session(self, session_id, **options):
+        """Yield the pose instance owned by session_id, holding it exclusively
+
+        Keyword options are passed to the factory, and each distinct set of
+        options gets its own instance (e.g. a different model_complexity).
+        Yields None if the pool is full of instances in use.
+        """
+        key = (session_id, tuple(sorted(options.items())))
+        entry = self._acquire_entry(key, options)
+        if entry is None:
+            yield None
+            return
+        try:
+            with entry.lock:
+                entry.last_used = time.time()
+                yield entry.pose
+        finally:
+            with self._lock:
+                entry.users -= 1
+                entry.last_used = time.time()
+                self._freed.notify_all()
+
+    def _acquire_entry(self, key, options):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._evict_idle()
+                deadline = time.time() + self.wait_timeout
+                while len(self._entries) >= self.max_size and not self._reclaim_lru():
+                    now = time.time()
+                    if now >= deadline:
+                        self.unavailable += 1
+                        return None
+                    self._freed.wait(min(deadline, self._next_reclaim()) - now)
+                # Another caller may have started the same instance meanwhile
+                entry = self._entries.get(key)
+            build = entry is None
+            if build:
+                # Placeholder: later callers for this key wait for the build below
+                entry = _PoolEntry()
+                self._entries[key] = entry
+            else:
+                self._entries.move_to_end(key)
+            entry.users += 1
+
+        if build:
+            try:
+                entry.pose = self.factory(**options)
+            except BaseException as e:
+                entry.error = e
+            finally:
+                entry.ready.set()
+        else:
+            entry.ready.wait()
+
+        if entry.error is not None:
+            with self._lock:
+                entry.users -= 1
+                if self._entries.get(key) is entry:
+                    del self._entries[key]
+                self._freed.notify_all()
+            raise entry.error
+        return entry
+
+    def _evict_idle(self):
+        now = time.time()
+        for key, entry in list(self._entries.items()):
+            if now - entry.last_used > self.idle_timeout and not entry.users:
+                self._close(self._entries.pop(key))
+
+    def _reclaim_lru(self):
+        """Close the least recently used instance idle for reclaim_after; False if none is"""
+        now = time.time()
+        # OrderedDict keeps the least recently used session first
+        for key, entry in self._entries.items():
+            if not entry.users and now - entry.last_used >= self.reclaim_after:
+                self._close(self._entries.pop(key))
+                return True
+        return False
+
+    def _next_reclaim(self):
+        """When the next unused instance becomes reclaimable (inf if none is unused)"""
+        return min((entry.last_used + self.reclaim_after for entry in self._entries.values()
+                    if not entry.users), default=float("inf"))
+
+    def release(self, session_id):
+        """Close and forget every instance owned by session_id"""
+        with self._lock:
+            keys = [key for key in self._entries if key[0] == session_id]
+            entries = [self._entries.pop(key) for key in keys]
+            self._freed.notify_all()
+        for entry in entries:
+            # An instance still being built is closed once the build finishes
+            entry.ready.wait()
+            with entry.lock:
+                self._close(entry)
+
+    def close(self):
+        """Close every pooled instance"""
+        with self._lock:
+            entries = list(self._entries.values())
+            self._entries.clear()
+            self._freed.notify_all()
+        for entry in entries:
+            entry.ready.wait()
+            self._close(entry)
+
+    def _close(self, entry):
+        if entry.pose is None:
+            return
+        try:
+            entry.pose.close()
+        except Exception:
+            pass
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
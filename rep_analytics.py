@@ -0,0 +1,169 @@
+"""Per-rep tempo, range of motion and form scoring
+
+RepAnalyzer follows the angle an exercise counts on and splits every rep at
+its turning point: from the last frame at the rest position (e.g. standing
+tall) to the deepest point, then back until the rep is counted. Only the
+current rep's extremes and a few running sums are kept, so each frame costs
+a handful of comparisons whatever the length of the session.
+"""
+import math
+from collections import namedtuple
+
+# Angles in degrees, times in seconds; form_score is 0-100. asymmetry is
+# this side's angle minus the other side's at the turning point (bilateral
+# tracking only, else None)
+RepMetrics = namedtuple("RepMetrics", [
+    "rep", "finished_at", "min_angle", "max_angle", "range_of_motion",
+    "eccentric", "concentric", "duration", "form_score", "asymmetry",
+])
+
+# Left/right difference (degrees) at the turning point worth telling the athlete about
+ASYMMETRY_WARNING = 10.0
+
+# Weights of range of motion, tempo (vs. the athlete's average rep) and
+# control (lowering at least as slowly as lifting) in the form score
+FORM_WEIGHTS = (0.5, 0.3, 0.2)
+
+
+def create_analyzer(exercise):
+    """Create a RepAnalyzer for a compiled exercise, or None if it has no reps
+
+    Holds and custom exercises without a counting transition have nothing
+    to split into reps.
+    """
+    if exercise.hold or not any(rule.counts for rule in exercise.definition.transitions):
+        return None
+    return RepAnalyzer(exercise)
+
+
+class RepAnalyzer:
+    """Incremental rep analytics for a compiled rep-based exercise"""
+
+    def __init__(self, exercise):
+        definition = exercise.definition
+        counting = [i for i, rule in enumerate(definition.transitions) if rule.counts]
+        if not counting:
+            raise ValueError(f"{definition.name} has no counting transition")
+        count_rule = definition.transitions[counting[0]]
+        # Rest position: the state a rep returns to, and the angle/threshold that ends it
+        self.rest_state = exercise.state_ids[count_rule.next_state]
+        self.angle_index = int(exercise.rule_angle[counting[0]])
+        # Angles are flipped so that the rest position is always the high side
+        self.sign = 1.0 if count_rule.op == ">" else -1.0
+        self.rest_threshold = self.sign * count_rule.threshold
+        turn_rules = [rule for rule in definition.transitions
+                      if exercise.state_ids[rule.state] == self.rest_state and not rule.counts]
+        turn_threshold = self.sign * turn_rules[0].threshold if turn_rules else self.rest_threshold
+        # Range a full rep has to cover between the two thresholds
+        self.target_range = max(self.rest_threshold - turn_threshold, 1.0)
+        self.concentric_first = definition.concentric_first
+        # e.g. ("left", "knee") for the angle at LEFT_KNEE
+        side, _, joint = count_rule.angle[1].lower().partition("_")
+        self.side, self.joint = (side, joint) if joint else ("", side)
+        self.reset()
+
+    def reset(self):
+        self.last_rep = None
+        self.reps = 0
+        # Current rep: rest peak, deepest point and when the rep left the rest position
+        self._at_rest = True
+        self._peak = -math.inf
+        self._trough = math.inf
+        self._start_time = self._turn_time = None
+        self._turn_asymmetry = None
+        # Running sums (Welford for the rep duration)
+        self._duration_mean = 0.0
+        self._duration_m2 = 0.0
+        self._range_sum = 0.0
+        self._score_sum = 0.0
+
+    def observe(self, timestamp, angles, state_id, counted, asymmetry=None):
+        """Account for one frame, after the tracker's state machine has run"""
+        value = self.sign * float(angles[self.angle_index])
+        if asymmetry is not None:
+            asymmetry = float(asymmetry[self.angle_index])
+            if math.isnan(asymmetry):
+                asymmetry = None
+        if counted:
+            self._finish(timestamp)
+            self._at_rest = True
+            self._peak = self._trough = value
+            self._start_time = self._turn_time = timestamp
+            self._turn_asymmetry = asymmetry
+        elif state_id == self.rest_state and value >= self.rest_threshold:
+            # Still at (or back to) the rest position: the rep hasn't started
+            self._peak = max(self._peak, value) if self._at_rest else value
+            self._at_rest = True
+            self._trough = value
+            self._start_time = self._turn_time = timestamp
+            self._turn_asymmetry = asymmetry
+        else:
+            self._at_rest = False
+            if self._start_time is None:
+                self._start_time = self._turn_time = timestamp
+            if value < self._trough:
+                self._trough = value
+                self._turn_time = timestamp
+                self._turn_asymmetry = asymmetry
+
+    def _finish(self, timestamp):
+        if self._start_time is None:
+            return
+        self.reps += 1
+        first_half = self._turn_time - self._start_time
+        second_half = timestamp - self._turn_time
+        if self.concentric_first:
+            concentric, eccentric = first_half, second_half
+        else:
+            eccentric, concentric = first_half, second_half
+        duration = timestamp - self._start_time
+        angles = sorted((self.sign * self._peak, self.sign * self._trough))
+        range_of_motion = self._peak - self._trough
+
+        # Form score: full range, steady tempo and a controlled lowering phase
+        depth = min(range_of_motion / self.target_range, 1.0)
+        if self.reps > 1 and self._duration_mean > 0:
+            tempo = 1.0 - min(abs(duration - self._duration_mean) / self._duration_mean, 1.0)
+        else:
+            tempo = 1.0
+        control = min(eccentric / concentric, 1.0) if concentric > 0 else 1.0
+        form_score = round(100 * (FORM_WEIGHTS[0] * depth + FORM_WEIGHTS[1] * tempo +
+                                  FORM_WEIGHTS[2] * control))
+
+        delta = duration - self._duration_mean
+        self._duration_mean += delta / self.reps
+        self._duration_m2 += delta * (duration - self._duration_mean)
+        self._range_sum += range_of_motion
+        self._score_sum += form_score
+        self.last_rep = RepMetrics(self.reps, timestamp, angles[0], angles[1], range_of_motion,
+                                   eccentric, concentric, duration, form_score,
+                                   self._turn_asymmetry)
+
+    def asymmetry_feedback(self):
+        """Describe a notable left/right difference in the last rep ("" if none)"""
+        asymmetry = self.last_rep.asymmetry if self.last_rep else None
+        if asymmetry is None or abs(asymmetry) < ASYMMETRY_WARNING:
+            return ""
+        other = {"left": "right", "right": "left"}.get(self.side, "other side")
+        # A smaller angle is the more bent joint
+        bent, straight = (self.side, other) if asymmetry < 0 else (other, self.side)
+        return f"{bent.capitalize()} {self.joint} bends {abs(asymmetry):.0f}° more than {straight}"
+
+    def tempo_consistency(self):
+        """1 minus the coefficient of variation of rep durations (None before two reps)"""
+        if self.reps < 2 or self._duration_mean <= 0:
+            return None
+        deviation = math.sqrt(self._duration_m2 / (self.reps - 1))
+        return max(0.0, 1.0 - deviation / self._duration_mean)
+
+    def summary(self):
+        """Running totals over every analyzed rep"""
+        reps = self.reps
+        return {
+            "reps": reps,
+            "mean_duration": self._duration_mean if reps else None,
+            "tempo_consistency": self.tempo_consistency(),
+            "mean_range_of_motion": self._range_sum / reps if reps else None,
+            "mean_form_score": self._score_sum / reps if reps else None,
+            "last_rep": self.last_rep._asdict() if self.last_rep else None,
+        }
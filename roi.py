@@ -0,0 +1,109 @@
+import numpy as np
+
+
+class RoiTracker:
+    """Crop pose inference to the region around the athlete's last landmarks
+
+    The region is a padded, square (in pixels) box around the visible
+    landmarks of the previous frame. It only moves when the athlete gets
+    close to its edge or it becomes much larger than needed, so the pose
+    model sees a stable crop. When no pose is found the tracker falls back
+    to the full frame. Landmarks detected in the crop are mapped back to
+    normalized full-frame coordinates.
+    """
+
+    def __init__(self, padding=0.3, margin=0.1, min_size=0.15, max_slack=2.5, min_visibility=0.5):
+        # Fraction of the landmark box added on each side
+        self.padding = padding
+        # Landmarks closer than this (fraction of the box) to an edge move the box
+        self.margin = margin
+        # Smallest crop, as a fraction of the frame's shorter side
+        self.min_size = min_size
+        # Shrink the box when it's this many times larger (in area) than needed
+        self.max_slack = max_slack
+        self.min_visibility = min_visibility
+        self.box = None  # (x0, y0, x1, y1) in pixels, None for the full frame
+        self.cropped_frames = 0
+        self.full_frames = 0
+        self.losses = 0
+        self.moves = 0
+
+    def reset(self):
+        self.box = None
+
+    def crop(self, frame):
+        """Return (image, box) to run the pose model on
+
+        box is the (x0, y0, x1, y1) pixel region of the frame the image
+        covers (the whole frame when there's no region yet).
+        """
+        height, width = frame.shape[:2]
+        if self.box is None:
+            self.full_frames += 1
+            return frame, (0, 0, width, height)
+        self.cropped_frames += 1
+        x0, y0, x1, y1 = self.box
+        # Row slices of a full-width frame stay contiguous; otherwise copy the (small) crop
+        return np.ascontiguousarray(frame[y0:y1, x0:x1]), self.box
+
+    @staticmethod
+    def to_frame(points, box, frame_shape):
+        """Map landmarks normalized to the crop into normalized frame coordinates (in place)"""
+        height, width = frame_shape[:2]
+        x0, y0, x1, y1 = box
+        crop_width, crop_height = x1 - x0, y1 - y0
+        points[:, 0] = (points[:, 0] * crop_width + x0) / width
+        points[:, 1] = (points[:, 1] * crop_height + y0) / height
+        # MediaPipe's z uses the same scale as x
+        points[:, 2] *= crop_width / width
+        return points
+
+    def update(self, points, frame_shape):
+        """Choose the region for the next frame from this frame's landmarks"""
+        if points is None:
+            if self.box is not None:
+                self.losses += 1
+            self.box = None
+            return
+        visible = points[:, 3] >= self.min_visibility
+        if visible.sum() < 4:
+            self.box = None
+            return
+
+        height, width = frame_shape[:2]
+        xs = points[visible, 0] * width
+        ys = points[visible, 1] * height
+        left, right, top, bottom = xs.min(), xs.max(), ys.min(), ys.max()
+
+        if self.box is not None:
+            x0, y0, x1, y1 = self.box
+            inset_x, inset_y = (x1 - x0) * self.margin, (y1 - y0) * self.margin
+            inside = (left >= x0 + inset_x or x0 == 0) and (right <= x1 - inset_x or x1 == width) and \
+                (top >= y0 + inset_y or y0 == 0) and (bottom <= y1 - inset_y or y1 == height)
+            needed = (right - left) * (bottom - top) * (1 + 2 * self.padding) ** 2
+            if inside and (x1 - x0) * (y1 - y0) <= self.max_slack * max(needed, 1.0):
+                return
+
+        # Padded square around the landmarks, clamped to the frame
+        size = max(right - left, bottom - top) * (1 + 2 * self.padding)
+        size = min(max(size, self.min_size * min(width, height)), max(width, height))
+        center_x, center_y = (left + right) / 2, (top + bottom) / 2
+        x0 = int(max(center_x - size / 2, 0))
+        y0 = int(max(center_y - size / 2, 0))
+        x1 = int(min(center_x + size / 2, width))
+        y1 = int(min(center_y + size / 2, height))
+        if (x1 - x0) * (y1 - y0) >= 0.9 * width * height:
+            # Not worth cropping
+            self.box = None
+        else:
+            self.box = (x0, y0, x1, y1)
+            self.moves += 1
+
+    def stats(self):
+        return {
+            "roi": list(self.box) if self.box is not None else "full frame",
+            "roi_cropped_frames": self.cropped_frames,
+            "roi_full_frames": self.full_frames,
+            "roi_losses": self.losses,
+            "roi_moves": self.moves,
+        }
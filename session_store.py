@@ -0,0 +1,217 @@
+"""Persistent workout history
+
+Sessions, rep events and joint angle traces are appended to a SQLite
+database (FITFUSION_DB, default fitfusion.db). Each session row carries its
+rep total and duration, so history views aggregate from the indexed
+sessions table without touching rep events or traces. Angle traces are
+stored in chunks of packed arrays (one BLOB of float64 times and one of
+float32 angles per chunk) rather than one row per frame, and writes are batched: a recorder
+buffers in NumPy arrays and flushes a chunk in a single transaction.
+"""
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+from exercise_tracker import JOINT_ANGLE_NAMES
+
+DEFAULT_DB_PATH = os.environ.get("FITFUSION_DB", "fitfusion.db")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id INTEGER PRIMARY KEY,
+    user TEXT NOT NULL,
+    exercise TEXT NOT NULL,
+    day TEXT NOT NULL,
+    started_at REAL NOT NULL,
+    ended_at REAL,
+    reps INTEGER NOT NULL DEFAULT 0,
+    frames INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS sessions_user_day ON sessions (user, day);
+CREATE INDEX IF NOT EXISTS sessions_user_exercise_day ON sessions (user, exercise, day);
+CREATE INDEX IF NOT EXISTS sessions_day ON sessions (day);
+
+CREATE TABLE IF NOT EXISTS reps (
+    session_id INTEGER NOT NULL REFERENCES sessions (id),
+    rep INTEGER NOT NULL,
+    at REAL NOT NULL,
+    duration REAL NOT NULL,
+    PRIMARY KEY (session_id, rep)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS angle_chunks (
+    session_id INTEGER NOT NULL REFERENCES sessions (id),
+    chunk INTEGER NOT NULL,
+    frames INTEGER NOT NULL,
+    times BLOB NOT NULL,
+    angles BLOB NOT NULL,
+    PRIMARY KEY (session_id, chunk)
+) WITHOUT ROWID;
+"""
+
+
+def _day(timestamp):
+    return time.strftime("%Y-%m-%d", time.localtime(timestamp))
+
+
+class SessionStore:
+    """SQLite-backed store shared by every session of the app
+
+    One connection is shared between threads and serialized by a lock;
+    write-ahead logging lets history queries run while sessions record.
+    """
+
+    def __init__(self, path=DEFAULT_DB_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._conn.commit()
+
+    def start_session(self, user, exercise, started_at=None, chunk_frames=512):
+        """Create a session row and return a SessionRecorder for it"""
+        started_at = started_at or time.time()
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "INSERT INTO sessions (user, exercise, day, started_at) VALUES (?, ?, ?, ?)",
+                (user, exercise, _day(started_at), started_at))
+        return SessionRecorder(self, cursor.lastrowid, started_at, chunk_frames)
+
+    def _write(self, session_id, chunk, times, angles, reps, total_reps, frames, ended_at=None):
+        """Write one batch of trace frames and rep events in a single transaction"""
+        with self._lock, self._conn:
+            if len(times):
+                self._conn.execute(
+                    "INSERT INTO angle_chunks (session_id, chunk, frames, times, angles) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (session_id, chunk, len(times), times.tobytes(), angles.tobytes()))
+            if reps:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO reps (session_id, rep, at, duration) VALUES (?, ?, ?, ?)",
+                    [(session_id, rep, at, duration) for rep, at, duration in reps])
+            self._conn.execute(
+                "UPDATE sessions SET reps = ?, frames = ?, ended_at = COALESCE(?, ended_at) "
+                "WHERE id = ?", (total_reps, frames, ended_at, session_id))
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def users(self):
+        return [row[0] for row in self._query("SELECT DISTINCT user FROM sessions ORDER BY user")]
+
+    def daily_summary(self, user, exercise=None, since=None, until=None):
+        """Return [(day, exercise, sessions, reps, seconds)] for a user, newest first
+
+        since/until are "YYYY-MM-DD" strings (inclusive).
+        """
+        sql = ("SELECT day, exercise, COUNT(*), SUM(reps), "
+               "SUM(COALESCE(ended_at, started_at) - started_at) "
+               "FROM sessions WHERE user = ?")
+        params = [user]
+        if exercise:
+            sql += " AND exercise = ?"
+            params.append(exercise)
+        if since:
+            sql += " AND day >= ?"
+            params.append(since)
+        if until:
+            sql += " AND day <= ?"
+            params.append(until)
+        sql += " GROUP BY day, exercise ORDER BY day DESC, exercise"
+        return self._query(sql, params)
+
+    def recent_sessions(self, user, exercise=None, limit=20):
+        """Return the newest sessions of a user as dicts"""
+        sql = "SELECT id, exercise, started_at, ended_at, reps, frames FROM sessions WHERE user = ?"
+        params = [user]
+        if exercise:
+            sql += " AND exercise = ?"
+            params.append(exercise)
+        sql += " ORDER BY day DESC, started_at DESC LIMIT ?"
+        params.append(limit)
+        columns = ("id", "exercise", "started_at", "ended_at", "reps", "frames")
+        return [dict(zip(columns, row)) for row in self._query(sql, params)]
+
+    def session_reps(self, session_id):
+        """Return [(rep, at, duration)] for one session"""
+        return self._query("SELECT rep, at, duration FROM reps WHERE session_id = ? ORDER BY rep",
+                           (session_id,))
+
+    def session_angles(self, session_id):
+        """Return (times, angles) arrays for one session's joint angle trace"""
+        rows = self._query("SELECT times, angles FROM angle_chunks WHERE session_id = ? ORDER BY chunk",
+                           (session_id,))
+        times = np.concatenate([np.frombuffer(t, dtype=np.float64) for t, _ in rows]) \
+            if rows else np.zeros(0)
+        angles = np.concatenate([np.frombuffer(a, dtype=np.float32) for _, a in rows]) \
+            if rows else np.zeros(0, dtype=np.float32)
+        return times, angles.reshape(-1, len(JOINT_ANGLE_NAMES))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class SessionRecorder:
+    """Buffers one session's frames and reps and writes them in batches
+
+    record_frame and record_rep are cheap array writes; the database is only
+    touched when a chunk fills up and on flush()/close(). Every write moves
+    the session's ended_at to the last recorded frame, so a session that is
+    never closed (tab closed, server restarted) still has a duration.
+    """
+
+    def __init__(self, store, session_id, started_at, chunk_frames=512):
+        self.store = store
+        self.session_id = session_id
+        self.started_at = started_at
+        self.reps = 0
+        self.frames = 0
+        self.closed = False
+        self._times = np.empty(chunk_frames, dtype=np.float64)
+        self._angles = np.empty((chunk_frames, len(JOINT_ANGLE_NAMES)), dtype=np.float32)
+        self._filled = 0
+        self._chunk = 0
+        self._pending_reps = []
+        self._last_rep_at = started_at
+        self._last_frame_at = None
+
+    def record_frame(self, timestamp, angles):
+        """Append one frame of the joint angle trace"""
+        self._times[self._filled] = timestamp
+        self._angles[self._filled] = angles[:len(JOINT_ANGLE_NAMES)]
+        self._filled += 1
+        self.frames += 1
+        self._last_frame_at = timestamp
+        if self._filled == len(self._times):
+            self.flush()
+
+    def record_rep(self, timestamp):
+        """Record that the session's next rep finished at timestamp"""
+        self.reps += 1
+        self._pending_reps.append((self.reps, timestamp, timestamp - self._last_rep_at))
+        self._last_rep_at = timestamp
+
+    def flush(self, ended_at=None):
+        """Write what is buffered; ended_at defaults to the last recorded frame"""
+        filled = self._filled
+        if ended_at is None:
+            ended_at = max(self._last_frame_at or self.started_at, self._last_rep_at)
+        self.store._write(self.session_id, self._chunk, self._times[:filled], self._angles[:filled],
+                          self._pending_reps, self.reps, self.frames, ended_at)
+        if filled:
+            self._chunk += 1
+        self._filled = 0
+        self._pending_reps = []
+
+    def close(self):
+        """Flush what is buffered and mark the session as ended"""
+        if not self.closed:
+            self.closed = True
+            self.flush(ended_at=time.time())
@@ -0,0 +1,140 @@
+"""Headless rep counting for many camera stations from one process
+
+Usage:
+    python stations.py stations.json [--workers N] [--fps 10] [--stream-port 8502] [--backend NAME]
+
+stations.json is a list of stations, e.g.
+    [{"name": "rack-1", "source": "rtsp://10.0.0.21/stream", "exercise": "Squats"},
+     {"name": "mat-3", "source": "0", "exercise": "Push-ups", "fps": 5}]
+
+Every source is decoded once by a CaptureManager and all stations share one
+pool of inference workers with a per-station frame-rate budget. Annotated
+video is served on --stream-port under a random path per station, printed
+at startup, and counts are printed (and exported as Prometheus metrics with
+--metrics-port). Both servers listen on --host (default localhost). With
+--events-port, counts and reps are pushed live over SSE/WebSocket (see
+event_server.py), with each station's name as the session.
+"""
+import argparse
+import json
+import time
+
+import cv2
+
+import metrics as metrics_registry
+from capture_manager import CaptureManager, InferenceScheduler
+from event_server import EventServer
+from exercise_tracker import ExerciseTracker
+from landmark_filter import create_filter
+from metrics import FrameMetrics
+from pose_backends import add_backend_arguments, backend_options_from_args, create_backend
+from synthetic_motion import draw_skeleton
+from video_stream import MJPEGServer
+
+
+def make_station_fn(pose, metrics, events=None):
+    """Return a process_fn that runs one station's own pose backend"""
+    def process(frame, tracker, buffers=None):
+        with metrics.stage("color_convert"):
+            rgb_frame = buffers.acquire(frame.shape) if buffers is not None else None
+            rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=rgb_frame)
+        now = time.time()
+        with metrics.stage("pose"):
+            points = pose.process(rgb_frame, now)
+        count, feedback = tracker.count, tracker.feedback
+        if points is not None:
+            previous_count = tracker.count
+            with metrics.stage("tracker"):
+                count, feedback = tracker.update(points, timestamp=now, world_landmarks=pose.last_world)
+            if events is not None:
+                if count > previous_count:
+                    events.rep(count, tracker.timestamp)
+                events.frame(count, feedback, tracker.timestamp)
+            draw_skeleton(rgb_frame, points, landmark_color=(255, 0, 0), connection_color=(224, 224, 224),
+                          thickness=2, radius=3, min_visibility=0.5)
+        metrics.frame_done()
+        return rgb_frame, count, feedback
+    return process
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Count reps on many camera stations at once")
+    parser.add_argument("config", help="JSON file listing the stations")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Inference worker threads (default: all cores)")
+    parser.add_argument("--fps", type=float, default=10,
+                        help="Default inference budget per station")
+    parser.add_argument("--host", default="127.0.0.1",
+                        help="Interface the stream and event servers listen on")
+    parser.add_argument("--stream-port", type=int, default=8502,
+                        help="Port for the MJPEG streams (0 to disable)")
+    parser.add_argument("--metrics-port", type=int, default=None,
+                        help="Serve Prometheus metrics on this port")
+    parser.add_argument("--events-port", type=int, default=0,
+                        help="Publish live count events on this port (0 to disable)")
+    add_backend_arguments(parser)
+    args = parser.parse_args()
+
+    with open(args.config) as f:
+        stations = json.load(f)
+
+    # Each worker runs one station at a time; keep OpenCV from oversubscribing
+    cv2.setNumThreads(1)
+    manager = CaptureManager()
+    scheduler = InferenceScheduler(workers=args.workers)
+    server = MJPEGServer(args.stream_port, args.host) if args.stream_port else None
+    events = EventServer(args.events_port, args.host) if args.events_port else None
+    if args.metrics_port:
+        metrics_registry.start_metrics_server(args.metrics_port)
+
+    poses = []
+    channels = {}
+    for station in stations:
+        name = station["name"]
+        capture = manager.open(station["source"])
+        if not capture.isOpened():
+            print(f"{name}: could not open {station['source']}")
+            capture.release()
+            continue
+        pose = create_backend(args.backend, **backend_options_from_args(args))
+        poses.append(pose)
+        metrics = FrameMetrics(labels={"station": name})
+        metrics_registry.register(name, metrics)
+        tracker = ExerciseTracker(station["exercise"], create_filter(station.get("smoothing", "One Euro")))
+        channel = events.channel(name, exercise=station["exercise"]) if events is not None else None
+        scheduler.add_stream(name, capture, tracker, make_station_fn(pose, metrics, channel),
+                             max_fps=station.get("fps", args.fps))
+        if server is not None:
+            channels[name] = server.channel(name, max_fps=station.get("fps", args.fps))
+            print(f"{name}: video at http://{args.host}:{args.stream_port}{channels[name].path}")
+
+    scheduler.start()
+    try:
+        last_report = time.time()
+        while True:
+            # Forward each station's newest frame to its stream
+            for name, channel in channels.items():
+                result = scheduler.latest(name, timeout=0)
+                if result is not None:
+                    channel.publish(result[1])
+                    scheduler.release(name, result[1])
+            if time.time() - last_report > 5:
+                last_report = time.time()
+                for name, stats in scheduler.stats().items():
+                    stream = scheduler.stream(name)
+                    status = stats["error"] or f"{stream.tracker.count} ({stream.tracker.feedback})"
+                    print(f"{name}: {status} | {stats['processed']} frames, {stats['skipped']} skipped")
+            time.sleep(0.02)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        scheduler.stop()
+        manager.close()
+        if events is not None:
+            events.close()
+        for pose in poses:
+            pose.close()
+
+
+if __name__ == "__main__":
+    main()
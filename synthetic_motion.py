@@ -0,0 +1,141 @@
+"""Synthetic pose landmark generators for testing without a camera
+
+Each generator produces (33, 4) float32 landmark arrays (x, y, z, visibility
+in normalized image coordinates, like MediaPipe Pose) whose joint angles
+sweep through the thresholds used by ExerciseTracker, so the trackers count
+one rep per motion period.
+"""
+import math
+
+import numpy as np
+
+from exercise_tracker import NUM_LANDMARKS, POSE_CONNECTIONS, PoseLandmark
+
+L = PoseLandmark
+
+# Neutral standing pose, roughly centred in the frame
+_STANDING = {
+    L.NOSE: (0.50, 0.18), L.LEFT_EYE_INNER: (0.51, 0.17), L.LEFT_EYE: (0.52, 0.17),
+    L.LEFT_EYE_OUTER: (0.53, 0.17), L.RIGHT_EYE_INNER: (0.49, 0.17), L.RIGHT_EYE: (0.48, 0.17),
+    L.RIGHT_EYE_OUTER: (0.47, 0.17), L.LEFT_EAR: (0.54, 0.18), L.RIGHT_EAR: (0.46, 0.18),
+    L.MOUTH_LEFT: (0.51, 0.20), L.MOUTH_RIGHT: (0.49, 0.20),
+    L.LEFT_SHOULDER: (0.57, 0.28), L.RIGHT_SHOULDER: (0.43, 0.28),
+    L.LEFT_ELBOW: (0.59, 0.39), L.RIGHT_ELBOW: (0.41, 0.39),
+    L.LEFT_WRIST: (0.60, 0.49), L.RIGHT_WRIST: (0.40, 0.49),
+    L.LEFT_PINKY: (0.61, 0.51), L.RIGHT_PINKY: (0.39, 0.51),
+    L.LEFT_INDEX: (0.60, 0.52), L.RIGHT_INDEX: (0.40, 0.52),
+    L.LEFT_THUMB: (0.59, 0.51), L.RIGHT_THUMB: (0.41, 0.51),
+    L.LEFT_HIP: (0.55, 0.52), L.RIGHT_HIP: (0.45, 0.52),
+    L.LEFT_KNEE: (0.55, 0.68), L.RIGHT_KNEE: (0.45, 0.68),
+    L.LEFT_ANKLE: (0.55, 0.84), L.RIGHT_ANKLE: (0.45, 0.84),
+    L.LEFT_HEEL: (0.54, 0.86), L.RIGHT_HEEL: (0.46, 0.86),
+    L.LEFT_FOOT_INDEX: (0.57, 0.87), L.RIGHT_FOOT_INDEX: (0.43, 0.87),
+}
+
+# Per exercise: the (first, vertex, moving) joint chains driven on each side,
+# and the angle range swept during one rep (start angle first)
+_MOTIONS = {
+    "Push-ups": ((L.LEFT_SHOULDER, L.LEFT_ELBOW, L.LEFT_WRIST),
+                 (L.RIGHT_SHOULDER, L.RIGHT_ELBOW, L.RIGHT_WRIST), 172.0, 70.0),
+    "Squats": ((L.LEFT_HIP, L.LEFT_KNEE, L.LEFT_ANKLE),
+               (L.RIGHT_HIP, L.RIGHT_KNEE, L.RIGHT_ANKLE), 175.0, 75.0),
+    "Crunches": ((L.LEFT_KNEE, L.LEFT_HIP, L.LEFT_SHOULDER),
+                 (L.RIGHT_KNEE, L.RIGHT_HIP, L.RIGHT_SHOULDER), 140.0, 45.0),
+    "Pull-ups": ((L.LEFT_SHOULDER, L.LEFT_ELBOW, L.LEFT_WRIST),
+                 (L.RIGHT_SHOULDER, L.RIGHT_ELBOW, L.RIGHT_WRIST), 60.0, 172.0),
+    "Plank": None,
+}
+
+# Exercises with a synthetic motion
+SYNTHETIC_EXERCISES = tuple(_MOTIONS)
+
+_BASE = np.zeros((NUM_LANDMARKS, 4), dtype=np.float32)
+for _landmark, (_x, _y) in _STANDING.items():
+    _BASE[_landmark.value] = (_x, _y, 0.0, 0.99)
+
+
+def _set_angle(points, first, vertex, moving, angle, side):
+    """Move `moving` so the angle first-vertex-moving equals `angle` degrees"""
+    a = points[first.value, :2]
+    b = points[vertex.value, :2]
+    c = points[moving.value, :2]
+    length = float(np.hypot(*(c - b)))
+    base = math.atan2(a[1] - b[1], a[0] - b[0])
+    theta = base + side * math.radians(angle)
+    points[moving.value, 0] = b[0] + length * math.cos(theta)
+    points[moving.value, 1] = b[1] + length * math.sin(theta)
+
+
+class SyntheticMotion:
+    """Stateless landmark generator: frame(t) gives the pose at time t seconds"""
+
+    def __init__(self, exercise_type, period=2.0, noise=0.002, seed=0):
+        if exercise_type not in _MOTIONS:
+            raise ValueError(f"Unknown exercise type: {exercise_type}")
+        self.exercise_type = exercise_type
+        self.period = period
+        self.noise = noise
+        self.rng = np.random.default_rng(seed)
+        self.out = np.empty_like(_BASE)
+
+    def angle_at(self, t):
+        """Driven joint angle at time t (degrees)"""
+        motion = _MOTIONS[self.exercise_type]
+        if motion is None:
+            return None
+        start, end = motion[2], motion[3]
+        # Cosine sweep start -> end -> start once per period
+        phase = 0.5 - 0.5 * math.cos(2.0 * math.pi * t / self.period)
+        return start + (end - start) * phase
+
+    def frame(self, t, out=None):
+        """Return the (33, 4) landmark array at time t"""
+        points = self.out if out is None else out
+        points[:] = _BASE
+        motion = _MOTIONS[self.exercise_type]
+        if motion is not None:
+            angle = self.angle_at(t)
+            _set_angle(points, *motion[0], angle, side=1)
+            _set_angle(points, *motion[1], angle, side=-1)
+        if self.noise:
+            points[:, :3] += self.rng.normal(0.0, self.noise, (NUM_LANDMARKS, 3))
+        return points
+
+
+def generate_sequence(exercise_type, n_frames, fps=30.0, period=2.0, noise=0.002, seed=0):
+    """Return (times, points) for n_frames of synthetic motion"""
+    motion = SyntheticMotion(exercise_type, period, noise, seed)
+    times = np.arange(n_frames, dtype=np.float64) / fps
+    points = np.empty((n_frames, NUM_LANDMARKS, 4), dtype=np.float32)
+    for i, t in enumerate(times):
+        motion.frame(t, out=points[i])
+    return times, points
+
+
+def draw_skeleton(frame, points, landmark_color=(0, 200, 255), connection_color=(200, 200, 200),
+                  thickness=2, radius=3, min_visibility=None):
+    """Draw landmarks as a stick figure in place (no MediaPipe needed)
+
+    With min_visibility, landmarks below it (and their connections) are
+    skipped, like MediaPipe's draw_landmarks.
+    """
+    import cv2
+
+    height, width = frame.shape[:2]
+    pixels = (points[:, :2] * (width, height)).astype(np.int32).tolist()
+    visible = [True] * len(pixels) if min_visibility is None else \
+        (points[:, 3] >= min_visibility).tolist()
+    for start, end in POSE_CONNECTIONS:
+        if visible[start] and visible[end]:
+            cv2.line(frame, tuple(pixels[start]), tuple(pixels[end]), connection_color, thickness)
+    for (x, y), shown in zip(pixels, visible):
+        if shown:
+            cv2.circle(frame, (x, y), radius, landmark_color, -1)
+    return frame
+
+
+def render_skeleton(points, width=640, height=480, out=None):
+    """Draw landmarks as a stick figure on a BGR frame (synthetic video input)"""
+    frame = np.zeros((height, width, 3), dtype=np.uint8) if out is None else out
+    frame[:] = (40, 30, 30)
+    return draw_skeleton(frame, points, thickness=6, radius=5)
@@ -0,0 +1,86 @@
+import time
+
+import numpy as np
+
+from pipeline import BufferPool, FramePipeline, LatestQueue
+
+
+class FakeCapture:
+    """Produces frames filled with their sequence number, as fast as asked"""
+
+    def __init__(self, frames=200, shape=(48, 64, 3)):
+        self.frames = frames
+        self.shape = shape
+        self.index = 0
+
+    def isOpened(self):
+        return self.index < self.frames
+
+    def read(self, image=None):
+        if self.index >= self.frames:
+            return False, None
+        self.index += 1
+        if image is None or image.shape != self.shape:
+            image = np.empty(self.shape, dtype=np.uint8)
+        image[:] = self.index % 251
+        time.sleep(0.001)
+        return True, image
+
+
+def test_buffer_pool_never_hands_out_a_held_buffer():
+    pool = BufferPool(max_free=2)
+    first = pool.acquire((4, 4))
+    second = pool.acquire((4, 4))
+    assert first is not second
+    pool.release(first)
+    pool.release(first)
+    assert pool.acquire((4, 4)) is first
+    assert pool.acquire((4, 4)) is not first
+    # A free buffer of another shape is dropped rather than returned
+    pool.release(second)
+    assert pool.acquire((8, 8)).shape == (8, 8)
+
+
+def test_latest_queue_reports_dropped_items():
+    dropped = []
+    queue = LatestQueue(1, on_drop=dropped.append)
+    assert not queue.put("a")
+    assert queue.put("b")
+    assert dropped == ["a"]
+    assert queue.get(0) == "b"
+
+
+def test_slow_consumer_frames_are_not_overwritten():
+    """Capture outpaces inference and rendering; no frame may change while in use"""
+    corrupted = []
+
+    def process(frame, tracker, buffers=None):
+        value = int(frame[0, 0, 0])
+        out = buffers.acquire(frame.shape)
+        out[:] = value
+        time.sleep(0.02)
+        if not (frame == value).all() or not (out == value).all():
+            corrupted.append("inference")
+        return out, value, ""
+
+    pipeline = FramePipeline(FakeCapture(), None, process)
+    pipeline.start()
+    rendered = 0
+    deadline = time.time() + 5
+    while pipeline.running and time.time() < deadline:
+        result = pipeline.latest(timeout=0.1)
+        if result is None:
+            continue
+        _, frame, value, _ = result
+        # A slow "encoder" holding on to the displayed frame
+        time.sleep(0.03)
+        if not (frame == value).all():
+            corrupted.append("render")
+        pipeline.release(frame)
+        rendered += 1
+    pipeline.stop()
+
+    assert pipeline.processed > 10
+    assert rendered > 5
+    assert pipeline.frames.dropped > 0
+    assert corrupted == []
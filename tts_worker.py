@@ -0,0 +1,195 @@
+import hashlib
+import heapq
+import itertools
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+# Lower numbers are spoken first
+PRIORITY_REP = 0
+PRIORITY_SESSION = 1
+PRIORITY_HINT = 2
+
+
+def _find_player():
+    """Return a command able to play WAV files on this machine, if any"""
+    if sys.platform == "win32":
+        return "winsound"
+    for command in ("afplay", "paplay", "aplay"):
+        if shutil.which(command):
+            return command
+    return None
+
+
+class SpeechWorker:
+    """Single long-lived text-to-speech thread with a bounded priority queue
+
+    The pyttsx3 engine is created and used only on the worker thread.
+    Messages already queued are coalesced, a message repeated within
+    repeat_interval is dropped, and utterances are spaced by min_interval.
+    This only adds to the callers' own check: a session should pass a hint
+    when it changes, not every frame it is shown.
+    Fixed phrases are synthesized to audio files while idle and played
+    back from the cache when a player is available.
+    """
+
+    def __init__(self, max_queue=4, min_interval=0.3, repeat_interval=3.0,
+                 cached_phrases=(), cache_dir=None):
+        self.max_queue = max_queue
+        self.min_interval = min_interval
+        self.repeat_interval = repeat_interval
+        self.cache_dir = cache_dir or os.path.join(tempfile.gettempdir(), "fitfusion_tts")
+        self.dropped = 0
+        self.spoken = 0
+        self._queue = []
+        self._queued_text = set()
+        self._order = itertools.count()
+        self._cond = threading.Condition()
+        self._last_spoken = {}
+        self._last_utterance = 0.0
+        self._properties = {"rate": 150, "volume": 1.0}
+        self._properties_changed = True
+        self._engine_properties = None
+        self._to_cache = list(cached_phrases)
+        self._cached = {}
+        self._player = _find_player()
+        self._ready = threading.Event()
+        self._error = None
+        self._stopped = False
+        self._thread = None
+
+    def start(self, timeout=10.0):
+        """Start the worker and wait for the engine; raises if it can't start"""
+        self._thread = threading.Thread(target=self._run, name="fitfusion-tts")
+        self._thread.daemon = True  # Don't block app exit
+        self._thread.start()
+        self._ready.wait(timeout)
+        if self._error is not None:
+            raise self._error
+        return self
+
+    def configure(self, rate=None, volume=None):
+        """Change speech rate/volume; applied before the next utterance"""
+        with self._cond:
+            for name, value in (("rate", rate), ("volume", volume)):
+                if value is not None and self._properties[name] != value:
+                    self._properties[name] = value
+                    self._properties_changed = True
+
+    def say(self, text, priority=PRIORITY_HINT):
+        """Queue text to be spoken; returns False if it was coalesced or dropped"""
+        if not text:
+            return False
+        with self._cond:
+            if text in self._queued_text:
+                return False
+            if time.time() - self._last_spoken.get(text, 0.0) < self.repeat_interval:
+                return False
+            if len(self._queue) >= self.max_queue:
+                # Make room by dropping the least important (then oldest) message
+                worst = max(self._queue, key=lambda item: (item[0], -item[1]))
+                if worst[0] < priority:
+                    self.dropped += 1
+                    return False
+                self._queue.remove(worst)
+                heapq.heapify(self._queue)
+                self._queued_text.discard(worst[2])
+                self.dropped += 1
+            heapq.heappush(self._queue, (priority, next(self._order), text))
+            self._queued_text.add(text)
+            self._cond.notify()
+            return True
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+
+    def _run(self):
+        try:
+            import pyttsx3
+            engine = pyttsx3.init()
+        except Exception as e:
+            self._error = e
+            self._ready.set()
+            return
+        self._ready.set()
+
+        while True:
+            with self._cond:
+                while not self._queue and not self._stopped:
+                    if self._to_cache:
+                        break
+                    self._cond.wait()
+                if self._stopped:
+                    return
+                item = heapq.heappop(self._queue) if self._queue else None
+                if item is not None:
+                    self._queued_text.discard(item[2])
+                properties = dict(self._properties) if self._properties_changed else None
+                self._properties_changed = False
+
+            try:
+                if properties is not None:
+                    engine.setProperty("rate", properties["rate"])
+                    engine.setProperty("volume", properties["volume"])
+                    self._engine_properties = properties
+                    # Cached audio was rendered with the old settings
+                    self._to_cache.extend(self._cached)
+                    self._cached.clear()
+
+                if item is None:
+                    # Idle: synthesize one fixed phrase ahead of time
+                    self._synthesize(engine, self._to_cache.pop())
+                    continue
+
+                wait = self.min_interval - (time.time() - self._last_utterance)
+                if wait > 0:
+                    time.sleep(wait)
+                self._speak(engine, item[2])
+            except Exception:
+                # Speech errors must never take the app down
+                pass
+
+    def _speak(self, engine, text):
+        path = self._cached.get(text)
+        if path is None or not self._play(path):
+            engine.say(text)
+            engine.runAndWait()
+        now = time.time()
+        self._last_utterance = now
+        with self._cond:
+            self._last_spoken[text] = now
+            if len(self._last_spoken) > 256:
+                # Forget phrases that are past their repeat window
+                self._last_spoken = {t: when for t, when in self._last_spoken.items()
+                                     if now - when < self.repeat_interval}
+        self.spoken += 1
+
+    def _synthesize(self, engine, text):
+        if self._player is None or text in self._cached:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        key = f"{text}|{self._engine_properties['rate']}|{self._engine_properties['volume']}"
+        path = os.path.join(self.cache_dir, hashlib.sha1(key.encode("utf-8")).hexdigest() + ".wav")
+        if not os.path.exists(path):
+            engine.save_to_file(text, path)
+            engine.runAndWait()
+        if os.path.exists(path):
+            self._cached[text] = path
+
+    def _play(self, path):
+        try:
+            if self._player == "winsound":
+                import winsound
+                winsound.PlaySound(path, winsound.SND_FILENAME)
+            else:
+                subprocess.run([self._player, path], check=True,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            return True
+        except Exception:
+            return False
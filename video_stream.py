@@ -0,0 +1,142 @@
+import io
+import secrets
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import cv2
+from PIL import Image
+
+BOUNDARY = "fitfusionframe"
+
+
+def encode_jpeg(rgb_frame, quality=70, max_width=None):
+    """Encode an RGB frame as JPEG bytes, downscaling it to max_width first"""
+    height, width = rgb_frame.shape[:2]
+    if max_width and width > max_width:
+        scale = max_width / width
+        rgb_frame = cv2.resize(rgb_frame, (max_width, int(height * scale)),
+                               interpolation=cv2.INTER_AREA)
+    buffer = io.BytesIO()
+    Image.fromarray(rgb_frame).save(buffer, format="JPEG", quality=quality)
+    return buffer.getvalue()
+
+
+class StreamChannel:
+    """Latest encoded frame of one session, rate limited to max_fps
+
+    The stream is served at path, whose random token is the only way to
+    find it: it is unrelated to the session id and changes per channel.
+    """
+
+    def __init__(self, max_fps=15, quality=70, max_width=None):
+        self.token = secrets.token_urlsafe(16)
+        self.path = f"/stream/{self.token}"
+        self.max_fps = max_fps
+        self.quality = quality
+        self.max_width = max_width
+        self.frame = None
+        self.sequence = 0
+        self.skipped = 0
+        self.closed = False
+        self._last_publish = 0.0
+        self._cond = threading.Condition()
+
+    def publish(self, rgb_frame):
+        """Encode and publish a frame unless the rate limit says to skip it
+
+        Returns True if the frame was published.
+        """
+        now = time.time()
+        if now - self._last_publish < 1.0 / self.max_fps:
+            self.skipped += 1
+            return False
+        self._last_publish = now
+        jpeg = encode_jpeg(rgb_frame, self.quality, self.max_width)
+        with self._cond:
+            self.frame = jpeg
+            self.sequence += 1
+            self._cond.notify_all()
+        return True
+
+    def wait(self, last_sequence, timeout=5.0):
+        """Block until a frame newer than last_sequence is available"""
+        with self._cond:
+            if self.sequence == last_sequence and not self.closed:
+                self._cond.wait(timeout)
+            return self.sequence, self.frame
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+
+class _StreamHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        channel = None
+        if self.path.startswith("/stream/"):
+            channel = self.server.channels.get(self.path[len("/stream/"):])
+        if channel is None:
+            self.send_error(404)
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", f"multipart/x-mixed-replace; boundary={BOUNDARY}")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+
+        sequence = 0
+        try:
+            while not channel.closed:
+                sequence, frame = channel.wait(sequence)
+                if frame is None:
+                    continue
+                self.wfile.write(f"--{BOUNDARY}\r\nContent-Type: image/jpeg\r\n"
+                                 f"Content-Length: {len(frame)}\r\n\r\n".encode("ascii"))
+                self.wfile.write(frame)
+                self.wfile.write(b"\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            # Viewer went away
+            pass
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MJPEGServer:
+    """Serves each session's channel as an MJPEG stream at channel.path
+
+    Listens on localhost unless another host is given; put it behind a
+    proxy (or pass host="0.0.0.0") to reach it from other devices.
+    """
+
+    def __init__(self, port=8502, host="127.0.0.1"):
+        self.port = port
+        self._server = ThreadingHTTPServer((host, port), _StreamHandler)
+        self._server.daemon_threads = True
+        # Served channels by token, and each session's current channel
+        self._server.channels = {}
+        self._sessions = {}
+        thread = threading.Thread(target=self._server.serve_forever, name="fitfusion-mjpeg")
+        thread.daemon = True
+        thread.start()
+
+    def channel(self, session_id, **options):
+        """Create (or replace) the channel for a session"""
+        channel = StreamChannel(**options)
+        self._server.channels[channel.token] = channel
+        previous = self._sessions.get(session_id)
+        self._sessions[session_id] = channel
+        if previous is not None:
+            self._close(previous)
+        return channel
+
+    def remove(self, session_id):
+        channel = self._sessions.pop(session_id, None)
+        if channel is not None:
+            self._close(channel)
+
+    def _close(self, channel):
+        self._server.channels.pop(channel.token, None)
+        channel.close()